@@ -142,3 +142,59 @@ def errors():
 def settings():
     """Admin settings page."""
     return render_template('admin/settings.html')
+
+@admin_bp.route('/rate-limits')
+@login_required
+def rate_limits():
+    """Provider rate limiter metrics: acquisitions, rejections and wait times."""
+    from services.rate_limiter import rate_limiter, provider_limits
+    
+    metrics = rate_limiter.metrics()
+    return jsonify({
+        provider: dict(stats, limits=dict(zip(('rate', 'burst', 'max_in_flight'), provider_limits(provider))))
+        for provider, stats in metrics.items()
+    })
+
+@admin_bp.route('/idea-pool')
+@login_required
+def idea_pool_stats():
+    """Ready and claimed ideas of the idea pool for the current idea prompt."""
+    from services.idea_pool import idea_pool, prompt_version
+    
+    with open('prompts/idea_gen.txt', 'r') as file:
+        version = prompt_version(file.read())
+    return jsonify(dict(idea_pool.stats(version), prompt_version=version))
+
+@admin_bp.route('/http-pools')
+@login_required
+def http_pools():
+    """Connection reuse of the shared provider HTTP sessions."""
+    from services.http_sessions import http_sessions
+    
+    return jsonify(http_sessions.stats())
+
+@admin_bp.route('/artifact-cache')
+@login_required
+def artifact_cache_stats():
+    """Hit and miss counters per step and the size of the artifact cache."""
+    from services.artifact_cache import artifact_cache
+    
+    return jsonify(artifact_cache.stats())
+
+@admin_bp.route('/assets')
+@login_required
+def assets():
+    """Metadata cache counters and the number of stored assets."""
+    from app import Asset, ProjectAsset
+    from services.assets import asset_registry
+    
+    return jsonify(dict(asset_registry.stats(), assets=Asset.query.count(), project_assets=ProjectAsset.query.count()))
+
+@admin_bp.route('/projects/<int:project_id>/assets')
+@login_required
+def project_assets(project_id):
+    """Stored metadata of a project's step outputs."""
+    from services.assets import asset_registry
+    
+    project = Project.query.get_or_404(project_id)
+    return jsonify(asset_registry.manifest(project))
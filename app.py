@@ -1,4 +1,5 @@
 import os
+import mimetypes
 from flask import Flask, render_template, redirect, url_for, flash, request, jsonify, session
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import LoginManager, UserMixin, login_user, logout_user, login_required, current_user
@@ -16,6 +17,10 @@ app.config['SECRET_KEY'] = os.getenv('FLASK_SECRET_KEY', 'dev-secret-key')
 app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv('DATABASE_URL', 'sqlite:///aivideo.db')
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 
+# Older Pythons don't know the HLS types; native players check them
+mimetypes.add_type('application/vnd.apple.mpegurl', '.m3u8')
+mimetypes.add_type('video/iso.segment', '.m4s')
+
 # Initialize database
 db = SQLAlchemy(app)
 
@@ -55,11 +60,81 @@ class Project(db.Model):
     music_path = db.Column(db.String(255), nullable=True)
     voice_path = db.Column(db.String(255), nullable=True)
     final_video_path = db.Column(db.String(255), nullable=True)
+    hls_path = db.Column(db.String(255), nullable=True)  # Master playlist of the final video's HLS package
     status = db.Column(db.String(20), default='draft')
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
 
+# Define PipelineCheckpoint model
+class PipelineCheckpoint(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    project_id = db.Column(db.Integer, db.ForeignKey('project.id'), nullable=False, index=True)
+    step = db.Column(db.String(20), nullable=False)
+    input_hash = db.Column(db.String(64), nullable=True)
+    output_path = db.Column(db.String(255), nullable=True)
+    output_hash = db.Column(db.String(64), nullable=True)
+    result = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    project = db.relationship('Project', backref=db.backref('checkpoints', lazy=True, cascade='all, delete-orphan'))
+
+    __table_args__ = (db.UniqueConstraint('project_id', 'step', name='uq_checkpoint_project_step'),)
+
+# Define RemoteJob model
+class RemoteJob(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    project_id = db.Column(db.Integer, db.ForeignKey('project.id'), nullable=False, index=True)
+    step = db.Column(db.String(20), nullable=False)
+    provider = db.Column(db.String(20), nullable=False)
+    external_id = db.Column(db.String(100), nullable=True, index=True)
+    model = db.Column(db.String(100), nullable=True)
+    cache_key = db.Column(db.String(64), nullable=True)
+    status = db.Column(db.String(20), default='pending')  # pending, submitted, completed, failed
+    output_url = db.Column(db.Text, nullable=True)
+    error = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    completed_at = db.Column(db.DateTime, nullable=True)
+    project = db.relationship('Project', backref=db.backref('remote_jobs', lazy=True, cascade='all, delete-orphan'))
+
+# Define PooledIdea model
+class PooledIdea(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    idea = db.Column(db.Text, nullable=False)
+    prompt = db.Column(db.Text, nullable=False)
+    prompt_version = db.Column(db.String(16), nullable=False, index=True)
+    project_id = db.Column(db.Integer, db.ForeignKey('project.id', ondelete='SET NULL'), nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    claimed_at = db.Column(db.DateTime, nullable=True, index=True)
+
+# Define Asset model
+class Asset(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    content_hash = db.Column(db.String(64), nullable=False, index=True)
+    kind = db.Column(db.String(10), nullable=True)  # video, audio, image, other
+    duration = db.Column(db.Float, nullable=True)
+    size = db.Column(db.BigInteger, nullable=True)
+    bit_rate = db.Column(db.Integer, nullable=True)
+    codec = db.Column(db.String(20), nullable=True)
+    width = db.Column(db.Integer, nullable=True)
+    height = db.Column(db.Integer, nullable=True)
+    info = db.Column(db.Text, nullable=True)  # Full probed metadata as JSON
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+# Define ProjectAsset model
+class ProjectAsset(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    project_id = db.Column(db.Integer, db.ForeignKey('project.id'), nullable=False, index=True)
+    asset_id = db.Column(db.Integer, db.ForeignKey('asset.id'), nullable=False)
+    step = db.Column(db.String(30), nullable=False)
+    path = db.Column(db.String(255), nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    project = db.relationship('Project', backref=db.backref('assets', lazy=True, cascade='all, delete-orphan'))
+    asset = db.relationship('Asset')
+
+    __table_args__ = (db.UniqueConstraint('project_id', 'step', name='uq_project_asset_step'),)
+
 @login_manager.user_loader
 def load_user(user_id):
     return User.query.get(int(user_id))
@@ -162,6 +237,10 @@ def new_project():
 
     return render_template('new_project.html')
 
+def stream_url(project):
+    """URL of the master playlist of a project's HLS package, if the final video was packaged."""
+    return storage_manager.get_file_url(project.hls_path) if project.hls_path else None
+
 @app.route('/project/<int:project_id>')
 @login_required
 def view_project(project_id):
@@ -172,7 +251,11 @@ def view_project(project_id):
         flash('You do not have permission to view this project')
         return redirect(url_for('dashboard'))
 
-    return render_template('view_project.html', project=project)
+    # Recorded when the steps ran, so the page never probes the files itself
+    from services.assets import asset_registry
+
+    return render_template('view_project.html', project=project, assets=asset_registry.manifest(project),
+                           stream_url=stream_url(project))
 
 @app.route('/project/<int:project_id>/edit', methods=['GET', 'POST'])
 @login_required
@@ -192,7 +275,7 @@ def edit_project(project_id):
         db.session.commit()
         flash('Project updated successfully')
 
-    return render_template('edit_project.html', project=project)
+    return render_template('edit_project.html', project=project, stream_url=stream_url(project))
 
 @app.route('/project/<int:project_id>/generate', methods=['POST'])
 @login_required
@@ -209,6 +292,15 @@ def generate_project(project_id):
     # Check if we should use stock videos (default to True)
     use_stock = request.json.get('use_stock', True)
 
+    # Number of AI-generated shots (storyboard mode when more than one)
+    try:
+        shots = max(1, min(int(request.json.get('shots') or 1), 6))
+    except (TypeError, ValueError):
+        return jsonify({'error': 'shots must be a whole number'}), 400
+
+    # Chain the shots, each one continuing from the last frame of the previous shot
+    chained = bool(request.json.get('chained', False))
+
     # Update project status
     project.status = 'processing'
     db.session.commit()
@@ -220,7 +312,7 @@ def generate_project(project_id):
     try:
         if step == 'all':
             # Generate complete video
-            result = service.generate_complete_video(use_stock=use_stock)
+            result = service.generate_complete_video(use_stock=use_stock, shots=shots, chained=chained)
         elif step == 'idea':
             # Generate idea only
             result = service.generate_idea()
@@ -256,6 +348,7 @@ def generate_project(project_id):
                 project.idea,
                 {'filename': f"static/{project.voice_path}", 'script': ''}
             )
+            service.package_final_video(final_video)
             project.status = 'completed'
             result = {'status': 'completed', 'message': 'Final video created successfully'}
         else:
@@ -333,6 +426,10 @@ app.register_blueprint(admin_bp)
 from payments.routes import payments_bp
 app.register_blueprint(payments_bp)
 
+# Register provider webhooks blueprint
+from webhooks import webhooks_bp
+app.register_blueprint(webhooks_bp)
+
 # Initialize analytics
 from analytics import Analytics
 analytics = Analytics(app)
@@ -368,9 +465,30 @@ def test_pexels():
         'results': results
     })
 
+# Columns added to tables that existed before them; create_all only creates missing tables
+ADDED_COLUMNS = {
+    'project': {'hls_path': 'VARCHAR(255)'},
+}
+
+def add_missing_columns():
+    """Add the columns of ADDED_COLUMNS that an existing database doesn't have yet."""
+    for table, columns in ADDED_COLUMNS.items():
+        existing = {column['name'] for column in db.inspect(db.engine).get_columns(table)}
+        for name, column_type in columns.items():
+            if name in existing:
+                continue
+            try:
+                with db.engine.begin() as connection:
+                    connection.execute(db.text(f'ALTER TABLE {table} ADD COLUMN {name} {column_type}'))
+            except Exception:
+                # Another process starting at the same time may have added it first
+                if name not in {column['name'] for column in db.inspect(db.engine).get_columns(table)}:
+                    raise
+
 # Create database tables
 with app.app_context():
     db.create_all()
+    add_missing_columns()
 
 if __name__ == '__main__':
     app.run(debug=True)
@@ -1,10 +1,11 @@
 import os
 import base64
 import time
-import json
 import requests
 from pathlib import Path
 from dotenv import load_dotenv
+from services.poller import poller
+from services.idea_history import IdeaHistory
 import replicate
 
 # Load environment variables from .env file
@@ -23,9 +24,14 @@ Path("image").mkdir(exist_ok=True)
 Path("video").mkdir(exist_ok=True)
 Path("music").mkdir(exist_ok=True)
 
-# Constants for the idea logging system
+# Constants for the idea logging system; ideas are kept in the shared idea
+# history, the old JSON file is only imported once
 LAST_IDEAS_FILE = "last_ideas.json"
 MAX_STORED_IDEAS = 6
+MAX_IDEA_ATTEMPTS = 3
+
+idea_history = IdeaHistory("auto_video")
+idea_history.import_json(LAST_IDEAS_FILE)
 
 def read_file(file_path):
     """Read the content of a file."""
@@ -39,31 +45,13 @@ def save_file(file_path, content, mode='wb'):
 
 def load_last_ideas():
     """Load the list of recently generated ideas."""
-    if os.path.exists(LAST_IDEAS_FILE):
-        try:
-            with open(LAST_IDEAS_FILE, 'r') as file:
-                return json.load(file)
-        except json.JSONDecodeError:
-            # If the file exists but is corrupted, return an empty list
-            return []
-    return []
+    return idea_history.recent(MAX_STORED_IDEAS)
 
 def save_idea_to_history(idea):
-    """Save an idea to the history file, keeping only the most recent ones."""
-    ideas = load_last_ideas()
-    
-    # Add the new idea
-    ideas.append(idea)
-    
-    # Keep only the most recent MAX_STORED_IDEAS
-    if len(ideas) > MAX_STORED_IDEAS:
-        ideas = ideas[-MAX_STORED_IDEAS:]
-    
-    # Save the updated list
-    with open(LAST_IDEAS_FILE, 'w') as file:
-        json.dump(ideas, file)
+    """Save an idea to the shared idea history."""
+    idea_history.add(idea)
 
-def generate_idea():
+def generate_idea(attempt=1):
     """Step 1: Generate an idea using OpenAI API, avoiding recent ideas."""
     print("Step 1: Generating idea using OpenAI API...")
     
@@ -126,6 +114,11 @@ def generate_idea():
     print(f"Generated Idea: {idea}")
     print(f"Generated Prompt: {prompt}")
     
+    # Regenerate ideas that are too close to one we already made
+    if attempt < MAX_IDEA_ATTEMPTS and idea_history.is_duplicate(idea):
+        print("Idea is too similar to a recent one, generating another...")
+        return generate_idea(attempt + 1)
+    
     # Save the new idea to history
     save_idea_to_history(idea)
     
@@ -298,47 +291,19 @@ def generate_music(idea):
     task_id = response.json()["task_id"]
     print(f"Music generation started with task ID: {task_id}")
     
-    # Step 2: Wait for generation to complete
-    status = ""
-    while status != "SUCCESS":
-        time.sleep(5)  # Wait 5 seconds between checks
-        
-        status_response = requests.get(
-            f"https://api.sonauto.ai/v1/generations/status/{task_id}",
-            headers=headers
-        )
-        
-        if status_response.status_code != 200:
-            print(f"Error checking music generation status: {status_response.text}")
-            return None
-        
-        status = status_response.text.strip('"')
-        print(f"Music generation status: {status}")
-        
-        if status == "FAILURE":
-            print("Music generation failed")
-            return None
-        
-        if status == "SUCCESS":
-            # Get the generated music URL
-            result_response = requests.get(
-                f"https://api.sonauto.ai/v1/generations/{task_id}",
-                headers=headers
-            )
-            
-            if result_response.status_code != 200:
-                print(f"Error getting music URL: {result_response.text}")
-                return None
-            
-            song_url = result_response.json()["song_paths"][0]
-            
-            # Download the music file
-            music_response = requests.get(song_url)
-            save_file(music_filename, music_response.content)
-            
-            print(f"Music generated and saved to {music_filename}")
-            break
+    # Step 2: Wait for generation to complete; the shared poller checks the
+    # status with adaptive intervals instead of every 5 seconds
+    try:
+        song_url = poller.wait("sonauto", task_id, context={"api_key": SONAUTO_API_KEY}, timeout=600)
+    except Exception as e:
+        print(f"Music generation failed: {str(e)}")
+        return None
+    
+    # Download the music file
+    music_response = requests.get(song_url)
+    save_file(music_filename, music_response.content)
     
+    print(f"Music generated and saved to {music_filename}")
     return music_filename
 
 def generate_voice_dialog(idea):
@@ -4,6 +4,7 @@ import requests
 import json
 from pathlib import Path
 from dotenv import load_dotenv
+from services.poller import poller
 from openai import OpenAI
 
 # Load environment variables from .env file
@@ -78,47 +79,19 @@ def generate_music(idea):
     task_id = response.json()["task_id"]
     print(f"Music generation started with task ID: {task_id}")
     
-    # Step 2: Wait for generation to complete
-    status = ""
-    while status != "SUCCESS":
-        time.sleep(5)  # Wait 5 seconds between checks
-        
-        status_response = requests.get(
-            f"https://api.sonauto.ai/v1/generations/status/{task_id}",
-            headers=headers
-        )
-        
-        if status_response.status_code != 200:
-            print(f"Error checking music generation status: {status_response.text}")
-            return None
-        
-        status = status_response.text.strip('"')
-        print(f"Music generation status: {status}")
-        
-        if status == "FAILURE":
-            print("Music generation failed")
-            return None
-        
-        if status == "SUCCESS":
-            # Get the generated music URL
-            result_response = requests.get(
-                f"https://api.sonauto.ai/v1/generations/{task_id}",
-                headers=headers
-            )
-            
-            if result_response.status_code != 200:
-                print(f"Error getting music URL: {result_response.text}")
-                return None
-            
-            song_url = result_response.json()["song_paths"][0]
-            
-            # Download the music file
-            music_response = requests.get(song_url)
-            save_file(music_filename, music_response.content)
-            
-            print(f"Music generated and saved to {music_filename}")
-            break
+    # Step 2: Wait for generation to complete; the shared poller checks the
+    # status with adaptive intervals instead of every 5 seconds
+    try:
+        song_url = poller.wait("sonauto", task_id, context={"api_key": SONAUTO_API_KEY}, timeout=600)
+    except Exception as e:
+        print(f"Music generation failed: {str(e)}")
+        return None
     
+    # Download the music file
+    music_response = requests.get(song_url)
+    save_file(music_filename, music_response.content)
+    
+    print(f"Music generated and saved to {music_filename}")
     return music_filename
 
 def merge_videos(video_paths, music_path, voice_path):
@@ -153,19 +126,8 @@ def merge_videos(video_paths, music_path, voice_path):
         for video_path in video_paths:
             f.write(f"file '{video_path}'\n")
     
-    # First concatenate the videos
-    concat_output = "temp_concat.mp4"
-    concat_cmd = f'ffmpeg -y -f concat -safe 0 -i temp_list.txt -c copy {concat_output}'
-    
-    print(f"Running video concatenation command: {concat_cmd}")
-    concat_result = os.system(concat_cmd)
-    
-    if concat_result != 0:
-        print(f"Error concatenating videos. Exit code: {concat_result}")
-        return None
-    
-    # Now add music and voice to the concatenated video
-    ffmpeg_cmd = f'ffmpeg -y -i "{concat_output}" '
+    # Read the clips through the concat demuxer and encode them with the audio in one pass
+    ffmpeg_cmd = f'ffmpeg -y -f concat -safe 0 -i temp_list.txt '
     
     # Add input files if available
     if has_music:
@@ -207,7 +169,6 @@ def merge_videos(video_paths, music_path, voice_path):
     # Clean up temporary files
     try:
         os.remove("temp_list.txt")
-        os.remove(concat_output)
     except:
         pass
     
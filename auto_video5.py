@@ -3,8 +3,12 @@ import time
 import requests
 from pathlib import Path
 from dotenv import load_dotenv
+from services.poller import poller
 import replicate
-import cv2
+from services.frames import last_frame, FrameExtractionError
+from services.mezzanine import concat_copy
+from services.encoding import encoding_profile, DEFAULT_PROFILE
+from services.chunked_encoding import encode_chunked
 
 # Load environment variables from .env file
 load_dotenv()
@@ -39,45 +43,14 @@ def extract_last_frame(video_path, output_path):
         video_path (str): Path to the video file
         output_path (str): Path where the extracted frame will be saved
     """
-    # Check if the video file exists
-    if not os.path.exists(video_path):
-        print(f"Error: Video file not found at {video_path}")
-        return False
-    
-    # Open the video file
-    cap = cv2.VideoCapture(video_path)
-    
-    # Check if video opened successfully
-    if not cap.isOpened():
-        print(f"Error: Could not open video file {video_path}")
-        return False
-    
-    # Get total number of frames
-    total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
-    
-    if total_frames == 0:
-        print(f"Error: No frames found in the video file {video_path}")
-        return False
-    
-    # Set the position to the last frame
-    # Note: Setting to total_frames-1 as frame counting starts from 0
-    cap.set(cv2.CAP_PROP_POS_FRAMES, total_frames - 1)
-    
-    # Read the last frame
-    ret, frame = cap.read()
-    
-    # Check if frame was successfully read
-    if not ret:
-        print("Error: Could not read the last frame")
+    try:
+        # ffmpeg seeks from the end of the file, the OpenCV frame count was often wrong
+        last_frame(video_path, output_path)
+    except (FrameExtractionError, OSError) as e:
+        print(f"Error: {str(e)}")
         return False
     
-    # Save the frame as an image
-    cv2.imwrite(output_path, frame)
     print(f"Last frame successfully saved to {output_path}")
-    
-    # Release video capture object
-    cap.release()
-    
     return True
 
 def generate_video(image_path, prompt):
@@ -184,47 +157,19 @@ def generate_music(prompt):
     task_id = response.json()["task_id"]
     print(f"Music generation started with task ID: {task_id}")
     
-    # Step 2: Wait for generation to complete
-    status = ""
-    while status != "SUCCESS":
-        time.sleep(5)  # Wait 5 seconds between checks
-        
-        status_response = requests.get(
-            f"https://api.sonauto.ai/v1/generations/status/{task_id}",
-            headers=headers
-        )
-        
-        if status_response.status_code != 200:
-            print(f"Error checking music generation status: {status_response.text}")
-            return None
-        
-        status = status_response.text.strip('"')
-        print(f"Music generation status: {status}")
-        
-        if status == "FAILURE":
-            print("Music generation failed")
-            return None
-        
-        if status == "SUCCESS":
-            # Get the generated music URL
-            result_response = requests.get(
-                f"https://api.sonauto.ai/v1/generations/{task_id}",
-                headers=headers
-            )
-            
-            if result_response.status_code != 200:
-                print(f"Error getting music URL: {result_response.text}")
-                return None
-            
-            song_url = result_response.json()["song_paths"][0]
-            
-            # Download the music file
-            music_response = requests.get(song_url)
-            save_file(music_filename, music_response.content)
-            
-            print(f"Music generated and saved to {music_filename}")
-            break
+    # Step 2: Wait for generation to complete; the shared poller checks the
+    # status with adaptive intervals instead of every 5 seconds
+    try:
+        song_url = poller.wait("sonauto", task_id, context={"api_key": SONAUTO_API_KEY}, timeout=600)
+    except Exception as e:
+        print(f"Music generation failed: {str(e)}")
+        return None
     
+    # Download the music file
+    music_response = requests.get(song_url)
+    save_file(music_filename, music_response.content)
+    
+    print(f"Music generated and saved to {music_filename}")
     return music_filename
 
 def merge_videos(video_paths, music_path):
@@ -234,37 +179,29 @@ def merge_videos(video_paths, music_path):
     # Generate output filename
     output_filename = "final_output.mp4"
     
-    # Create a temporary file for concatenation
-    with open("temp_list.txt", "w") as f:
-        for video_path in video_paths:
-            f.write(f"file '{video_path}'\n")
-    
-    # First concatenate the videos
-    concat_output = "temp_concat.mp4"
-    concat_cmd = f'ffmpeg -y -f concat -safe 0 -i temp_list.txt -c copy {concat_output}'
-    
-    print(f"Running video concatenation command: {concat_cmd}")
-    concat_result = os.system(concat_cmd)
-    
-    if concat_result != 0:
-        print(f"Error concatenating videos. Exit code: {concat_result}")
-        return None
-    
-    # Now add music to the concatenated video
-    ffmpeg_cmd = f'ffmpeg -y -i "{concat_output}" -i "{music_path}" -map 0:v -map 1:a -shortest -t 50 -c:v libx264 -c:a aac -b:a 192k "{output_filename}"'
-    
-    # Print the command for debugging
-    print(f"Running FFMPEG command: {ffmpeg_cmd}")
-    
-    # Execute FFMPEG command
-    result = os.system(ffmpeg_cmd)
+    try:
+        # The chained clips share their encoding, so they are joined without re-encoding
+        concat_copy(video_paths, os.path.abspath("temp_joined.mp4"))
+        
+        # Encode the first 50 seconds in parallel segments, then add the music once
+        encode_chunked("temp_joined.mp4", "temp_video.mp4", encoding_profile(DEFAULT_PROFILE), max_duration=50)
+        ffmpeg_cmd = f'ffmpeg -y -i temp_video.mp4 -i "{music_path}" -map 0:v -map 1:a -shortest -c:v copy -c:a aac -b:a 192k "{output_filename}"'
+        
+        # Print the command for debugging
+        print(f"Running FFMPEG command: {ffmpeg_cmd}")
+        
+        # Execute FFMPEG command
+        result = os.system(ffmpeg_cmd)
+    except Exception as e:
+        print(f"Error encoding final video: {str(e)}")
+        result = 1
     
     # Clean up temporary files
-    try:
-        os.remove("temp_list.txt")
-        os.remove(concat_output)
-    except:
-        pass
+    for temp_file in ("temp_joined.mp4", "temp_video.mp4"):
+        try:
+            os.remove(temp_file)
+        except:
+            pass
     
     if result == 0:
         print(f"Final video created successfully: {output_filename}")
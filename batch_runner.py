@@ -0,0 +1,248 @@
+"""Run a batch of video jobs from a manifest.
+
+    python batch_runner.py batch_manifest.json --concurrency 4 --report report.json
+
+The manifest is a JSON file with a "jobs" list and optional "defaults"
+applied to every job:
+
+    {
+        "defaults": {"mode": "ai"},
+        "jobs": [
+            {"name": "vienna", "idea": "POV: You are entering a secret vampire gathering in Vienna, 1722"},
+            {"name": "sabbath", "mode": "storyboard", "shots": 3, "music_prompt": "dark folk, frame drums"},
+            {"name": "chain", "mode": "chained", "shots": 5},
+            {"name": "stock", "mode": "stock", "profile": "1080p"}
+        ]
+    }
+
+Modes are "stock" (Pexels footage), "ai" (one Kling clip), "storyboard"
+(shots planned in one call and rendered at the same time) and "chained"
+(each shot continues from the last frame of the one before). Jobs without
+an idea generate one. "profile" picks the encoding profile (720p, 1080p or
+4K, default ENCODING_PROFILE). Up to --concurrency jobs run at once; the
+provider rate limiter keeps their combined API calls within each
+provider's limits.
+
+With --async the jobs run as tasks on one event loop and talk to the
+providers through the pooled async clients instead of a thread per job,
+so a high --concurrency costs sockets rather than threads:
+
+    python batch_runner.py batch_manifest.json --async --concurrency 32
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import traceback
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dotenv import load_dotenv
+from services.encoding import ENCODING_PROFILES, encoding_profile
+
+# Load environment variables from .env file
+load_dotenv()
+
+MODES = ("stock", "ai", "storyboard", "chained")
+
+# Upper bound on shots per job, as in the web app
+MAX_SHOTS = 6
+
+
+def load_manifest(path):
+    """Read a manifest and return its jobs with the defaults applied."""
+    with open(path, 'r') as file:
+        manifest = json.load(file)
+
+    defaults = manifest.get("defaults", {})
+    jobs = []
+    for index, entry in enumerate(manifest.get("jobs", []), start=1):
+        job = dict(defaults, **entry)
+        job.setdefault("name", f"job-{index}")
+        job.setdefault("mode", "ai")
+        if job["mode"] not in MODES:
+            raise ValueError(f"Job {job['name']}: unknown mode '{job['mode']}', expected one of {', '.join(MODES)}")
+
+        if job.get("profile") and job["profile"] not in ENCODING_PROFILES:
+            raise ValueError(f"Job {job['name']}: unknown profile '{job['profile']}', expected one of {', '.join(ENCODING_PROFILES)}")
+
+        shots = int(job.get("shots", 3 if job["mode"] in ("storyboard", "chained") else 1))
+        job["shots"] = max(1, min(shots, MAX_SHOTS))
+        jobs.append(job)
+
+    names = [job["name"] for job in jobs]
+    if len(set(names)) != len(names):
+        raise ValueError("Job names in a manifest must be unique")
+    return jobs
+
+
+def job_service(job):
+    """A service for one job and the pipeline arguments of the job."""
+    from services.video_generation import VideoGenerationService
+
+    service = VideoGenerationService()
+    if job.get("profile"):
+        service.encoding = encoding_profile(job["profile"])
+    idea = {"idea": job["idea"], "prompt": job.get("prompt")} if job.get("idea") else None
+    arguments = {
+        "use_stock": job["mode"] == "stock",
+        "resume": False,
+        "shots": job["shots"],
+        "chained": job["mode"] == "chained",
+        "idea": idea,
+        "music_prompt": job.get("music_prompt"),
+    }
+    return service, arguments
+
+
+def run_job(app, job):
+    """Run one manifest job through the generation pipeline and return its report entry."""
+    started = time.perf_counter()
+
+    with app.app_context():
+        try:
+            service, arguments = job_service(job)
+            result = service.generate_complete_video(**arguments)
+        except Exception as e:
+            traceback.print_exc()
+            result = {"status": "error", "message": str(e), "timings": {}}
+
+    return report_entry(job, result, started)
+
+
+async def arun_job(app, job):
+    """Async variant of run_job."""
+    started = time.perf_counter()
+
+    with app.app_context():
+        try:
+            service, arguments = job_service(job)
+            result = await service.agenerate_complete_video(**arguments)
+        except Exception as e:
+            traceback.print_exc()
+            result = {"status": "error", "message": str(e), "timings": {}}
+
+    return report_entry(job, result, started)
+
+
+def report_entry(job, result, started):
+    """The report entry of a finished job."""
+    entry = {"name": job["name"], "mode": job["mode"], "shots": job["shots"], "profile": job.get("profile")}
+    timings = result.get("timings") or {}
+    entry.update({
+        "status": result.get("status"),
+        "final_video": result.get("final_video"),
+        "error": result.get("message") if result.get("status") == "error" else None,
+        "wall_time": round(time.perf_counter() - started, 3),
+        "critical_path": timings.get("critical_path"),
+        "steps": {name: step.get("duration") for name, step in timings.get("steps", {}).items()},
+    })
+    return entry
+
+
+def run_batch(jobs, concurrency):
+    """Run the jobs, at most concurrency at a time, and return the report."""
+    from app import app
+
+    started = time.perf_counter()
+    entries = []
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        futures = {pool.submit(run_job, app, job): job for job in jobs}
+        for future in as_completed(futures):
+            entry = future.result()
+            entries.append(entry)
+            print(f"[{len(entries)}/{len(jobs)}] {entry['name']}: {entry['status']} in {entry['wall_time']}s")
+
+    return batch_report(jobs, entries, concurrency, started)
+
+
+async def arun_batch(jobs, concurrency):
+    """Async variant of run_batch: the jobs run as tasks on the running loop."""
+    from app import app
+
+    started = time.perf_counter()
+    entries = []
+    slots = asyncio.Semaphore(concurrency)
+
+    async def run(job):
+        async with slots:
+            return await arun_job(app, job)
+
+    for next_entry in asyncio.as_completed([run(job) for job in jobs]):
+        entry = await next_entry
+        entries.append(entry)
+        print(f"[{len(entries)}/{len(jobs)}] {entry['name']}: {entry['status']} in {entry['wall_time']}s")
+
+    return batch_report(jobs, entries, concurrency, started)
+
+
+def batch_report(jobs, entries, concurrency, started):
+    """Summarize the entries of a finished batch."""
+    # Report the jobs in manifest order
+    order = {job["name"]: index for index, job in enumerate(jobs)}
+    entries.sort(key=lambda entry: order[entry["name"]])
+
+    wall_time = time.perf_counter() - started
+    job_time = sum(entry["wall_time"] for entry in entries)
+    return {
+        "concurrency": concurrency,
+        "jobs": entries,
+        "completed": sum(1 for entry in entries if entry["status"] == "completed"),
+        "failed": sum(1 for entry in entries if entry["status"] != "completed"),
+        "wall_time": round(wall_time, 3),
+        "job_time": round(job_time, 3),
+        "speedup": round(job_time / wall_time, 2) if wall_time else None,
+    }
+
+
+def print_report(report):
+    print(f"\n{'job':<24}{'mode':<12}{'status':<11}{'seconds':>9}  critical path")
+    for entry in report["jobs"]:
+        path = " -> ".join(entry["critical_path"] or []) or entry["error"] or ""
+        print(f"{entry['name'][:23]:<24}{entry['mode']:<12}{entry['status']:<11}{entry['wall_time']:>9.1f}  {path}")
+    print(
+        f"\n{report['completed']} completed, {report['failed']} failed in {report['wall_time']}s "
+        f"({report['job_time']}s of job time, {report['speedup']}x with concurrency {report['concurrency']})"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a batch of videos from a JSON manifest.")
+    parser.add_argument("manifest", help="Path to the manifest JSON file")
+    parser.add_argument("--concurrency", type=int, default=int(os.getenv("BATCH_CONCURRENCY", 4)),
+                        help="Maximum number of jobs running at the same time")
+    parser.add_argument("--report", help="Where to write the JSON timing report (default: batch_report_<time>.json)")
+    parser.add_argument("--async", dest="use_async", action="store_true",
+                        help="Run the jobs on one event loop with the async provider clients")
+    args = parser.parse_args()
+
+    try:
+        jobs = load_manifest(args.manifest)
+    except (OSError, ValueError) as e:
+        print(f"Error reading manifest: {str(e)}")
+        return 1
+
+    if not jobs:
+        print("The manifest has no jobs")
+        return 1
+
+    concurrency = max(1, args.concurrency)
+    print(f"Running {len(jobs)} jobs with concurrency {concurrency}...")
+    if args.use_async:
+        from services.async_clients import run
+
+        report = run(arun_batch(jobs, concurrency))
+    else:
+        report = run_batch(jobs, concurrency)
+    print_report(report)
+
+    report_path = args.report or f"batch_report_{int(time.time())}.json"
+    with open(report_path, 'w') as file:
+        json.dump(report, file, indent=2)
+    print(f"Timing report saved to {report_path}")
+
+    return 0 if report["failed"] == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,256 @@
+import os
+import json
+import time
+import shutil
+import sqlite3
+import hashlib
+import threading
+
+
+def file_sha256(path, chunk_size=1024 * 1024):
+    """Return the SHA-256 hex digest of a file's content."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def normalize_value(value):
+    """Normalize an input value so trivially different prompts share a key."""
+    if isinstance(value, str):
+        return ' '.join(value.split())
+    if isinstance(value, dict):
+        return {str(k): normalize_value(v) for k, v in sorted(value.items())}
+    if isinstance(value, (list, tuple)):
+        return [normalize_value(v) for v in value]
+    return value
+
+
+class ArtifactCache:
+    """Content-addressed cache of generated artifacts.
+
+    Entries are keyed by a hash of the pipeline step, the provider/model and
+    the normalized inputs and settings that produced them. Artifact files are
+    hard-linked (or copied) into the cache directory, so evicting an entry
+    never removes a file a project still points at. The index lives in a
+    SQLite database next to the files, which makes it safe to share between
+    web and worker processes on the same host.
+
+    max_bytes bounds the disk space the cache alone holds: entries whose
+    file is still linked from a project output take no space of their own
+    and are neither counted nor evicted. The project outputs under static/
+    are not bounded by the cache; they go away with their projects.
+    """
+
+    def __init__(self, cache_dir=None, max_bytes=None, enabled=None):
+        # Kept out of static/, which Flask serves: the index holds every prompt and script
+        self.cache_dir = cache_dir or os.getenv('ARTIFACT_CACHE_DIR', 'instance/cache/artifacts')
+        self.max_bytes = int(max_bytes if max_bytes is not None else os.getenv('ARTIFACT_CACHE_MAX_BYTES', 5 * 1024 ** 3))
+        if enabled is None:
+            enabled = os.getenv('ARTIFACT_CACHE_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+        self.enabled = enabled
+        self.index_path = os.path.join(self.cache_dir, 'index.sqlite3')
+        self._lock = threading.Lock()
+        self._initialized = False
+
+    def _connect(self):
+        """Open a connection to the index, creating it on first use."""
+        connection = sqlite3.connect(self.index_path, timeout=30)
+        if not self._initialized:
+            with self._lock:
+                connection.executescript(
+                    """
+                    CREATE TABLE IF NOT EXISTS entries (
+                        key TEXT PRIMARY KEY,
+                        step TEXT NOT NULL,
+                        path TEXT NOT NULL,
+                        size INTEGER NOT NULL,
+                        metadata TEXT,
+                        created_at REAL NOT NULL,
+                        last_access REAL NOT NULL
+                    );
+                    CREATE INDEX IF NOT EXISTS entries_last_access ON entries (last_access);
+                    CREATE TABLE IF NOT EXISTS counters (
+                        step TEXT PRIMARY KEY,
+                        hits INTEGER NOT NULL DEFAULT 0,
+                        misses INTEGER NOT NULL DEFAULT 0
+                    );
+                    """
+                )
+                self._initialized = True
+        return connection
+
+    def make_key(self, step, model, inputs, settings=None):
+        """Build the cache key for a step invocation.
+
+        Args:
+            step (str): Pipeline step name (image, video, music, voice)
+            model (str): Provider/model identifier
+            inputs (dict): Step inputs such as the prompt or an input file hash
+            settings (dict): Generation settings, e.g. parsed from prompts/*.txt
+
+        Returns:
+            str: Hex digest identifying the artifact
+        """
+        payload = {
+            'step': step,
+            'model': model,
+            'inputs': normalize_value(inputs),
+            'settings': normalize_value(settings or {}),
+        }
+        encoded = json.dumps(payload, sort_keys=True, default=str).encode('utf-8')
+        return hashlib.sha256(encoded).hexdigest()
+
+    def _count(self, connection, step, column):
+        connection.execute("INSERT OR IGNORE INTO counters (step) VALUES (?)", (step,))
+        connection.execute(f"UPDATE counters SET {column} = {column} + 1 WHERE step = ?", (step,))
+
+    def get(self, key, step, target_path):
+        """Materialize a cached artifact at target_path.
+
+        Args:
+            key (str): Cache key from make_key
+            step (str): Pipeline step name, used for the hit/miss counters
+            target_path (str): Where the artifact should appear
+
+        Returns:
+            dict: The stored metadata (plus ``path``) on a hit, None on a miss
+        """
+        if not self.enabled:
+            return None
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+        connection = self._connect()
+        try:
+            row = connection.execute(
+                "SELECT path, metadata FROM entries WHERE key = ?", (key,)
+            ).fetchone()
+
+            if row and not os.path.exists(row[0]):
+                # The file was removed behind our back, drop the stale entry
+                connection.execute("DELETE FROM entries WHERE key = ?", (key,))
+                row = None
+
+            if not row:
+                self._count(connection, step, 'misses')
+                connection.commit()
+                return None
+
+            cached_path, metadata = row
+            self._link(cached_path, target_path)
+
+            connection.execute("UPDATE entries SET last_access = ? WHERE key = ?", (time.time(), key))
+            self._count(connection, step, 'hits')
+            connection.commit()
+        finally:
+            connection.close()
+
+        print(f"Artifact cache hit for {step}: {target_path}")
+        result = json.loads(metadata) if metadata else {}
+        result['path'] = target_path
+        return result
+
+    def put(self, key, step, source_path, metadata=None):
+        """Store a freshly generated artifact under key.
+
+        Returns:
+            bool: True if the artifact was stored
+        """
+        if not self.enabled or not source_path or not os.path.exists(source_path):
+            return False
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+        extension = os.path.splitext(source_path)[1]
+        cached_path = os.path.join(self.cache_dir, f"{key}{extension}")
+
+        try:
+            if not os.path.exists(cached_path):
+                self._link(source_path, cached_path)
+            size = os.path.getsize(cached_path)
+            now = time.time()
+
+            connection = self._connect()
+            try:
+                connection.execute(
+                    "INSERT OR REPLACE INTO entries (key, step, path, size, metadata, created_at, last_access) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (key, step, cached_path, size, json.dumps(metadata) if metadata else None, now, now)
+                )
+                connection.commit()
+                self._evict(connection)
+            finally:
+                connection.close()
+            return True
+        except Exception as e:
+            print(f"Error storing artifact in cache: {str(e)}")
+            return False
+
+    def _held_bytes(self, path):
+        """Disk space that removing a cached file frees: nothing while a project output links to it."""
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return 0
+        return stat.st_size if stat.st_nlink <= 1 else 0
+
+    def _evict(self, connection):
+        """Remove least recently used entries until the space the cache alone holds fits in max_bytes."""
+        rows = [
+            (key, path, self._held_bytes(path))
+            for key, path in connection.execute("SELECT key, path FROM entries ORDER BY last_access ASC")
+        ]
+        total = sum(held for _, _, held in rows)
+        if total <= self.max_bytes:
+            return
+
+        for key, path, held in rows:
+            if total <= self.max_bytes:
+                break
+            if not held:
+                # Shared with a project output, removing it frees nothing
+                continue
+            try:
+                os.remove(path)
+            except OSError as e:
+                print(f"Error evicting cached artifact {path}: {str(e)}")
+                continue
+            connection.execute("DELETE FROM entries WHERE key = ?", (key,))
+            total -= held
+        connection.commit()
+
+    def _link(self, source, destination):
+        """Hard-link source to destination, falling back to a copy across devices."""
+        os.makedirs(os.path.dirname(destination) or '.', exist_ok=True)
+        if os.path.exists(destination):
+            os.remove(destination)
+        try:
+            os.link(source, destination)
+        except OSError:
+            shutil.copyfile(source, destination)
+
+    def stats(self):
+        """Return hit/miss counters per step and the current cache size.
+
+        bytes is the size of every entry, held_bytes the part of it that is
+        not shared with a project output and counts against max_bytes.
+        """
+        if not os.path.exists(self.index_path):
+            return {'steps': {}, 'entries': 0, 'bytes': 0, 'held_bytes': 0, 'max_bytes': self.max_bytes}
+
+        connection = self._connect()
+        try:
+            steps = {
+                step: {'hits': hits, 'misses': misses}
+                for step, hits, misses in connection.execute("SELECT step, hits, misses FROM counters")
+            }
+            entries, size = connection.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries").fetchone()
+            held = sum(self._held_bytes(path) for path, in connection.execute("SELECT path FROM entries"))
+        finally:
+            connection.close()
+
+        return {'steps': steps, 'entries': entries, 'bytes': size, 'held_bytes': held, 'max_bytes': self.max_bytes}
+
+
+# Create a default artifact cache instance
+artifact_cache = ArtifactCache()
@@ -0,0 +1,313 @@
+import os
+import json
+import threading
+import subprocess
+from collections import OrderedDict
+from services.artifact_cache import file_sha256
+from services import loudness as loudness_analysis
+
+# Probed files kept in memory per process
+METADATA_CACHE_SIZE = 2048
+
+# Seconds at the end of a file that are decoded to catch truncated downloads
+TAIL_CHECK_SECONDS = 1.0
+
+
+class AssetError(Exception):
+    """A media file is unreadable, truncated or lacks the expected stream."""
+
+
+def ffprobe(path):
+    """Run ffprobe once and return its format and stream information."""
+    try:
+        result = subprocess.run(
+            ["ffprobe", "-v", "error", "-show_format", "-show_streams", "-of", "json", path],
+            check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True
+        )
+    except subprocess.CalledProcessError as e:
+        raise AssetError(f"ffprobe cannot read {path}: {e.stderr.strip()}")
+    return json.loads(result.stdout)
+
+
+def to_number(value, cast=float):
+    try:
+        return cast(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def frame_rate(rate):
+    """Turn an ffprobe rate such as "30000/1001" into frames per second."""
+    if not rate or "/" not in rate:
+        return to_number(rate)
+    numerator, denominator = rate.split("/", 1)
+    numerator, denominator = to_number(numerator), to_number(denominator)
+    if not numerator or not denominator:
+        return None
+    return round(numerator / denominator, 3)
+
+
+def summarize(probe):
+    """Reduce ffprobe output to the metadata the pipeline and the pages use.
+
+    The video entry keeps ffprobe's own stream keys, so it can be compared
+    with the mezzanine profile as it is.
+    """
+    media_format = probe.get("format", {})
+    streams = probe.get("streams", [])
+    video = next((s for s in streams if s.get("codec_type") == "video"
+                  and not s.get("disposition", {}).get("attached_pic")), None)
+    audio = next((s for s in streams if s.get("codec_type") == "audio"), None)
+
+    metadata = {
+        "format": media_format.get("format_name"),
+        "duration": to_number(media_format.get("duration")),
+        "size": to_number(media_format.get("size"), int),
+        "bit_rate": to_number(media_format.get("bit_rate"), int),
+        "video": None,
+        "audio": None,
+    }
+    if video:
+        metadata["video"] = {
+            "codec_name": video.get("codec_name"),
+            "width": video.get("width"),
+            "height": video.get("height"),
+            "pix_fmt": video.get("pix_fmt"),
+            "r_frame_rate": video.get("r_frame_rate"),
+            "fps": frame_rate(video.get("avg_frame_rate") or video.get("r_frame_rate")),
+            "sample_aspect_ratio": video.get("sample_aspect_ratio"),
+            "time_base": video.get("time_base"),
+            "bit_rate": to_number(video.get("bit_rate"), int),
+        }
+    if audio:
+        metadata["audio"] = {
+            "codec_name": audio.get("codec_name"),
+            "sample_rate": to_number(audio.get("sample_rate"), int),
+            "channels": audio.get("channels"),
+            "bit_rate": to_number(audio.get("bit_rate"), int),
+        }
+
+    if video and not (media_format.get("format_name") or "").startswith(("image2", "png_pipe", "jpeg_pipe")):
+        metadata["kind"] = "video"
+    elif video:
+        metadata["kind"] = "image"
+    elif audio:
+        metadata["kind"] = "audio"
+    else:
+        metadata["kind"] = "other"
+    return metadata
+
+
+def check_tail(path):
+    """Decode the end of a file; a truncated or corrupt tail makes ffmpeg report errors."""
+    result = subprocess.run(
+        ["ffmpeg", "-v", "error", "-nostdin", "-sseof", f"-{TAIL_CHECK_SECONDS}", "-i", path, "-f", "null", "-"],
+        stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True
+    )
+    errors = result.stderr.strip()
+    if result.returncode != 0 or errors:
+        raise AssetError(f"{path} does not decode to the end: {errors.splitlines()[0] if errors else 'ffmpeg failed'}")
+
+
+def check_metadata(metadata, kind=None):
+    """Raise AssetError if probed metadata does not describe a usable file of the given kind."""
+    if kind == "video":
+        video = metadata.get("video") or {}
+        if metadata.get("kind") != "video" or not video.get("width") or not video.get("height"):
+            raise AssetError("No video stream")
+    elif kind == "audio" and not metadata.get("audio"):
+        raise AssetError("No audio stream")
+    elif kind == "image" and not metadata.get("video"):
+        raise AssetError("Not an image")
+
+    if kind in ("video", "audio") and not metadata.get("duration"):
+        raise AssetError("No duration")
+
+
+class AssetRegistry:
+    """Media metadata keyed by content hash, probed once per file.
+
+    The first lookup of a file runs one ffprobe call; the result is kept in
+    memory and, for the files a project's steps produce, in the Asset table,
+    so pages and later steps read it without spawning ffprobe again. Paths
+    are mapped to content hashes by (size, mtime), so an unchanged file is
+    not hashed twice either.
+    """
+
+    def __init__(self, max_entries=METADATA_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._hashes = OrderedDict()
+        self._metadata = OrderedDict()
+        self._stats = {"memory_hits": 0, "database_hits": 0, "probes": 0, "loudness_hits": 0, "loudness_analyses": 0}
+
+        # Content hashes whose metadata gained values after it was stored
+        self._unsaved = set()
+
+    def _remember(self, cache, key, value):
+        with self._lock:
+            cache[key] = value
+            cache.move_to_end(key)
+            while len(cache) > self.max_entries:
+                cache.popitem(last=False)
+
+    def _count(self, counter):
+        with self._lock:
+            self._stats[counter] += 1
+
+    def content_hash(self, path):
+        """SHA-256 of a file, hashed again only when its size or mtime changed."""
+        stat = os.stat(path)
+        key = (os.path.realpath(path), stat.st_size, stat.st_mtime_ns)
+        with self._lock:
+            content_hash = self._hashes.get(key)
+        if content_hash is None:
+            content_hash = file_sha256(path)
+            self._remember(self._hashes, key, content_hash)
+        return content_hash
+
+    def stored(self, content_hash):
+        """Metadata of a content hash from the Asset table, if an app context is available."""
+        try:
+            from flask import has_app_context
+            if not has_app_context():
+                return None
+
+            from app import Asset
+
+            asset = Asset.query.filter_by(content_hash=content_hash).first()
+        except Exception as e:
+            print(f"Error reading asset metadata: {str(e)}")
+            return None
+        return json.loads(asset.info) if asset and asset.info else None
+
+    def metadata(self, path, content_hash=None):
+        """Return the metadata of a media file, probing it only if its content is new."""
+        if not os.path.exists(path):
+            raise AssetError(f"File not found at {path}")
+
+        content_hash = content_hash or self.content_hash(path)
+        with self._lock:
+            metadata = self._metadata.get(content_hash)
+        if metadata is not None:
+            self._count("memory_hits")
+            return metadata
+
+        metadata = self.stored(content_hash)
+        if metadata is not None:
+            self._count("database_hits")
+        else:
+            self._count("probes")
+            metadata = summarize(ffprobe(path))
+            metadata["content_hash"] = content_hash
+        self._remember(self._metadata, content_hash, metadata)
+        return metadata
+
+    def verify(self, path, kind=None, expected_size=None):
+        """Check that a file is complete and decodable; raises AssetError otherwise.
+
+        The tail decode only runs the first time a content hash is verified.
+        """
+        if expected_size is not None and os.path.getsize(path) != expected_size:
+            raise AssetError(f"{path} has {os.path.getsize(path)} of {expected_size} bytes")
+
+        metadata = self.metadata(path)
+        check_metadata(metadata, kind)
+        if not metadata.get("verified"):
+            if metadata.get("kind") in ("video", "audio"):
+                check_tail(path)
+            metadata["verified"] = True
+        return metadata
+
+    def loudness(self, path, target, content_hash=None):
+        """Measured loudness of a track, analyzed only the first time its content is seen.
+
+        New measurements are written to the Asset table by the next
+        register() or save_pending() call.
+        """
+        metadata = self.metadata(path, content_hash)
+        measured = metadata.get("loudness")
+        if measured:
+            self._count("loudness_hits")
+            return measured
+
+        self._count("loudness_analyses")
+        measured = loudness_analysis.measure(path, target)
+        with self._lock:
+            metadata["loudness"] = measured
+            self._unsaved.add(metadata["content_hash"])
+        return measured
+
+    def save_pending(self):
+        """Write metadata measured since it was stored back to the Asset rows; the caller commits."""
+        with self._lock:
+            pending, self._unsaved = self._unsaved, set()
+            metadata = {content_hash: self._metadata.get(content_hash) for content_hash in pending}
+
+        from app import Asset
+
+        for content_hash, entry in metadata.items():
+            if entry is None:
+                continue
+            for asset in Asset.query.filter_by(content_hash=content_hash).all():
+                asset.info = json.dumps(entry)
+
+    def register(self, project, step, path, content_hash=None):
+        """Record a step's output file for a project and store its metadata; the caller commits."""
+        if not project or not project.id or not path or not os.path.exists(path):
+            return None
+
+        from app import db, Asset, ProjectAsset
+
+        self.save_pending()
+
+        try:
+            metadata = self.metadata(path, content_hash)
+        except AssetError as e:
+            print(f"Error probing {path}: {str(e)}")
+            return None
+
+        content_hash = metadata["content_hash"]
+        asset = Asset.query.filter_by(content_hash=content_hash).first()
+        if not asset:
+            video = metadata.get("video") or {}
+            asset = Asset(
+                content_hash=content_hash,
+                kind=metadata.get("kind"),
+                duration=metadata.get("duration"),
+                size=metadata.get("size"),
+                bit_rate=metadata.get("bit_rate"),
+                codec=video.get("codec_name") or (metadata.get("audio") or {}).get("codec_name"),
+                width=video.get("width"),
+                height=video.get("height"),
+                info=json.dumps(metadata)
+            )
+            db.session.add(asset)
+            db.session.flush()
+
+        entry = ProjectAsset.query.filter_by(project_id=project.id, step=step).first()
+        if not entry:
+            entry = ProjectAsset(project_id=project.id, step=step)
+            db.session.add(entry)
+        entry.asset_id = asset.id
+        entry.path = path
+        return asset
+
+    def manifest(self, project):
+        """The project's recorded step outputs with their metadata, read from the database only."""
+        from app import ProjectAsset
+
+        entries = ProjectAsset.query.filter_by(project_id=project.id).order_by(ProjectAsset.id).all()
+        return [
+            dict(json.loads(entry.asset.info) if entry.asset.info else {},
+                 step=entry.step, path=entry.path, updated_at=entry.updated_at)
+            for entry in entries
+        ]
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats, cached_files=len(self._metadata))
+
+
+# Create a default asset registry instance
+asset_registry = AssetRegistry()
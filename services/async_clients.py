@@ -0,0 +1,297 @@
+import os
+import base64
+import asyncio
+import weakref
+import mimetypes
+import threading
+import httpx
+
+# Base URLs can be overridden to point the clients at a local stand-in server
+PROVIDER_BASE_URLS = {
+    "openai": ("OPENAI_BASE_URL", "https://api.openai.com/v1"),
+    "replicate": ("REPLICATE_API_BASE_URL", "https://api.replicate.com/v1"),
+    "sonauto": ("SONAUTO_API_BASE_URL", "https://api.sonauto.ai/v1"),
+    "pexels": ("PEXELS_API_BASE_URL", "https://api.pexels.com"),
+}
+
+
+def provider_base_url(provider):
+    """Return the base URL of a provider, honouring the environment overrides."""
+    if provider not in PROVIDER_BASE_URLS:
+        return ""
+    env_var, default = PROVIDER_BASE_URLS[provider]
+    return os.getenv(env_var, default)
+
+
+# Per-provider timeouts: chat and TTS calls can be slow, status checks should be quick
+PROVIDER_TIMEOUTS = {
+    "openai": httpx.Timeout(120.0, connect=10.0),
+    "replicate": httpx.Timeout(60.0, connect=10.0),
+    "sonauto": httpx.Timeout(30.0, connect=10.0),
+    "pexels": httpx.Timeout(15.0, connect=5.0),
+    "download": httpx.Timeout(300.0, connect=10.0),
+}
+
+# Total time a remote generation may take before it is cancelled
+PROVIDER_DEADLINES = {
+    "replicate": float(os.getenv("REPLICATE_DEADLINE", 900)),
+    "sonauto": float(os.getenv("SONAUTO_DEADLINE", 300)),
+}
+
+POOL_LIMITS = httpx.Limits(max_connections=100, max_keepalive_connections=20, keepalive_expiry=60.0)
+
+
+class ProviderError(Exception):
+    """Raised when a provider reports a failed generation."""
+
+
+class AsyncClientPool:
+    """Shared httpx.AsyncClient per provider and event loop.
+
+    httpx clients are bound to the loop they were first used on, so the pool
+    keeps one client per (loop, provider). All requests to a provider reuse
+    its keep-alive (HTTP/2 where the server supports it) connections. Loops
+    are held weakly, so a finished loop's clients are never handed to a new
+    one; close them before the loop ends with aclose(), or run the loop with
+    run() below, which does.
+    """
+
+    def __init__(self):
+        self._clients = weakref.WeakKeyDictionary()
+        self._lock = threading.Lock()
+
+    def get(self, provider):
+        """Return the pooled client for provider on the running loop."""
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            clients = self._clients.setdefault(loop, {})
+            client = clients.get(provider)
+            if client is None or client.is_closed:
+                client = httpx.AsyncClient(
+                    base_url=provider_base_url(provider),
+                    timeout=PROVIDER_TIMEOUTS.get(provider, PROVIDER_TIMEOUTS["download"]),
+                    limits=POOL_LIMITS,
+                    http2=True,
+                    follow_redirects=True,
+                )
+                clients[provider] = client
+        return client
+
+    def open_clients(self):
+        """Number of open clients on the running loop."""
+        with self._lock:
+            clients = self._clients.get(asyncio.get_running_loop(), {})
+            return sum(1 for client in clients.values() if not client.is_closed)
+
+    async def aclose(self):
+        """Close every client that belongs to the running loop."""
+        with self._lock:
+            clients = self._clients.pop(asyncio.get_running_loop(), {})
+        for client in clients.values():
+            await client.aclose()
+
+
+# Create a default client pool instance
+client_pool = AsyncClientPool()
+
+
+def run(main, pool=None):
+    """asyncio.run() a coroutine and close the pooled clients of its loop before the loop ends."""
+    pool = pool or client_pool
+
+    async def run_and_close():
+        try:
+            return await main
+        finally:
+            await pool.aclose()
+
+    return asyncio.run(run_and_close())
+
+
+class AsyncProviderClient:
+    """Base class for the async provider clients."""
+
+    provider = None
+
+    def __init__(self, api_key=None, pool=None):
+        self.api_key = api_key
+        self.pool = pool or client_pool
+
+    @property
+    def client(self):
+        return self.pool.get(self.provider)
+
+    def headers(self):
+        """Authentication headers for the provider."""
+        return {"Authorization": f"Bearer {self.api_key}"}
+
+    async def request(self, method, url, **kwargs):
+        """Send a request and raise for HTTP errors."""
+        headers = dict(self.headers())
+        headers.update(kwargs.pop("headers", {}))
+        response = await self.client.request(method, url, headers=headers, **kwargs)
+        response.raise_for_status()
+        return response
+
+    async def poll(self, check, interval=2.0, max_interval=15.0, deadline=None):
+        """Call check() until it returns a value other than None.
+
+        The interval grows by half after each check, and the whole wait is
+        cancelled with asyncio.TimeoutError once deadline seconds have passed.
+        """
+        async def wait():
+            delay = interval
+            while True:
+                result = await check()
+                if result is not None:
+                    return result
+                await asyncio.sleep(delay)
+                delay = min(delay * 1.5, max_interval)
+
+        return await asyncio.wait_for(wait(), timeout=deadline or PROVIDER_DEADLINES.get(self.provider))
+
+
+class AsyncOpenAIClient(AsyncProviderClient):
+    """Chat completions and text-to-speech."""
+
+    provider = "openai"
+
+    async def chat(self, model, messages, **kwargs):
+        """Return the text of the first chat completion choice."""
+        response = await self.request(
+            "POST", "/chat/completions", json={"model": model, "messages": messages, **kwargs}
+        )
+        return response.json()["choices"][0]["message"]["content"].strip()
+
+    async def speech(self, output_path, model, voice, text, **kwargs):
+        """Stream synthesized speech into output_path."""
+        headers = dict(self.headers())
+        payload = {"model": model, "voice": voice, "input": text, **kwargs}
+        async with self.client.stream("POST", "/audio/speech", json=payload, headers=headers) as response:
+            response.raise_for_status()
+            with open(output_path, "wb") as f:
+                async for chunk in response.aiter_bytes():
+                    f.write(chunk)
+        return output_path
+
+
+class AsyncReplicateClient(AsyncProviderClient):
+    """Replicate predictions."""
+
+    provider = "replicate"
+
+    def headers(self):
+        return {"Authorization": f"Bearer {self.api_key}", "Content-Type": "application/json"}
+
+    @staticmethod
+    def file_input(path):
+        """Encode a local file as a data URI, which Replicate accepts for file inputs."""
+        content_type = mimetypes.guess_type(path)[0] or "application/octet-stream"
+        with open(path, "rb") as f:
+            encoded = base64.b64encode(f.read()).decode("ascii")
+        return f"data:{content_type};base64,{encoded}"
+
+    async def create_prediction(self, model, input_data, webhook=None, webhook_events_filter=None):
+        """Start a prediction for an official model and return its JSON."""
+        payload = {"input": input_data}
+        if webhook:
+            payload["webhook"] = webhook
+            payload["webhook_events_filter"] = webhook_events_filter or ["completed"]
+        response = await self.request("POST", f"/models/{model}/predictions", json=payload)
+        return response.json()
+
+    async def get_prediction(self, prediction_id):
+        response = await self.request("GET", f"/predictions/{prediction_id}")
+        return response.json()
+
+    async def cancel_prediction(self, prediction_id):
+        response = await self.request("POST", f"/predictions/{prediction_id}/cancel")
+        return response.json()
+
+    async def run(self, model, input_data, deadline=None):
+        """Create a prediction and wait for its output.
+
+        If the wait is cancelled or times out, the remote prediction is
+        cancelled as well so it stops consuming credits.
+        """
+        prediction = await self.create_prediction(model, input_data)
+        prediction_id = prediction["id"]
+
+        async def check():
+            current = await self.get_prediction(prediction_id)
+            if current["status"] == "succeeded":
+                return current
+            if current["status"] in ("failed", "canceled"):
+                raise ProviderError(f"Prediction {prediction_id} {current['status']}: {current.get('error')}")
+            return None
+
+        try:
+            result = await self.poll(check, deadline=deadline)
+        except (asyncio.CancelledError, asyncio.TimeoutError):
+            try:
+                await asyncio.shield(self.cancel_prediction(prediction_id))
+            except Exception as e:
+                print(f"Error cancelling prediction {prediction_id}: {str(e)}")
+            raise
+
+        output = result.get("output")
+        return output[0] if isinstance(output, list) else output
+
+
+class AsyncSonautoClient(AsyncProviderClient):
+    """SonAuto music generations."""
+
+    provider = "sonauto"
+
+    def headers(self):
+        return {"Authorization": f"Bearer {self.api_key}", "Content-Type": "application/json"}
+
+    async def create_generation(self, payload):
+        """Start a generation and return its ID."""
+        response = await self.request("POST", "/generations", json=payload)
+        data = response.json()
+        return data.get("id") or data.get("task_id")
+
+    async def get_generation(self, generation_id):
+        response = await self.request("GET", f"/generations/{generation_id}")
+        return response.json()
+
+    async def generate(self, payload, deadline=None):
+        """Run a generation to completion and return the URL of the song."""
+        generation_id = await self.create_generation(payload)
+
+        async def check():
+            data = await self.get_generation(generation_id)
+            status = str(data.get("status", "")).lower()
+            if status in ("completed", "success"):
+                return data.get("output_url") or (data.get("song_paths") or [None])[0]
+            if status in ("failed", "failure"):
+                raise ProviderError(f"Music generation failed: {data.get('error')}")
+            return None
+
+        return await self.poll(check, interval=5.0, max_interval=20.0, deadline=deadline)
+
+
+class AsyncPexelsClient(AsyncProviderClient):
+    """Pexels video search."""
+
+    provider = "pexels"
+
+    def headers(self):
+        return {"Authorization": self.api_key or ""}
+
+    async def search_videos(self, params):
+        response = await self.request("GET", "/videos/search", params=params)
+        return response.json().get("videos", [])
+
+
+async def download(url, output_path, pool=None):
+    """Stream url into output_path using the shared download client."""
+    client = (pool or client_pool).get("download")
+    os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
+    async with client.stream("GET", url) as response:
+        response.raise_for_status()
+        with open(output_path, "wb") as f:
+            async for chunk in response.aiter_bytes():
+                f.write(chunk)
+    return output_path
@@ -0,0 +1,174 @@
+import os
+import json
+import hashlib
+from services.artifact_cache import file_sha256
+from services.assets import asset_registry
+
+# Project columns that hold each step's output
+STEP_PATH_ATTRS = {
+    "image": "image_path",
+    "voice": "voice_path",
+    "video": "video_path",
+    "music": "music_path",
+    "final": "final_video_path",
+}
+
+
+def step_output_path(result):
+    """Return the artifact path produced by a step result, if any."""
+    if isinstance(result, str):
+        return result
+    if isinstance(result, dict):
+        return result.get("filename")
+    return None
+
+
+def artifact_paths(result):
+    """Paths of the files a list or dict result refers to, e.g. a clip list.
+
+    Step outputs are all written under static/, which tells them apart from
+    text such as a storyboard's shot prompts.
+    """
+    if isinstance(result, dict):
+        values = result.values()
+    elif isinstance(result, (list, tuple)):
+        values = result
+    else:
+        return []
+
+    paths = []
+    for value in values:
+        if isinstance(value, str) and value.startswith("static/"):
+            paths.append(value)
+        elif isinstance(value, (list, tuple, dict)):
+            paths += artifact_paths(value)
+    return paths
+
+
+class CheckpointStore:
+    """Per-project record of completed pipeline steps.
+
+    Each checkpoint stores the step result, the hash of the inputs it was
+    produced from and the SHA-256 of its output file. A checkpoint is only
+    reused when the inputs are unchanged and the file on disk still matches
+    its hash, so rerunning an upstream step invalidates everything that
+    depended on it.
+    """
+
+    def __init__(self, project):
+        self.project = project
+        self.checkpoints = {}
+        self.input_hashes = {}
+
+    def load(self):
+        """Load the project's checkpoints from the database."""
+        if not self.project or not self.project.id:
+            return self
+
+        from app import PipelineCheckpoint
+
+        for checkpoint in PipelineCheckpoint.query.filter_by(project_id=self.project.id).all():
+            self.checkpoints[checkpoint.step] = {
+                "input_hash": checkpoint.input_hash,
+                "output_path": checkpoint.output_path,
+                "output_hash": checkpoint.output_hash,
+                "result": json.loads(checkpoint.result) if checkpoint.result else None,
+            }
+        return self
+
+    def input_hash(self, inputs):
+        """Hash the results a step was given as inputs."""
+        encoded = json.dumps(inputs, sort_keys=True, default=str).encode("utf-8")
+        return hashlib.sha256(encoded).hexdigest()
+
+    def lookup(self, step, inputs):
+        """Return the stored result for step if its checkpoint is still valid, else None."""
+        input_hash = self.input_hash(inputs)
+        self.input_hashes[step] = input_hash
+
+        checkpoint = self.checkpoints.get(step)
+        if not checkpoint or checkpoint["input_hash"] != input_hash or checkpoint["result"] is None:
+            return None
+
+        if step == "idea":
+            # A manually edited idea wins over the checkpointed one
+            result = checkpoint["result"]
+            if self.project and (self.project.idea, self.project.prompt) != (result.get("idea"), result.get("prompt")):
+                return None
+            return result
+
+        # Files of a clip list are not hashed, but they must still be there
+        missing = [path for path in artifact_paths(checkpoint["result"]) if not os.path.exists(path)]
+        if missing:
+            print(f"Checkpoint for {step} is invalid: {missing[0]} is missing")
+            return None
+
+        output_path = checkpoint["output_path"]
+        if step_output_path(checkpoint["result"]) is None:
+            # Not a file (e.g. a storyboard's shot prompts), unchanged inputs are enough
+            return checkpoint["result"]
+        if not output_path or not os.path.exists(output_path):
+            return None
+        if file_sha256(output_path) != checkpoint["output_hash"]:
+            print(f"Checkpoint for {step} is invalid: {output_path} has changed")
+            return None
+
+        return checkpoint["result"]
+
+    def record(self, step, result, inputs=None):
+        """Add or update the checkpoint of a completed step; the caller commits.
+
+        inputs only needs to be passed when lookup wasn't called for the step
+        in this store, e.g. when a remote step is collected by another task.
+        """
+        if inputs is not None:
+            self.input_hashes[step] = self.input_hash(inputs)
+        if not self.project or not self.project.id or step not in self.input_hashes:
+            return
+
+        from app import db, PipelineCheckpoint
+
+        output_path = step_output_path(result)
+        output_hash = file_sha256(output_path) if output_path and os.path.exists(output_path) else None
+
+        checkpoint = PipelineCheckpoint.query.filter_by(project_id=self.project.id, step=step).first()
+        if not checkpoint:
+            checkpoint = PipelineCheckpoint(project_id=self.project.id, step=step)
+            db.session.add(checkpoint)
+
+        checkpoint.input_hash = self.input_hashes[step]
+        checkpoint.output_path = output_path
+        checkpoint.output_hash = output_hash
+        checkpoint.result = json.dumps(result)
+
+        # Keep the output's metadata with the project, probed once per content hash
+        asset_registry.register(self.project, step, output_path, output_hash)
+
+        self.checkpoints[step] = {
+            "input_hash": checkpoint.input_hash,
+            "output_path": output_path,
+            "output_hash": output_hash,
+            "result": result,
+        }
+
+    def clear(self):
+        """Remove all checkpoints of the project, e.g. after a successful run."""
+        self.checkpoints = {}
+        if not self.project or not self.project.id:
+            return
+
+        from app import PipelineCheckpoint
+
+        PipelineCheckpoint.query.filter_by(project_id=self.project.id).delete()
+
+    def restore(self, step, result):
+        """Point the project back at a checkpointed step's output."""
+        if not self.project:
+            return
+
+        if step == "idea":
+            self.project.idea = result.get("idea")
+            self.project.prompt = result.get("prompt")
+        elif step in STEP_PATH_ATTRS and step_output_path(result):
+            output_path = step_output_path(result)
+            setattr(self.project, STEP_PATH_ATTRS[step], output_path.replace("static/", "", 1))
@@ -0,0 +1,221 @@
+"""Segment-parallel H.264 encoding of long renders.
+
+One libx264 process stops scaling well past a few cores, so a long video
+is split into segments at keyframes of the source, the segments are
+encoded by separate ffmpeg processes at the same time and the results are
+joined by stream copy. Every segment starts with its own IDR frame and
+uses the same encoder settings, so the joined stream is identical in
+structure to a single encode. Audio is not touched here; the caller mixes
+and encodes it once when muxing the joined video.
+
+Compare worker counts on a long clip with:
+
+    python -m services.chunked_encoding benchmark --make-clip 60 --profile 1080p
+    python -m services.chunked_encoding benchmark clip.mp4 --workers 1 2 4 8
+"""
+import os
+import time
+import shutil
+import argparse
+import tempfile
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from services.encoding import ENCODING_PROFILES, encoding_profile, video_args, fit_filter, make_clip
+from services.mezzanine import MEZZANINE_PROFILE, concat_copy
+
+# Segments encoded at the same time
+CHUNKED_WORKERS = int(os.getenv("CHUNKED_WORKERS") or os.cpu_count() or 2)
+
+# Renders shorter than this are encoded in one process; splitting costs a
+# few keyframe-aligned seeks and a join, which short videos don't win back
+CHUNKED_MIN_DURATION = float(os.getenv("CHUNKED_MIN_DURATION", 20))
+
+# Segments shorter than this are merged into their neighbour
+MIN_SEGMENT_SECONDS = 2.0
+
+
+def probe_duration(video_path):
+    result = subprocess.run(
+        ["ffprobe", "-v", "error", "-show_entries", "format=duration", "-of", "csv=p=0", video_path],
+        check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True
+    )
+    return float(result.stdout.strip())
+
+
+def keyframe_times(video_path):
+    """Timestamps of the source's keyframes; only the keyframes are decoded to find them."""
+    result = subprocess.run(
+        [
+            "ffprobe", "-v", "error",
+            "-select_streams", "v:0",
+            "-skip_frame", "nokey",
+            "-show_entries", "frame=pts_time",
+            "-of", "csv=p=0",
+            video_path
+        ],
+        check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True
+    )
+    times = []
+    for line in result.stdout.split():
+        try:
+            times.append(float(line.strip(",")))
+        except ValueError:
+            continue
+    return sorted(set(times))
+
+
+def plan_segments(keyframes, duration, count, min_length=MIN_SEGMENT_SECONDS):
+    """Split [0, duration) into up to count (start, end) ranges that start on keyframes.
+
+    Cuts are placed at the first keyframe at or after each equal share of
+    the duration, so the seek into every segment lands on a keyframe and
+    decoding does not start early.
+    """
+    cuts = []
+    for index in range(1, count):
+        target = duration * index / count
+        keyframe = next((time for time in keyframes if time >= target), None)
+        if keyframe is None or keyframe >= duration - min_length:
+            break
+        if keyframe - (cuts[-1] if cuts else 0.0) >= min_length:
+            cuts.append(keyframe)
+
+    bounds = [0.0] + cuts + [duration]
+    return list(zip(bounds[:-1], bounds[1:]))
+
+
+def segment_command(video_path, start, end, output_path, profile, video_filter=None, threads=0):
+    command = ["ffmpeg", "-v", "error", "-nostdin"]
+    if start > 0:
+        command += ["-ss", f"{start:.6f}"]
+    command += ["-to", f"{end:.6f}", "-i", video_path, "-an"]
+    if video_filter:
+        command += ["-vf", video_filter]
+    command += [
+        *video_args(profile),
+        "-threads", str(threads),
+        # Segments must share a time base to be joined by stream copy
+        "-video_track_timescale", str(MEZZANINE_PROFILE["timescale"]),
+        "-y",
+        output_path
+    ]
+    return command
+
+
+def encode_chunked(video_path, output_path, profile, video_filter=None, max_duration=None, workers=None):
+    """Encode the video stream of a file with a profile, split across parallel processes.
+
+    Args:
+        video_path (str): Source video; a single file, any codec
+        output_path (str): Where the encoded, video-only MP4 is written
+        profile (dict): Encoding profile from services.encoding
+        video_filter (str): Filter applied to every segment, e.g. fit_filter(profile)
+        max_duration (float): Only the first max_duration seconds are encoded
+        workers (int): Segments encoded at the same time, default CHUNKED_WORKERS
+
+    Returns:
+        dict: The output path, the segments and the encode wall time
+    """
+    started = time.perf_counter()
+    workers = max(1, workers or CHUNKED_WORKERS)
+    duration = probe_duration(video_path)
+    if max_duration:
+        duration = min(duration, float(max_duration))
+
+    if workers > 1:
+        segments = plan_segments(keyframe_times(video_path), duration, workers)
+    else:
+        segments = [(0.0, duration)]
+
+    directory = os.path.dirname(output_path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+
+    if len(segments) == 1:
+        subprocess.run(segment_command(video_path, 0.0, duration, output_path, profile, video_filter),
+                       check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    else:
+        # The cores are split between the segment encoders
+        threads = max(1, (os.cpu_count() or 1) // len(segments))
+        root, _ = os.path.splitext(output_path)
+        segment_paths = [f"{root}_part{index}.mp4" for index in range(len(segments))]
+        try:
+            with ThreadPoolExecutor(max_workers=len(segments)) as pool:
+                futures = [
+                    pool.submit(
+                        subprocess.run,
+                        segment_command(video_path, start, end, segment_path, profile, video_filter, threads),
+                        check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE
+                    )
+                    for (start, end), segment_path in zip(segments, segment_paths)
+                ]
+                for future in futures:
+                    future.result()
+
+            concat_copy(segment_paths, output_path)
+        finally:
+            for segment_path in segment_paths:
+                if os.path.exists(segment_path):
+                    os.remove(segment_path)
+
+    return {
+        "path": output_path,
+        "segments": [(round(start, 3), round(end, 3)) for start, end in segments],
+        "seconds": round(time.perf_counter() - started, 3),
+    }
+
+
+def should_chunk(duration, workers=None):
+    """Whether a render of this length is worth splitting."""
+    return (workers or CHUNKED_WORKERS) > 1 and duration >= CHUNKED_MIN_DURATION
+
+
+def benchmark(video_path, profile_name="1080p", worker_counts=(1, 2, 4, 8)):
+    """Encode a clip with each worker count; returns a row of timings per count."""
+    profile = encoding_profile(profile_name)
+    workdir = tempfile.mkdtemp(prefix="chunked-bench-")
+    rows = []
+    try:
+        for workers in worker_counts:
+            output = os.path.join(workdir, f"workers_{workers}.mp4")
+            result = encode_chunked(video_path, output, profile, fit_filter(profile), workers=workers)
+            rows.append({
+                "workers": workers,
+                "segments": len(result["segments"]),
+                "seconds": result["seconds"],
+                "size_mb": round(os.path.getsize(output) / 1024 ** 2, 2),
+            })
+            os.remove(output)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    baseline = rows[0]["seconds"] if rows else None
+    for row in rows:
+        row["speedup"] = round(baseline / row["seconds"], 2) if baseline and row["seconds"] else None
+    return rows
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark segment-parallel encoding.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    bench_parser = subparsers.add_parser("benchmark", help="Encode a clip with 1/2/4/8 workers and print a table")
+    bench_parser.add_argument("video", nargs="?")
+    bench_parser.add_argument("--make-clip", type=float, metavar="SECONDS", help="Benchmark a generated 1080p test clip of this length")
+    bench_parser.add_argument("--profile", default="1080p", choices=list(ENCODING_PROFILES))
+    bench_parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+    args = parser.parse_args()
+
+    video = args.video
+    if args.make_clip:
+        video = os.path.join(tempfile.gettempdir(), f"encoding_bench_{int(args.make_clip)}s.mp4")
+        if not os.path.exists(video):
+            print(f"Encoding a {args.make_clip}s test clip to {video}...")
+            make_clip(video, args.make_clip)
+    if not video:
+        parser.error("benchmark needs a video or --make-clip")
+
+    print(f"Profile {args.profile} on {os.cpu_count()} cores")
+    print(f"{'workers':>8}{'segments':>10}{'seconds':>10}{'speedup':>9}{'MB':>9}")
+    for row in benchmark(video, args.profile, args.workers):
+        print(f"{row['workers']:>8}{row['segments']:>10}{row['seconds']:>10.2f}{row['speedup']:>9.2f}{row['size_mb']:>9.2f}")
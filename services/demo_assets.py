@@ -0,0 +1,210 @@
+"""Pre-rendered placeholder assets for demo mode.
+
+Without provider keys every step used to render its placeholder from
+scratch: a PIL image, a looped-image ffmpeg encode, a text card encoded
+to video. The pack renders each placeholder once per resolution and
+duration and the steps hard-link it into place, so a demo run does
+almost no work of its own and benchmarks of the pipeline are not
+dominated by encoding.
+
+Assets live under DEMO_ASSETS_DIR/v<DEMO_ASSETS_VERSION>; bump the version
+whenever the renders change so stale packs are never served. Build the
+pack at install time with:
+
+    python -m services.demo_assets build
+"""
+import os
+import json
+import shutil
+import argparse
+import tempfile
+import threading
+import subprocess
+from services.encoding import ENCODING_PROFILES, encoding_profile, oriented
+from services.mezzanine import mezzanine_profile, normalize_command
+
+DEMO_ASSETS_VERSION = 2
+
+# Not under static/; projects get hard links of the assets they use, the pack itself is not served
+DEMO_ASSETS_DIR = os.getenv("DEMO_ASSETS_DIR", "instance/cache/demo_assets")
+
+# Size of the placeholder start image, the Flux request's 9:16 frame
+DEMO_IMAGE_SIZE = (768, 1344)
+
+# Length of the placeholder voice and music; the final video ends with the video
+DEMO_AUDIO_SECONDS = 30
+
+# Clip lengths rendered by a full build, besides whatever is requested later
+DEMO_VIDEO_SECONDS = (10,)
+
+IMAGE_COLOR = (73, 109, 137)
+CARD_COLOR = (30, 64, 175)
+CARD_TEXT = "AI Video Generator"
+
+
+def link_file(source, destination):
+    """Hard-link source to destination, falling back to a copy across devices."""
+    directory = os.path.dirname(destination)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    if os.path.exists(destination):
+        os.remove(destination)
+    try:
+        os.link(source, destination)
+    except OSError:
+        shutil.copyfile(source, destination)
+    return destination
+
+
+def render_image(output_path, size=DEMO_IMAGE_SIZE):
+    from PIL import Image
+
+    Image.new('RGB', size, color=IMAGE_COLOR).save(output_path)
+
+
+def render_card(output_path, width, height):
+    """Draw the placeholder title card at a frame size."""
+    from PIL import Image, ImageDraw, ImageFont
+
+    img = Image.new('RGB', (width, height), color=CARD_COLOR)
+    draw = ImageDraw.Draw(img)
+    try:
+        # Try to use a system font, scaled with the frame
+        font = ImageFont.truetype("Arial", max(20, height // 12))
+    except IOError:
+        # Fall back to default font
+        font = ImageFont.load_default()
+
+    text_width, text_height = draw.textbbox((0, 0), CARD_TEXT, font=font)[2:4]
+    draw.text(((width - text_width) // 2, (height - text_height) // 2), CARD_TEXT, fill=(255, 255, 255), font=font)
+    img.save(output_path)
+
+
+def render_video(output_path, profile_name, seconds, portrait=False):
+    """Encode the title card as a clip in the mezzanine profile of an encoding profile.
+
+    The clip can be joined with normalized stock clips and copied into the
+    final video as it is. Portrait clips stand in for the 9:16 generated
+    clips and use the profile's upright frame.
+    """
+    encoding = encoding_profile(profile_name)
+    if portrait:
+        encoding = oriented(encoding, *DEMO_IMAGE_SIZE)
+    profile = mezzanine_profile(encoding)
+    card_path = f"{output_path}.png"
+    render_card(card_path, profile["width"], profile["height"])
+    try:
+        input_args = ["-loop", "1", "-framerate", str(profile["fps"]), "-t", str(seconds)]
+        subprocess.run(normalize_command(card_path, output_path, profile, input_args=input_args),
+                       check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    finally:
+        os.remove(card_path)
+
+
+def render_audio(output_path, source, seconds):
+    """Encode a lavfi audio source as MP3, so the final mix has real audio to work on."""
+    subprocess.run(
+        [
+            "ffmpeg", "-v", "error", "-nostdin",
+            "-f", "lavfi", "-i", source,
+            "-t", str(seconds),
+            "-c:a", "libmp3lame", "-b:a", "128k",
+            "-y", output_path
+        ],
+        check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE
+    )
+
+
+class DemoAssetPack:
+    """Versioned set of pre-rendered placeholder assets.
+
+    Each asset is rendered at most once per pack version, into a temporary
+    file that is renamed into place, so processes sharing the directory
+    never serve a half-written asset.
+    """
+
+    def __init__(self, root=None, version=DEMO_ASSETS_VERSION):
+        self.version = version
+        self.directory = os.path.join(root or DEMO_ASSETS_DIR, f"v{version}")
+        self._lock = threading.Lock()
+
+    def asset_name(self, kind, profile=None, seconds=None, portrait=False):
+        if kind == "image":
+            return f"image_{DEMO_IMAGE_SIZE[0]}x{DEMO_IMAGE_SIZE[1]}.png"
+        if kind == "video":
+            return f"video_{profile}{'_portrait' if portrait else ''}_{seconds:g}s.mp4"
+        if kind in ("voice", "music"):
+            return f"{kind}_{DEMO_AUDIO_SECONDS}s.mp3"
+        raise ValueError(f"Unknown demo asset kind '{kind}'")
+
+    def render(self, kind, output_path, profile=None, seconds=None, portrait=False):
+        if kind == "image":
+            render_image(output_path)
+        elif kind == "video":
+            render_video(output_path, profile, seconds, portrait)
+        elif kind == "voice":
+            # Pink noise at a speech-like level stands in for narration
+            render_audio(output_path, "anoisesrc=color=pink:amplitude=0.05:sample_rate=44100", DEMO_AUDIO_SECONDS)
+        elif kind == "music":
+            render_audio(output_path, "sine=frequency=220:sample_rate=44100", DEMO_AUDIO_SECONDS)
+
+    def path(self, kind, profile=None, seconds=None, portrait=False):
+        """Path of an asset in the pack, rendering it first if it is missing."""
+        asset_path = os.path.join(self.directory, self.asset_name(kind, profile, seconds, portrait))
+        if os.path.exists(asset_path):
+            return asset_path
+
+        with self._lock:
+            if not os.path.exists(asset_path):
+                os.makedirs(self.directory, exist_ok=True)
+                print(f"Rendering demo asset {asset_path}...")
+                _, extension = os.path.splitext(asset_path)
+                descriptor, temp_path = tempfile.mkstemp(suffix=extension, dir=self.directory)
+                os.close(descriptor)
+                try:
+                    self.render(kind, temp_path, profile, seconds, portrait)
+                    os.replace(temp_path, asset_path)
+                finally:
+                    if os.path.exists(temp_path):
+                        os.remove(temp_path)
+        return asset_path
+
+    def link(self, kind, output_path, profile=None, seconds=None, portrait=False):
+        """Hard-link an asset to output_path; steps never write to their outputs in place."""
+        return link_file(self.path(kind, profile, seconds, portrait), output_path)
+
+    def build(self, profiles=None, durations=DEMO_VIDEO_SECONDS):
+        """Render every asset of the pack that is not there yet and write its manifest."""
+        assets = [("image", None, None, False), ("voice", None, None, False), ("music", None, None, False)]
+        assets += [
+            ("video", profile, seconds, portrait)
+            for profile in profiles or ENCODING_PROFILES for seconds in durations for portrait in (False, True)
+        ]
+
+        for kind, profile, seconds, portrait in assets:
+            self.path(kind, profile, seconds, portrait)
+
+        manifest = {
+            "version": self.version,
+            "assets": sorted(name for name in os.listdir(self.directory) if not name.startswith(("tmp", "manifest"))),
+        }
+        with open(os.path.join(self.directory, "manifest.json"), "w") as file:
+            json.dump(manifest, file, indent=2)
+        return manifest
+
+
+# Create a default demo asset pack instance
+demo_assets = DemoAssetPack()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Render the demo mode placeholder assets.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    build_parser = subparsers.add_parser("build", help="Render the missing assets of the current pack version")
+    build_parser.add_argument("--profiles", nargs="+", choices=list(ENCODING_PROFILES))
+    build_parser.add_argument("--durations", nargs="+", type=float, default=list(DEMO_VIDEO_SECONDS))
+    args = parser.parse_args()
+
+    manifest = demo_assets.build(args.profiles, args.durations)
+    print(f"Demo asset pack v{manifest['version']} in {demo_assets.directory}: {len(manifest['assets'])} assets")
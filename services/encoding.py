@@ -0,0 +1,187 @@
+"""Encoding profiles for the rendered videos.
+
+Each subscription plan's resolution in payments.SUBSCRIPTION_PLANS names
+one of ENCODING_PROFILES, and the plan's max_duration caps the length of
+the render. Free renders use a fast preset; only the paid tiers pay for
+the slower presets that get more quality per bit. Every encode of the
+pipeline takes its size, preset, CRF and audio bitrate from the profile.
+
+Profiles are defined landscape. Portrait sources, such as the 9:16 clips
+of the AI path, are encoded at the same frame turned upright (720x1280
+for 720p) instead of being cropped to a landscape strip.
+
+Compare encode time and output size of the profiles with:
+
+    python -m services.encoding benchmark --make-clip 20
+    python -m services.encoding benchmark clip.mp4 --profiles 720p 1080p
+"""
+import os
+import time
+import shutil
+import argparse
+import tempfile
+import subprocess
+
+ENCODING_PROFILES = {
+    "720p": {"width": 1280, "height": 720, "preset": "veryfast", "crf": 23, "audio_bitrate": "128k"},
+    "1080p": {"width": 1920, "height": 1080, "preset": "medium", "crf": 21, "audio_bitrate": "192k"},
+    "4K": {"width": 3840, "height": 2160, "preset": "slow", "crf": 20, "audio_bitrate": "256k"},
+}
+
+# Tier of users that have no subscription plan of their own
+DEFAULT_TIER = "free"
+
+# Tiers rendered like one of the subscription plans
+TIER_ALIASES = {"admin": "enterprise"}
+
+# Profile of renders without a user (batch runs, scripts), uncapped
+DEFAULT_PROFILE = os.getenv("ENCODING_PROFILE", "720p")
+
+
+def encoding_profile(name, max_duration=None):
+    """Return a copy of a named profile with an optional duration cap in seconds."""
+    if name not in ENCODING_PROFILES:
+        raise ValueError(f"Unknown encoding profile '{name}', expected one of {', '.join(ENCODING_PROFILES)}")
+    return dict(ENCODING_PROFILES[name], name=name, max_duration=max_duration)
+
+
+def profile_for_tier(tier):
+    """Resolve a subscription tier to its plan's profile and duration cap."""
+    from payments import SUBSCRIPTION_PLANS
+
+    tier = TIER_ALIASES.get(tier, tier)
+    if tier not in SUBSCRIPTION_PLANS:
+        tier = DEFAULT_TIER
+    features = SUBSCRIPTION_PLANS[tier]["features"]
+
+    name = features.get("resolution")
+    if name not in ENCODING_PROFILES:
+        name = DEFAULT_PROFILE
+    return dict(encoding_profile(name, features.get("max_duration")), tier=tier)
+
+
+def profile_for_user(user=None):
+    """The profile a user's renders are encoded with."""
+    if user is None:
+        return dict(encoding_profile(DEFAULT_PROFILE), tier=None)
+    return profile_for_tier(getattr(user, "subscription_tier", None) or DEFAULT_TIER)
+
+
+def video_args(profile):
+    """ffmpeg output arguments of the profile's H.264 encode."""
+    return [
+        "-c:v", "libx264",
+        "-preset", profile["preset"],
+        "-crf", str(profile["crf"]),
+        "-pix_fmt", "yuv420p",
+    ]
+
+
+def audio_args(profile):
+    return ["-c:a", "aac", "-b:a", profile["audio_bitrate"]]
+
+
+def duration_args(profile):
+    """Cap the output at the plan's maximum duration, if it has one."""
+    return ["-t", str(profile["max_duration"])] if profile.get("max_duration") else []
+
+
+def fit_filter(profile):
+    """Scale and crop a stream to fill the profile's frame size."""
+    width, height = profile["width"], profile["height"]
+    return f"scale={width}:{height}:force_original_aspect_ratio=increase,crop={width}:{height},setsar=1"
+
+
+def oriented(profile, width, height):
+    """The profile with its frame turned to the orientation of a width x height source."""
+    portrait = bool(width and height) and height > width
+    if portrait == (profile["height"] > profile["width"]):
+        return profile
+    return dict(profile, width=profile["height"], height=profile["width"])
+
+
+def matches_size(info, profile):
+    """Whether probed video stream info already has the profile's frame size and codec."""
+    return (
+        info.get("codec_name") == "h264"
+        and info.get("width") == profile["width"]
+        and info.get("height") == profile["height"]
+        and info.get("pix_fmt") == "yuv420p"
+    )
+
+
+def make_clip(output_path, seconds):
+    """Encode a 1080p 30 fps test clip with motion and noise, losslessly enough to be a fair source."""
+    subprocess.run(
+        [
+            "ffmpeg", "-v", "error",
+            "-f", "lavfi", "-i", f"testsrc2=size=1920x1080:rate=30:duration={seconds}",
+            "-vf", "noise=alls=12:allf=t",
+            "-c:v", "libx264", "-preset", "ultrafast", "-crf", "10", "-pix_fmt", "yuv420p",
+            "-y", output_path
+        ],
+        check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE
+    )
+    return output_path
+
+
+def benchmark(video_path, names=None):
+    """Encode a clip with each profile; returns a row of timings and sizes per profile."""
+    workdir = tempfile.mkdtemp(prefix="encoding-bench-")
+    rows = []
+    try:
+        for name in names or ENCODING_PROFILES:
+            profile = encoding_profile(name)
+            output = os.path.join(workdir, f"{name}.mp4")
+            started = time.perf_counter()
+            subprocess.run(
+                ["ffmpeg", "-v", "error", "-i", video_path, "-an", "-vf", fit_filter(profile),
+                 *video_args(profile), "-y", output],
+                check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE
+            )
+            seconds = time.perf_counter() - started
+
+            duration = float(subprocess.run(
+                ["ffprobe", "-v", "error", "-show_entries", "format=duration", "-of", "csv=p=0", output],
+                check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True
+            ).stdout.strip())
+            size = os.path.getsize(output)
+            rows.append({
+                "profile": name,
+                "preset": profile["preset"],
+                "crf": profile["crf"],
+                "encode_seconds": round(seconds, 2),
+                "realtime": round(duration / seconds, 2) if seconds else None,
+                "size_mb": round(size / 1024 ** 2, 2),
+                "kbps": round(size * 8 / duration / 1000) if duration else None,
+            })
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    return rows
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the encoding profiles.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    bench_parser = subparsers.add_parser("benchmark", help="Encode a clip with each profile and print a table")
+    bench_parser.add_argument("video", nargs="?")
+    bench_parser.add_argument("--make-clip", type=float, metavar="SECONDS", help="Benchmark a generated 1080p test clip of this length")
+    bench_parser.add_argument("--profiles", nargs="+", choices=list(ENCODING_PROFILES))
+    args = parser.parse_args()
+
+    video = args.video
+    if args.make_clip:
+        video = os.path.join(tempfile.gettempdir(), f"encoding_bench_{int(args.make_clip)}s.mp4")
+        if not os.path.exists(video):
+            print(f"Encoding a {args.make_clip}s test clip to {video}...")
+            make_clip(video, args.make_clip)
+    if not video:
+        parser.error("benchmark needs a video or --make-clip")
+
+    print(f"{'profile':<9}{'preset':<10}{'crf':>4}{'seconds':>10}{'x realtime':>12}{'MB':>9}{'kb/s':>8}")
+    for row in benchmark(video, args.profiles):
+        print(
+            f"{row['profile']:<9}{row['preset']:<10}{row['crf']:>4}{row['encode_seconds']:>10.2f}"
+            f"{row['realtime']:>12.2f}{row['size_mb']:>9.2f}{row['kbps']:>8}"
+        )
@@ -0,0 +1,288 @@
+"""Frame extraction with ffmpeg.
+
+The last frame of a clip is read by seeking relative to the end of the
+file (``-sseof``): ffmpeg jumps to the keyframe before the seek point and
+only decodes the last second or so, instead of trusting a container frame
+count and decoding up to it. Frames at arbitrary timestamps are read in
+one ffmpeg process per batch, each one with its own keyframe-aware input
+seek.
+
+Frames are written as PNG files or returned as NumPy RGB arrays.
+Compare the approaches on a long clip with:
+
+    python -m services.frames benchmark clip.mp4
+    python -m services.frames benchmark --make-clip 600
+"""
+import os
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import subprocess
+
+# Seconds before the end of the clip the last-frame seek starts at; widened
+# when the window holds no decodable frame (e.g. a truncated tail)
+LAST_FRAME_WINDOWS = (1.0, 5.0)
+
+# Timestamps extracted per ffmpeg process
+BATCH_SIZE = 32
+
+
+class FrameExtractionError(Exception):
+    """ffmpeg could not produce the requested frame."""
+
+
+def run_ffmpeg(args, stdout=subprocess.PIPE):
+    return subprocess.run(
+        ["ffmpeg", "-v", "error", "-nostdin", *args],
+        check=True, stdout=stdout, stderr=subprocess.PIPE
+    )
+
+
+def video_size(video_path):
+    """Width and height of a clip's first video stream."""
+    result = subprocess.run(
+        [
+            "ffprobe", "-v", "error",
+            "-select_streams", "v:0",
+            "-show_entries", "stream=width,height",
+            "-of", "json",
+            video_path
+        ],
+        check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True
+    )
+    streams = json.loads(result.stdout).get("streams") or []
+    if not streams:
+        raise FrameExtractionError(f"No video stream in {video_path}")
+    return int(streams[0]["width"]), int(streams[0]["height"])
+
+
+def to_array(raw, width, height):
+    """Turn rgb24 bytes into a height x width x 3 NumPy array."""
+    import numpy
+
+    return numpy.frombuffer(raw, dtype=numpy.uint8).reshape(height, width, 3)
+
+
+def read_last_raw_frame(args, frame_size):
+    """Run ffmpeg with raw RGB output and keep only the last complete frame."""
+    process = subprocess.Popen(
+        ["ffmpeg", "-v", "error", "-nostdin", *args, "-f", "rawvideo", "-pix_fmt", "rgb24", "pipe:1"],
+        stdout=subprocess.PIPE, stderr=subprocess.DEVNULL
+    )
+    last = None
+    try:
+        while True:
+            frame = process.stdout.read(frame_size)
+            if len(frame) < frame_size:
+                break
+            last = frame
+    finally:
+        process.stdout.close()
+        process.wait()
+    return last
+
+
+def last_frame(video_path, output_path=None):
+    """Return the final decoded frame of a clip.
+
+    With output_path the frame is written there as an image and the path is
+    returned; otherwise it is returned as a NumPy RGB array. The seek window
+    before the end of the clip is widened if it yields nothing, and as a
+    last resort the whole clip is decoded.
+    """
+    if not os.path.exists(video_path):
+        raise FrameExtractionError(f"Video file not found at {video_path}")
+
+    # None stands for decoding the clip from the start
+    windows = list(LAST_FRAME_WINDOWS) + [None]
+
+    if output_path:
+        directory = os.path.dirname(output_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        for window in windows:
+            seek = ["-sseof", f"-{window}"] if window else []
+            if os.path.exists(output_path):
+                os.remove(output_path)
+            try:
+                # -update keeps overwriting the image, leaving the last decoded frame
+                run_ffmpeg([*seek, "-i", video_path, "-an", "-update", "1", "-y", output_path])
+            except subprocess.CalledProcessError:
+                continue
+            if os.path.exists(output_path) and os.path.getsize(output_path) > 0:
+                return output_path
+        raise FrameExtractionError(f"Could not extract the last frame of {video_path}")
+
+    width, height = video_size(video_path)
+    for window in windows:
+        seek = ["-sseof", f"-{window}"] if window else []
+        raw = read_last_raw_frame([*seek, "-i", video_path, "-an"], width * height * 3)
+        if raw:
+            return to_array(raw, width, height)
+    raise FrameExtractionError(f"Could not extract the last frame of {video_path}")
+
+
+def batch_args(video_path, timestamps):
+    """ffmpeg arguments that read one frame at each timestamp and join them into one stream.
+
+    Every timestamp is its own input with a fast (keyframe) input seek that
+    ffmpeg then decodes forward to the exact time.
+    """
+    args = []
+    for timestamp in timestamps:
+        args += ["-ss", f"{float(timestamp):.3f}", "-i", video_path]
+
+    chains = [f"[{index}:v]trim=end_frame=1,setpts=PTS-STARTPTS[f{index}]" for index in range(len(timestamps))]
+    joined = "".join(f"[f{index}]" for index in range(len(timestamps)))
+    graph = ";".join(chains + [f"{joined}concat=n={len(timestamps)}:v=1:a=0[frames]"])
+    # Passthrough timing: one output frame per timestamp, none duplicated or dropped
+    return args + ["-filter_complex", graph, "-map", "[frames]", "-vsync", "0"]
+
+
+def frames_at(video_path, timestamps, output_pattern=None):
+    """Extract the frames at the given timestamps (in seconds), in order.
+
+    With output_pattern (e.g. "static/image/frame_%03d.png", numbered from
+    1) the frames are written as images and their paths are returned;
+    otherwise a list of NumPy RGB arrays is returned.
+    """
+    if not os.path.exists(video_path):
+        raise FrameExtractionError(f"Video file not found at {video_path}")
+
+    timestamps = list(timestamps)
+    if output_pattern:
+        directory = os.path.dirname(output_pattern)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+    else:
+        width, height = video_size(video_path)
+        frame_size = width * height * 3
+
+    results = []
+    for start in range(0, len(timestamps), BATCH_SIZE):
+        batch = timestamps[start:start + BATCH_SIZE]
+        args = batch_args(video_path, batch)
+
+        if output_pattern:
+            paths = [output_pattern % number for number in range(start + 1, start + len(batch) + 1)]
+            for path in paths:
+                if os.path.exists(path):
+                    os.remove(path)
+            try:
+                run_ffmpeg(args + ["-start_number", str(start + 1), "-y", output_pattern])
+            except subprocess.CalledProcessError as e:
+                raise FrameExtractionError(e.stderr.decode("utf-8", "replace").strip())
+            missing = [timestamps[start + index] for index, path in enumerate(paths) if not os.path.exists(path)]
+            if missing:
+                raise FrameExtractionError(f"No frame at {missing} in {video_path}")
+            results.extend(paths)
+        else:
+            try:
+                raw = run_ffmpeg(args + ["-f", "rawvideo", "-pix_fmt", "rgb24", "pipe:1"]).stdout
+            except subprocess.CalledProcessError as e:
+                raise FrameExtractionError(e.stderr.decode("utf-8", "replace").strip())
+            if len(raw) < frame_size * len(batch):
+                raise FrameExtractionError(f"Only {len(raw) // frame_size} of {len(batch)} frames found in {video_path}")
+            results.extend(to_array(raw[index * frame_size:(index + 1) * frame_size], width, height)
+                           for index in range(len(batch)))
+    return results
+
+
+def opencv_last_frame(video_path, output_path):
+    """The previous approach: seek OpenCV to CAP_PROP_FRAME_COUNT - 1 (benchmark baseline)."""
+    import cv2
+
+    cap = cv2.VideoCapture(video_path)
+    try:
+        total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        cap.set(cv2.CAP_PROP_POS_FRAMES, total_frames - 1)
+        ok, frame = cap.read()
+        if not ok:
+            return False
+        return cv2.imwrite(output_path, frame)
+    finally:
+        cap.release()
+
+
+def make_clip(output_path, seconds, keyint=250):
+    """Encode a synthetic 720x1280 24 fps test clip with long GOPs (the worst case for seeking)."""
+    run_ffmpeg([
+        "-f", "lavfi", "-i", f"testsrc2=size=720x1280:rate=24:duration={seconds}",
+        "-c:v", "libx264", "-preset", "ultrafast", "-g", str(keyint), "-pix_fmt", "yuv420p",
+        "-y", output_path
+    ])
+    return output_path
+
+
+def benchmark(video_path, runs=3):
+    """Time the last-frame strategies on a clip; returns {method: seconds per extraction}."""
+    workdir = tempfile.mkdtemp(prefix="frames-bench-")
+
+    def full_decode(path, output):
+        # The fallback: decode the whole clip and keep the last frame
+        run_ffmpeg(["-i", path, "-an", "-update", "1", "-y", output])
+        return True
+
+    methods = {
+        "ffmpeg -sseof": lambda path, output: last_frame(path, output),
+        "ffmpeg full decode": full_decode,
+    }
+    try:
+        import cv2  # noqa: F401
+        methods["opencv seek"] = opencv_last_frame
+    except ImportError:
+        print("OpenCV is not installed, skipping the OpenCV baseline")
+
+    results = {}
+    try:
+        for name, method in methods.items():
+            output = os.path.join(workdir, f"{name.replace(' ', '_')}.png")
+            started = time.perf_counter()
+            for _ in range(runs):
+                method(video_path, output)
+            results[name] = round((time.perf_counter() - started) / runs, 4)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Extract frames from a clip or benchmark last-frame extraction.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    last_parser = subparsers.add_parser("last", help="Write the last frame of a clip as an image")
+    last_parser.add_argument("video")
+    last_parser.add_argument("output")
+
+    at_parser = subparsers.add_parser("at", help="Write the frames at the given timestamps")
+    at_parser.add_argument("video")
+    at_parser.add_argument("output_pattern", help='e.g. "frame_%%03d.png"')
+    at_parser.add_argument("timestamps", nargs="+", type=float)
+
+    bench_parser = subparsers.add_parser("benchmark", help="Compare -sseof, full decode and OpenCV")
+    bench_parser.add_argument("video", nargs="?")
+    bench_parser.add_argument("--make-clip", type=float, metavar="SECONDS", help="Benchmark a generated test clip of this length")
+    bench_parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args()
+
+    if args.command == "last":
+        print(last_frame(args.video, args.output))
+    elif args.command == "at":
+        for path in frames_at(args.video, args.timestamps, args.output_pattern):
+            print(path)
+    else:
+        video = args.video
+        if args.make_clip:
+            video = os.path.join(tempfile.gettempdir(), f"frames_bench_{int(args.make_clip)}s.mp4")
+            if not os.path.exists(video):
+                print(f"Encoding a {args.make_clip}s test clip to {video}...")
+                make_clip(video, args.make_clip)
+        if not video:
+            parser.error("benchmark needs a video or --make-clip")
+
+        print(f"{'method':<22}{'seconds':>10}")
+        for name, seconds in benchmark(video, args.runs).items():
+            print(f"{name:<22}{seconds:>10.4f}")
@@ -0,0 +1,123 @@
+import os
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# Connections kept open per host, sized for the number of threads that call
+# a provider at the same time (pipeline steps, stock clip downloads)
+PROVIDER_POOL_SIZES = {
+    "openai": 10,
+    "replicate": 10,
+    "sonauto": 4,
+    "pexels": 8,
+}
+
+DEFAULT_POOL_SIZE = 10
+
+# Hosts per provider whose pools are kept, e.g. api.pexels.com and the video CDN
+POOL_HOSTS = 4
+
+# Idempotent requests are retried on connection errors and these statuses
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+
+def retry_policy():
+    """Retry GET/HEAD requests with exponential backoff, honouring Retry-After.
+
+    POST requests (starting a generation) are only retried when the
+    connection could not be established, so a job is never started twice.
+    """
+    return Retry(
+        total=3,
+        connect=3,
+        read=2,
+        status=3,
+        backoff_factor=0.5,
+        status_forcelist=RETRY_STATUSES,
+        allowed_methods=frozenset(["GET", "HEAD", "OPTIONS"]),
+        respect_retry_after_header=True,
+        raise_on_status=False,
+    )
+
+
+class SessionPool:
+    """Shared keep-alive requests sessions, one per provider.
+
+    Every call to a provider (its API and the hosts its files are served
+    from) reuses the connections of the provider's session instead of doing
+    a new TCP and TLS handshake. Sessions are created per process, so forked
+    Celery workers never share sockets with their parent.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._sessions = {}
+        self._pid = os.getpid()
+
+    def session(self, provider):
+        """Return the shared session of a provider, creating it on first use."""
+        with self._lock:
+            if self._pid != os.getpid():
+                # Forked: the parent's connections must not be used here
+                self._sessions = {}
+                self._pid = os.getpid()
+
+            session = self._sessions.get(provider)
+            if session is None:
+                session = self._create_session(provider)
+                self._sessions[provider] = session
+            return session
+
+    def _create_session(self, provider):
+        pool_size = PROVIDER_POOL_SIZES.get(provider, DEFAULT_POOL_SIZE)
+        adapter = HTTPAdapter(pool_connections=POOL_HOSTS, pool_maxsize=pool_size, max_retries=retry_policy())
+
+        session = requests.Session()
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        return session
+
+    def request(self, provider, method, url, **kwargs):
+        return self.session(provider).request(method, url, **kwargs)
+
+    def get(self, provider, url, **kwargs):
+        return self.request(provider, "GET", url, **kwargs)
+
+    def post(self, provider, url, **kwargs):
+        return self.request(provider, "POST", url, **kwargs)
+
+    def stats(self):
+        """Connection reuse per provider: requests sent, connections opened and the reuse ratio."""
+        with self._lock:
+            sessions = dict(self._sessions)
+
+        stats = {}
+        for provider, session in sessions.items():
+            requests_sent = 0
+            connections = 0
+            for adapter in set(session.adapters.values()):
+                pools = adapter.poolmanager.pools
+                for key in list(pools.keys()):
+                    pool = pools.get(key)
+                    if pool is not None:
+                        requests_sent += pool.num_requests
+                        connections += pool.num_connections
+
+            stats[provider] = {
+                "requests": requests_sent,
+                "connections": connections,
+                "reused": max(requests_sent - connections, 0),
+                "reuse_ratio": round(1 - connections / requests_sent, 3) if requests_sent else 0.0,
+            }
+        return stats
+
+    def close(self):
+        with self._lock:
+            for session in self._sessions.values():
+                session.close()
+            self._sessions = {}
+
+
+# Create a default session pool instance
+http_sessions = SessionPool()
@@ -0,0 +1,214 @@
+import os
+import re
+import json
+import zlib
+import random
+import sqlite3
+import threading
+from collections import deque
+
+# Shared history database; a plain SQLite file so the standalone scripts
+# and the web app/workers can use the same store without Flask
+IDEA_HISTORY_DB = os.getenv("IDEA_HISTORY_DB", "instance/idea_history.db")
+
+# Number of most recent ideas a new idea is compared against
+IDEA_HISTORY_WINDOW = int(os.getenv("IDEA_HISTORY_WINDOW", 5000))
+
+# Estimated Jaccard similarity of word shingles at which an idea counts as a repeat
+DUPLICATE_THRESHOLD = float(os.getenv("IDEA_DUPLICATE_THRESHOLD", 0.5))
+
+# MinHash signature of NUM_BANDS * BAND_ROWS values; with 16 bands of 4 rows,
+# pairs above a similarity of about (1 / 16) ** (1 / 4) = 0.5 share a band
+NUM_BANDS = 16
+BAND_ROWS = 4
+NUM_PERMUTATIONS = NUM_BANDS * BAND_ROWS
+
+# Words per shingle
+SHINGLE_SIZE = 2
+
+MERSENNE_PRIME = (1 << 61) - 1
+MAX_HASH = (1 << 32) - 1
+
+# Fixed seed, signatures must be identical in every process
+_rng = random.Random(1722)
+PERMUTATIONS = [(_rng.randrange(1, MERSENNE_PRIME), _rng.randrange(0, MERSENNE_PRIME)) for _ in range(NUM_PERMUTATIONS)]
+
+# Words that say nothing about what makes an idea different
+STOP_WORDS = {"a", "an", "the", "of", "in", "on", "at", "to", "and", "or", "you", "are", "your", "is", "pov", "with", "under", "for", "by"}
+
+
+def shingles(text):
+    """Lowercased word n-grams of an idea, ignoring punctuation and stop words."""
+    words = [word for word in re.findall(r"[a-z0-9']+", text.lower()) if word not in STOP_WORDS]
+    if len(words) < SHINGLE_SIZE:
+        return set(words)
+    return {" ".join(words[i:i + SHINGLE_SIZE]) for i in range(len(words) - SHINGLE_SIZE + 1)}
+
+
+def minhash(shingle_set):
+    """MinHash signature of a set of shingles.
+
+    Shingles are hashed with CRC32 rather than hash(), which is salted per
+    process, so signatures can be compared across processes.
+    """
+    hashes = [zlib.crc32(shingle.encode("utf-8")) for shingle in shingle_set] or [0]
+    return tuple(min(((a * h + b) % MERSENNE_PRIME) & MAX_HASH for h in hashes) for a, b in PERMUTATIONS)
+
+
+def band_keys(signature):
+    return [(band, signature[band * BAND_ROWS:(band + 1) * BAND_ROWS]) for band in range(NUM_BANDS)]
+
+
+def jaccard(first, second):
+    if not first or not second:
+        return 0.0
+    return len(first & second) / len(first | second)
+
+
+class IdeaHistory:
+    """Shared history of generated ideas with a near-duplicate index.
+
+    Ideas are appended to a SQLite table, which is safe to write from several
+    processes at once. Each process keeps a MinHash LSH index of the last
+    IDEA_HISTORY_WINDOW ideas of a namespace in memory and catches up with
+    rows added by other processes before every lookup, so a similarity check
+    only hashes the new idea and compares it with the few ideas that share
+    an LSH band.
+    """
+
+    def __init__(self, namespace="default", path=None, window=IDEA_HISTORY_WINDOW, threshold=DUPLICATE_THRESHOLD):
+        self.namespace = namespace
+        self.path = path or IDEA_HISTORY_DB
+        self.window = window
+        self.threshold = threshold
+
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._last_id = 0
+        self._entries = {}
+        self._order = deque()
+        self._buckets = {}
+
+    def _connection(self):
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            connection = sqlite3.connect(self.path, timeout=30)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS idea_history ("
+                "id INTEGER PRIMARY KEY AUTOINCREMENT, "
+                "namespace TEXT NOT NULL, "
+                "idea TEXT NOT NULL, "
+                "created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)"
+            )
+            connection.execute("CREATE INDEX IF NOT EXISTS ix_idea_history_namespace_id ON idea_history (namespace, id)")
+            connection.commit()
+            self._local.connection = connection
+        return connection
+
+    def _index(self, entry_id, idea):
+        shingle_set = shingles(idea)
+        signature = minhash(shingle_set)
+        self._entries[entry_id] = (idea, shingle_set, signature)
+        self._order.append(entry_id)
+        for key in band_keys(signature):
+            self._buckets.setdefault(key, set()).add(entry_id)
+
+        # Forget the oldest ideas once the window is full
+        while len(self._order) > self.window:
+            old_id = self._order.popleft()
+            _, _, old_signature = self._entries.pop(old_id)
+            for key in band_keys(old_signature):
+                bucket = self._buckets.get(key)
+                if bucket is not None:
+                    bucket.discard(old_id)
+                    if not bucket:
+                        del self._buckets[key]
+
+    def refresh(self):
+        """Index the ideas other processes added since the last lookup."""
+        with self._lock:
+            if self._last_id == 0:
+                # First load: only the window is needed
+                rows = self._connection().execute(
+                    "SELECT id, idea FROM (SELECT id, idea FROM idea_history WHERE namespace = ? "
+                    "ORDER BY id DESC LIMIT ?) ORDER BY id",
+                    (self.namespace, self.window)
+                ).fetchall()
+            else:
+                rows = self._connection().execute(
+                    "SELECT id, idea FROM idea_history WHERE namespace = ? AND id > ? ORDER BY id",
+                    (self.namespace, self._last_id)
+                ).fetchall()
+
+            for entry_id, idea in rows:
+                self._index(entry_id, idea)
+                self._last_id = entry_id
+        return self
+
+    def similar(self, idea, threshold=None):
+        """Return (similarity, idea) pairs of recent ideas at least threshold similar, most similar first."""
+        threshold = self.threshold if threshold is None else threshold
+        self.refresh()
+
+        shingle_set = shingles(idea)
+        signature = minhash(shingle_set)
+        with self._lock:
+            candidates = set()
+            for key in band_keys(signature):
+                candidates.update(self._buckets.get(key, ()))
+
+            # LSH only finds candidates, confirm them with the exact Jaccard similarity
+            matches = []
+            for entry_id in candidates:
+                text, other_shingles, _ = self._entries[entry_id]
+                similarity = jaccard(shingle_set, other_shingles)
+                if similarity >= threshold:
+                    matches.append((round(similarity, 3), text))
+        return sorted(matches, reverse=True)
+
+    def is_duplicate(self, idea, threshold=None):
+        """Whether the idea is too similar to one of the last IDEA_HISTORY_WINDOW ideas."""
+        return bool(self.similar(idea, threshold))
+
+    def add(self, idea):
+        """Record a generated idea."""
+        connection = self._connection()
+        cursor = connection.execute("INSERT INTO idea_history (namespace, idea) VALUES (?, ?)", (self.namespace, idea))
+        connection.commit()
+        self.refresh()
+        return cursor.lastrowid
+
+    def recent(self, limit):
+        """The most recent ideas, oldest first."""
+        rows = self._connection().execute(
+            "SELECT idea FROM idea_history WHERE namespace = ? ORDER BY id DESC LIMIT ?",
+            (self.namespace, limit)
+        ).fetchall()
+        return [row[0] for row in reversed(rows)]
+
+    def import_json(self, json_path):
+        """Import a legacy last_ideas.json list once, when the namespace has no history yet."""
+        if not os.path.exists(json_path):
+            return 0
+        if self._connection().execute("SELECT 1 FROM idea_history WHERE namespace = ? LIMIT 1", (self.namespace,)).fetchone():
+            return 0
+
+        try:
+            with open(json_path, 'r') as file:
+                ideas = json.load(file)
+        except (ValueError, OSError):
+            return 0
+
+        ideas = [idea for idea in ideas if isinstance(idea, str) and idea.strip()] if isinstance(ideas, list) else []
+        connection = self._connection()
+        connection.executemany("INSERT INTO idea_history (namespace, idea) VALUES (?, ?)", [(self.namespace, idea) for idea in ideas])
+        connection.commit()
+        return len(ideas)
+
+
+# History of the ideas generated by the web app and its workers
+idea_history = IdeaHistory("service")
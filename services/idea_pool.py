@@ -0,0 +1,126 @@
+import os
+import time
+import hashlib
+import threading
+from datetime import datetime
+
+# Ideas generated per batch call; the idea_gen.txt examples are sent once per batch
+IDEA_BATCH_SIZE = int(os.getenv("IDEA_BATCH_SIZE", 10))
+
+# A refill is started when fewer ideas than this are ready
+IDEA_POOL_LOW_WATER = int(os.getenv("IDEA_POOL_LOW_WATER", 5))
+
+# Number of ready ideas a refill tops the pool up to
+IDEA_POOL_TARGET = int(os.getenv("IDEA_POOL_TARGET", IDEA_POOL_LOW_WATER + IDEA_BATCH_SIZE))
+
+# Minimum seconds between refill requests from one process
+REFILL_DEBOUNCE = 60
+
+# Claims retried when another worker takes the same idea first
+CLAIM_ATTEMPTS = 3
+
+
+def prompt_version(idea_prompt):
+    """Version of an idea prompt; ideas generated from an older prompt are not handed out."""
+    return hashlib.sha256(idea_prompt.encode("utf-8")).hexdigest()[:16]
+
+
+class IdeaPool:
+    """Persistent pool of pre-generated idea/prompt pairs.
+
+    Ideas are generated in batches by a background task and each one is
+    handed to exactly one project. The pool is keyed by the version of the
+    idea prompt, so editing prompts/idea_gen.txt retires the ideas generated
+    from the old text.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._last_refill = 0
+
+    def available(self, version):
+        """Number of unclaimed ideas generated from the given prompt version."""
+        from app import PooledIdea
+
+        return PooledIdea.query.filter_by(prompt_version=version, claimed_at=None).count()
+
+    def add(self, ideas, version):
+        """Store a batch of {"idea", "prompt"} dicts; the caller commits."""
+        from app import db, PooledIdea
+
+        for entry in ideas:
+            db.session.add(PooledIdea(idea=entry["idea"], prompt=entry["prompt"], prompt_version=version))
+        return len(ideas)
+
+    def claim(self, version, project=None):
+        """Take the oldest ready idea for a project, or return None if the pool is empty.
+
+        The claim is committed in a session of its own, so whatever the
+        caller has pending on the shared session is not committed with it.
+        """
+        from sqlalchemy import inspect
+        from sqlalchemy.orm import Session
+        from app import db, PooledIdea
+
+        # Read from the identity key: loading project.id could flush the caller's changes
+        identity = inspect(project).identity if project is not None else None
+        project_id = identity[0] if identity else None
+        with Session(db.engine) as session:
+            for _ in range(CLAIM_ATTEMPTS):
+                candidate = (session.query(PooledIdea)
+                             .filter_by(prompt_version=version, claimed_at=None)
+                             .order_by(PooledIdea.id)
+                             .first())
+                if not candidate:
+                    return None
+                idea = {"idea": candidate.idea, "prompt": candidate.prompt}
+
+                # Only one worker can flip claimed_at from NULL, the others try the next idea
+                claimed = (session.query(PooledIdea)
+                           .filter_by(id=candidate.id, claimed_at=None)
+                           .update({"claimed_at": datetime.utcnow(), "project_id": project_id},
+                                   synchronize_session=False))
+                session.commit()
+                if claimed:
+                    return idea
+        return None
+
+    def needs_refill(self, version):
+        return self.available(version) < IDEA_POOL_LOW_WATER
+
+    def refill_size(self, version):
+        """Ideas to generate to bring the pool back up to its target, at most one batch."""
+        return max(0, min(IDEA_BATCH_SIZE, IDEA_POOL_TARGET - self.available(version)))
+
+    def request_refill(self, version):
+        """Queue a background refill if the pool is below its low-water mark."""
+        with self._lock:
+            if time.time() - self._last_refill < REFILL_DEBOUNCE:
+                return False
+            if not self.needs_refill(version):
+                return False
+            self._last_refill = time.time()
+
+        try:
+            from tasks import refill_idea_pool_task
+            refill_idea_pool_task.delay()
+            return True
+        except Exception as e:
+            print(f"Error queueing idea pool refill: {str(e)}")
+            return False
+
+    def stats(self, version):
+        from app import PooledIdea
+
+        return {
+            "available": self.available(version),
+            "claimed": PooledIdea.query.filter(PooledIdea.prompt_version == version,
+                                               PooledIdea.claimed_at.isnot(None)).count(),
+            "low_water": IDEA_POOL_LOW_WATER,
+            "target": IDEA_POOL_TARGET,
+            "batch_size": IDEA_BATCH_SIZE,
+        }
+
+
+# Create a default idea pool instance
+idea_pool = IdeaPool()
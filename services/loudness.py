@@ -0,0 +1,62 @@
+"""Loudness measurement for the final audio mix.
+
+Every voice and music track is measured once with ffmpeg's loudnorm
+analysis (EBU R128: integrated loudness, true peak, loudness range). The
+values are stored with the asset's metadata, and the final graph passes
+them back to loudnorm, which can then normalize in a single linear pass.
+"""
+import json
+import math
+import subprocess
+
+# Narration is brought to the usual level for online video; the music sits
+# well below it as a bed
+VOICE_TARGET = {"i": -16.0, "tp": -1.5, "lra": 11.0}
+MUSIC_TARGET = {"i": -26.0, "tp": -2.0, "lra": 11.0}
+
+# loudnorm resamples to 192 kHz internally, the mix goes back to this rate
+MIX_SAMPLE_RATE = 48000
+
+# Peak limit of the summed mix, about -1 dBFS
+MIX_LIMIT = 0.891
+
+
+def measure(path, target):
+    """Run the loudnorm analysis pass over a track and return its measured values."""
+    result = subprocess.run(
+        [
+            "ffmpeg", "-hide_banner", "-nostdin",
+            "-i", path,
+            "-vn",
+            "-af", f"loudnorm=I={target['i']}:TP={target['tp']}:LRA={target['lra']}:print_format=json",
+            "-f", "null", "-"
+        ],
+        check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True
+    )
+
+    # The analysis is the last JSON object ffmpeg prints
+    output = result.stderr
+    start, end = output.rfind("{"), output.rfind("}")
+    if start == -1 or end < start:
+        raise ValueError(f"No loudness analysis for {path}")
+    stats = json.loads(output[start:end + 1])
+
+    values = {key: float(stats[key]) for key in ("input_i", "input_tp", "input_lra", "input_thresh", "target_offset")}
+    if not all(math.isfinite(value) for value in values.values()):
+        # Silence measures as -inf and cannot be normalized
+        raise ValueError(f"{path} is silent")
+    values["target_i"] = target["i"]
+    return values
+
+
+def loudnorm_filter(loudness, target):
+    """Single-pass loudnorm filter from stored measurements."""
+    # The offset only applies to the target it was measured against
+    offset = loudness["target_offset"] if loudness.get("target_i") == target["i"] else 0.0
+    return (
+        f"loudnorm=I={target['i']}:TP={target['tp']}:LRA={target['lra']}"
+        f":measured_I={loudness['input_i']}:measured_TP={loudness['input_tp']}"
+        f":measured_LRA={loudness['input_lra']}:measured_thresh={loudness['input_thresh']}"
+        f":offset={offset}:linear=true:print_format=none,"
+        f"aresample={MIX_SAMPLE_RATE}"
+    )
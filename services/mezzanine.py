@@ -0,0 +1,144 @@
+import os
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from services.assets import asset_registry
+
+# Common profile stock clips are normalized to, so they can be joined by
+# stream copy: H.264 at a fixed size and rate, closed 2 second GOPs and a
+# shared MP4 timescale (the concat demuxer needs identical time bases)
+MEZZANINE_PROFILE = {
+    "codec": "h264",
+    "width": 1280,
+    "height": 720,
+    "fps": 30,
+    "gop": 60,
+    "pix_fmt": "yuv420p",
+    "timescale": 15360,
+    "preset": "veryfast",
+    "crf": 20,
+}
+
+# Clips normalized at the same time; each runs in its own ffmpeg process
+MEZZANINE_WORKERS = int(os.getenv("MEZZANINE_WORKERS") or os.cpu_count() or 2)
+
+
+def mezzanine_profile(encoding):
+    """The mezzanine profile at an encoding profile's size and quality.
+
+    Normalized clips are joined into the final video by stream copy, so
+    their encode is the one the viewer sees.
+    """
+    return dict(
+        MEZZANINE_PROFILE,
+        width=encoding["width"],
+        height=encoding["height"],
+        preset=encoding["preset"],
+        crf=encoding["crf"],
+    )
+
+
+def probe(video_path):
+    """Return the properties of a clip's video stream that the profile cares about."""
+    return asset_registry.metadata(video_path).get("video") or {}
+
+
+def matches_profile(info, profile=MEZZANINE_PROFILE):
+    """Whether a probed clip can be joined with mezzanine clips without re-encoding it."""
+    return (
+        info.get("codec_name") == profile["codec"]
+        and info.get("width") == profile["width"]
+        and info.get("height") == profile["height"]
+        and info.get("pix_fmt") == profile["pix_fmt"]
+        and info.get("r_frame_rate") == f"{profile['fps']}/1"
+        and info.get("sample_aspect_ratio") in (None, "1:1", "0:1", "N/A")
+        and info.get("time_base") == f"1/{profile['timescale']}"
+    )
+
+
+def normalize_command(video_path, output_path, profile=MEZZANINE_PROFILE, threads=0, input_args=()):
+    """ffmpeg command that encodes a clip (a file or a URL) to the profile; input_args go before -i."""
+    width, height, fps = profile["width"], profile["height"], profile["fps"]
+    return [
+        "ffmpeg",
+        *input_args,
+        "-i", video_path,
+        "-an",  # Stock audio is never used, the final composite brings its own
+        "-vf", (
+            f"scale={width}:{height}:force_original_aspect_ratio=increase,"
+            f"crop={width}:{height},setsar=1,fps={fps},format={profile['pix_fmt']}"
+        ),
+        "-c:v", "libx264",
+        "-preset", profile["preset"],
+        "-crf", str(profile["crf"]),
+        "-g", str(profile["gop"]),
+        "-keyint_min", str(profile["gop"]),
+        "-sc_threshold", "0",  # Keyframes only at GOP boundaries
+        "-threads", str(threads),
+        "-video_track_timescale", str(profile["timescale"]),
+        "-movflags", "+faststart",
+        "-y",
+        output_path
+    ]
+
+
+def normalize_clip(video_path, output_path, profile=MEZZANINE_PROFILE, threads=0):
+    """Re-encode a clip to the mezzanine profile, or return it as is when it already matches."""
+    if matches_profile(probe(video_path), profile):
+        print(f"{video_path} already matches the mezzanine profile")
+        return video_path
+
+    subprocess.run(normalize_command(video_path, output_path, profile, threads),
+                   check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    return output_path
+
+
+def mezzanine_path(video_path):
+    root, _ = os.path.splitext(video_path)
+    return f"{root}_mezzanine.mp4"
+
+
+def normalize_clips(clip_paths, profile=MEZZANINE_PROFILE, workers=None):
+    """Normalize clips to the mezzanine profile at the same time, one ffmpeg process per clip.
+
+    Returns the normalized paths in the order of clip_paths. The cores are
+    split between the clips, so a short batch still uses all of them.
+    """
+    if not clip_paths:
+        return []
+
+    workers = max(1, min(workers or MEZZANINE_WORKERS, len(clip_paths)))
+    threads = max(1, (os.cpu_count() or 1) // workers)
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = [
+            pool.submit(normalize_clip, clip_path, mezzanine_path(clip_path), profile, threads)
+            for clip_path in clip_paths
+        ]
+        return [future.result() for future in futures]
+
+
+def concat_copy(clip_paths, output_path):
+    """Join clips that share the mezzanine profile without re-encoding them."""
+    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+
+    # Paths in the list are resolved relative to the list, so make them absolute
+    clip_list = f"{output_path}.txt"
+    with open(clip_list, "w") as file:
+        for clip_path in clip_paths:
+            file.write(f"file '{os.path.abspath(clip_path)}'\n")
+
+    try:
+        command = [
+            "ffmpeg",
+            "-f", "concat",
+            "-safe", "0",
+            "-i", clip_list,
+            "-c", "copy",
+            "-movflags", "+faststart",
+            "-y",
+            output_path
+        ]
+        subprocess.run(command, check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    finally:
+        os.remove(clip_list)
+    return output_path
@@ -0,0 +1,183 @@
+"""HLS packaging of final videos for adaptive streaming.
+
+A final video served as one MP4 has to be fetched from the start before
+the player can seek, and a 1080p or 4K file stalls on a slow connection.
+Packaging re-encodes the final video once into a ladder of renditions,
+the encoding profiles up to the size of the user's render, and writes
+them as fragmented MP4 (CMAF) segments with one playlist per rendition
+and a master playlist. Players start with a low rendition, fetch only the
+segments they show and switch renditions as their bandwidth changes.
+
+Keyframes are forced every HLS_SEGMENT_SECONDS in every rendition, so all
+renditions are cut at the same times and a player can switch between
+them at any segment. The audio is encoded once and shared by all
+renditions. The playlists refer to their segments by relative URIs, so a
+package is served as a whole from one directory of the storage.
+"""
+import os
+import shutil
+import tempfile
+import subprocess
+from services.encoding import ENCODING_PROFILES
+from services.assets import asset_registry
+
+# Packaging runs after every final video unless it is turned off
+HLS_PACKAGING = os.getenv("HLS_PACKAGING", "true").lower() in ("1", "true", "yes")
+
+# Length of a segment; the player's startup buffers one or two of them
+HLS_SEGMENT_SECONDS = int(os.getenv("HLS_SEGMENT_SECONDS") or 4)
+
+# Storage directory of the packages, one subdirectory per final video
+HLS_DIR = "hls"
+
+# Peak bitrate of each rendition, near Apple's HLS authoring recommendations.
+# The CRF of the profile decides the quality; the cap keeps the bandwidth
+# announced in the master playlist honest.
+HLS_MAX_BITRATES = {"720p": 4500, "1080p": 7800, "4K": 20000}
+
+MASTER_PLAYLIST = "master.m3u8"
+
+CONTENT_TYPES = {
+    ".m3u8": "application/vnd.apple.mpegurl",
+    ".m4s": "video/iso.segment",
+    ".mp4": "video/mp4",
+}
+
+
+def short_side(size):
+    """The shorter of the width and height of a profile or probed video stream."""
+    return min(size["width"], size["height"])
+
+
+def ladder(profile, video=None):
+    """Names of the renditions of a render, smallest first.
+
+    The ladder holds the encoding profiles up to the render's profile and
+    never upscales beyond the final video itself. Sizes are compared by
+    their short side, so portrait videos get the same ladder as landscape
+    ones.
+    """
+    limit = short_side(profile)
+    if video and video.get("width") and video.get("height"):
+        limit = min(limit, short_side(video))
+    names = sorted(ENCODING_PROFILES, key=lambda name: short_side(ENCODING_PROFILES[name]))
+    renditions = [name for name in names if short_side(ENCODING_PROFILES[name]) <= limit]
+    return renditions or names[:1]
+
+
+def rendition_scale(name, portrait=False):
+    """Scale filter that brings the short side to the rendition's and keeps the aspect ratio."""
+    size = short_side(ENCODING_PROFILES[name])
+    return f"scale={size}:-2" if portrait else f"scale=-2:{size}"
+
+
+def package_command(video_path, output_dir, renditions, audio_bitrate=None, segment_seconds=HLS_SEGMENT_SECONDS,
+                    portrait=False):
+    """Build one ffmpeg command that encodes every rendition and writes the HLS package.
+
+    Args:
+        video_path (str): The final video
+        output_dir (str): Directory the master playlist is written to; each
+            rendition gets a subdirectory named after its profile
+        renditions (list): Encoding profile names, from ladder()
+        audio_bitrate (str): Bitrate of the shared audio rendition; None for a silent video
+        segment_seconds (int): Target segment length
+        portrait (bool): Whether the video is taller than wide
+    """
+    split = "".join(f"[v{index}]" for index in range(len(renditions)))
+    graph = [f"[0:v]split={len(renditions)}{split}"]
+    for index, name in enumerate(renditions):
+        graph.append(f"[v{index}]{rendition_scale(name, portrait)},setsar=1[v{index}out]")
+
+    command = ["ffmpeg", "-v", "error", "-nostdin", "-i", video_path, "-filter_complex", ";".join(graph)]
+    streams = []
+    for index, name in enumerate(renditions):
+        profile = ENCODING_PROFILES[name]
+        max_bitrate = HLS_MAX_BITRATES.get(name)
+        command += [
+            "-map", f"[v{index}out]",
+            f"-preset:v:{index}", profile["preset"],
+            f"-crf:v:{index}", str(profile["crf"]),
+        ]
+        if max_bitrate:
+            command += [f"-maxrate:v:{index}", f"{max_bitrate}k", f"-bufsize:v:{index}", f"{2 * max_bitrate}k"]
+        streams.append(f"v:{index},agroup:audio,name:{name}" if audio_bitrate else f"v:{index},name:{name}")
+
+    command += [
+        "-c:v", "libx264",
+        "-pix_fmt", "yuv420p",
+        # Same cut points in every rendition, so players can switch at any segment
+        "-force_key_frames", f"expr:gte(t,n_forced*{segment_seconds})",
+    ]
+    if audio_bitrate:
+        command += ["-map", "0:a:0", "-c:a", "aac", "-b:a", audio_bitrate, "-ac", "2"]
+        streams.append("a:0,agroup:audio,name:audio,default:yes")
+
+    command += [
+        "-f", "hls",
+        "-hls_time", str(segment_seconds),
+        "-hls_playlist_type", "vod",
+        "-hls_segment_type", "fmp4",
+        "-hls_flags", "independent_segments",
+        "-hls_fmp4_init_filename", "init.mp4",
+        "-hls_segment_filename", os.path.join(output_dir, "%v", "segment_%03d.m4s"),
+        "-master_pl_name", MASTER_PLAYLIST,
+        "-var_stream_map", " ".join(streams),
+        "-y",
+        os.path.join(output_dir, "%v", "index.m3u8"),
+    ]
+    return command
+
+
+def store_package(package_dir, storage_dir):
+    """Save every file of a package through the storage manager; returns the master playlist's path."""
+    from app import storage_manager
+
+    master_path = None
+    for root, _, files in os.walk(package_dir):
+        relative = os.path.relpath(root, package_dir)
+        directory = storage_dir if relative == "." else f"{storage_dir}/{relative.replace(os.sep, '/')}"
+        for filename in sorted(files):
+            _, extension = os.path.splitext(filename)
+            with open(os.path.join(root, filename), "rb") as file:
+                saved = storage_manager.save_file(file, directory, filename, CONTENT_TYPES.get(extension))
+            if relative == "." and filename == MASTER_PLAYLIST:
+                master_path = saved
+    return master_path
+
+
+def package_video(video_path, profile, name, segment_seconds=HLS_SEGMENT_SECONDS):
+    """Package a final video as HLS renditions and store them.
+
+    Args:
+        video_path (str): The final video
+        profile (dict): Encoding profile the final video was rendered with
+        name (str): Unique name of the package's storage directory
+        segment_seconds (int): Target segment length
+
+    Returns:
+        dict: The master playlist's storage path and the renditions
+    """
+    metadata = asset_registry.verify(video_path, "video")
+    video = metadata.get("video") or {}
+    renditions = ladder(profile, video)
+    portrait = (video.get("height") or 0) > (video.get("width") or 0)
+    audio_bitrate = ENCODING_PROFILES[renditions[-1]]["audio_bitrate"] if metadata.get("audio") else None
+
+    package_dir = tempfile.mkdtemp(prefix="hls-")
+    try:
+        for rendition in renditions:
+            os.makedirs(os.path.join(package_dir, rendition), exist_ok=True)
+        if audio_bitrate:
+            os.makedirs(os.path.join(package_dir, "audio"), exist_ok=True)
+
+        subprocess.run(package_command(video_path, package_dir, renditions, audio_bitrate, segment_seconds, portrait),
+                       check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+
+        master_path = store_package(package_dir, f"{HLS_DIR}/{name}")
+    finally:
+        shutil.rmtree(package_dir, ignore_errors=True)
+
+    if not master_path:
+        raise RuntimeError(f"ffmpeg wrote no {MASTER_PLAYLIST} for {video_path}")
+    return {"master": master_path, "renditions": renditions}
@@ -1,11 +1,20 @@
 import os
 import re
-import requests
+import time
+import subprocess
 from dotenv import load_dotenv
+from services.rate_limiter import rate_limiter
+from services.http_sessions import http_sessions
+from services.async_clients import provider_base_url
+from services.assets import asset_registry, AssetError
+from services.mezzanine import MEZZANINE_PROFILE, normalize_command
 
 # Load environment variables
 load_dotenv()
 
+# Seconds without data before a streamed ingest gives up
+INGEST_TIMEOUT = 15
+
 class PexelsService:
     """Service for interacting with the Pexels API to find and download stock videos."""
     
@@ -29,58 +38,78 @@ class PexelsService:
         """
         print(f"Searching for stock videos with query: {query}")
         
+        # Search videos from Pexels API
+        url = f"{provider_base_url('pexels')}/videos/search"
+        headers = {
+            "Authorization": self.api_key
+        }
+        params = self.search_params(query, per_page, page)
+        
+        try:
+            with rate_limiter.limit("pexels", self.api_key):
+                response = http_sessions.get("pexels", url, headers=headers, params=params, timeout=15)
+            response.raise_for_status()
+            
+            return self.format_videos(response.json().get("videos", []))
+        except Exception as e:
+            print(f"Error searching for stock videos: {str(e)}")
+            return []
+    
+    async def asearch_stock_videos(self, query, per_page=10, page=1):
+        """Async variant of search_stock_videos using the pooled async client."""
+        from services.async_clients import AsyncPexelsClient
+        
+        print(f"Searching for stock videos with query: {query}")
+        
+        try:
+            async with rate_limiter.alimit("pexels", self.api_key):
+                videos = await AsyncPexelsClient(self.api_key).search_videos(self.search_params(query, per_page, page))
+            return self.format_videos(videos)
+        except Exception as e:
+            print(f"Error searching for stock videos: {str(e)}")
+            return []
+    
+    def search_params(self, query, per_page=10, page=1):
+        """Build the query parameters for a video search."""
         # Process query and remove special characters
         query = re.sub(r'[^\w\s]', ' ', query).strip()
         
         # Enhance the query for better results
         enhanced_query = f"{query} cinematic"
         
-        # Search videos from Pexels API
-        url = "https://api.pexels.com/videos/search"
-        headers = {
-            "Authorization": self.api_key
-        }
-        params = {
+        return {
             "query": enhanced_query,
             "orientation": "landscape",
             "size": "medium",
             "per_page": per_page,
             "page": page
         }
-        
-        try:
-            response = requests.get(url, headers=headers, params=params)
-            response.raise_for_status()
+    
+    def format_videos(self, videos):
+        """Pick the best MP4 file of each search result and return formatted data."""
+        result = []
+        for video in videos:
+            # Find the best quality file
+            best_file = None
+            for file in video.get("video_files", []):
+                if file.get("quality") == "hd" and file.get("file_type") == "video/mp4":
+                    best_file = file
+                    break
             
-            videos = response.json().get("videos", [])
+            if not best_file and video.get("video_files"):
+                best_file = video["video_files"][0]
             
-            # Process results and return formatted data
-            result = []
-            for video in videos:
-                # Find the best quality file
-                best_file = None
-                for file in video.get("video_files", []):
-                    if file.get("quality") == "hd" and file.get("file_type") == "video/mp4":
-                        best_file = file
-                        break
-                
-                if not best_file and video.get("video_files"):
-                    best_file = video["video_files"][0]
-                
-                if best_file:
-                    result.append({
-                        "id": video.get("id"),
-                        "url": best_file.get("link", ""),
-                        "preview_url": video.get("image", ""),
-                        "duration": video.get("duration", 10),
-                        "width": best_file.get("width", 1280),
-                        "height": best_file.get("height", 720)
-                    })
-            
-            return result
-        except Exception as e:
-            print(f"Error searching for stock videos: {str(e)}")
-            return []
+            if best_file:
+                result.append({
+                    "id": video.get("id"),
+                    "url": best_file.get("link", ""),
+                    "preview_url": video.get("image", ""),
+                    "duration": video.get("duration", 10),
+                    "width": best_file.get("width", 1280),
+                    "height": best_file.get("height", 720)
+                })
+        
+        return result
     
     def download_stock_video(self, video_url, output_path):
         """
@@ -99,23 +128,88 @@ class PexelsService:
             # Create directory if needed
             os.makedirs(os.path.dirname(output_path), exist_ok=True)
             
-            # Download the video
-            response = requests.get(video_url, stream=True, timeout=15)
-            response.raise_for_status()
-            
-            # Save to file
-            with open(output_path, 'wb') as f:
-                for chunk in response.iter_content(chunk_size=8192):
-                    f.write(chunk)
+            # Download the video over the shared Pexels connections
+            with http_sessions.get("pexels", video_url, stream=True, timeout=15) as response:
+                response.raise_for_status()
+                # iter_content decodes compressed bodies, their length no longer matches
+                expected_size = None if response.headers.get("Content-Encoding") else response.headers.get("Content-Length")
+                
+                # Save to file
+                with open(output_path, 'wb') as f:
+                    for chunk in response.iter_content(chunk_size=1024 * 1024):
+                        f.write(chunk)
             
-            # Verify file size to check for errors
-            file_size = os.path.getsize(output_path)
-            if file_size < 10000:  # File too small, likely corrupted
+            # Check the file is complete and decodes; the metadata stays cached for later steps
+            try:
+                metadata = asset_registry.verify(
+                    output_path, "video",
+                    expected_size=int(expected_size) if expected_size and expected_size.isdigit() else None
+                )
+            except AssetError:
                 os.remove(output_path)
-                raise Exception("Downloaded file is too small")
+                raise
             
-            print(f"Stock video downloaded to: {output_path}")
+            video = metadata["video"]
+            print(f"Stock video downloaded to: {output_path} ({video['width']}x{video['height']}, {metadata['duration']:.1f}s)")
             return True
         except Exception as e:
             print(f"Error downloading stock video: {str(e)}")
             return False
+    
+    def ingest_stock_video(self, video_url, output_path, duration=None, source_duration=None, profile=MEZZANINE_PROFILE, threads=0):
+        """
+        Stream the start of a stock video straight into the mezzanine encode.
+        
+        ffmpeg reads the MP4 index and then only the media data of the first
+        duration seconds over HTTP range requests, so a long stock video is
+        never downloaded in full and no raw copy is written to disk.
+        
+        Args:
+            video_url (str): URL of the video to ingest
+            output_path (str): Path where the normalized clip should be saved
+            duration (float): Seconds of the video to keep, None for all of it
+            source_duration (float): Length of the whole video, as reported by the search
+            profile (dict): Mezzanine profile the clip is encoded to
+            threads (int): Encoder threads, 0 lets ffmpeg decide
+            
+        Returns:
+            bool: True if the clip was ingested, False otherwise
+        """
+        print(f"Ingesting {f'{duration:g}s of ' if duration else ''}stock video from: {video_url}")
+        
+        try:
+            # Create directory if needed
+            os.makedirs(os.path.dirname(output_path), exist_ok=True)
+            
+            input_args = [
+                "-reconnect", "1",
+                "-reconnect_on_network_error", "1",
+                "-reconnect_delay_max", "5",
+                "-rw_timeout", str(INGEST_TIMEOUT * 1000000),
+            ]
+            if duration:
+                input_args += ["-t", str(duration)]
+            
+            started = time.perf_counter()
+            subprocess.run(normalize_command(video_url, output_path, profile, threads, input_args),
+                           check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+            
+            # A dropped connection can leave a short clip that still decodes, so check the length as well
+            metadata = asset_registry.verify(output_path, "video")
+            expected = min([length for length in (duration, source_duration) if length] or [0])
+            if metadata["duration"] < expected - 1:
+                raise AssetError(f"Only {metadata['duration']:.1f}s of {expected:g}s ingested")
+            
+            print(f"Stock clip ingested to: {output_path} ({metadata['duration']:.1f}s, "
+                  f"{metadata['size'] / 1024 ** 2:.1f} MB in {time.perf_counter() - started:.1f}s)")
+            return True
+        except subprocess.CalledProcessError as e:
+            print(f"Error ingesting stock video: {e.stderr.decode('utf-8', 'replace').strip()}")
+            if os.path.exists(output_path):
+                os.remove(output_path)
+            return False
+        except Exception as e:
+            print(f"Error ingesting stock video: {str(e)}")
+            if os.path.exists(output_path):
+                os.remove(output_path)
+            return False
@@ -0,0 +1,261 @@
+import time
+import asyncio
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from flask import current_app, has_app_context
+
+
+class PipelineStep:
+    """A single unit of work in a generation pipeline."""
+
+    def __init__(self, name, func, depends_on=None):
+        """
+        Args:
+            name (str): Unique step name (e.g. "image")
+            func (callable): Called with a dict of the results of its dependencies
+            depends_on (list): Names of the steps that must finish first
+        """
+        self.name = name
+        self.func = func
+        self.depends_on = list(depends_on or [])
+
+
+class PipelineExecutor:
+    """Run pipeline steps as a dependency graph on a thread pool.
+
+    Every step starts as soon as all of its dependencies have finished, so
+    independent provider calls (image, voice, music, stock footage) overlap
+    instead of running back to back. Per-step wall times and the critical
+    path through the graph are recorded in ``timings`` after ``run``.
+    """
+
+    def __init__(self, max_workers=4, on_step_complete=None):
+        """
+        Args:
+            max_workers (int): Maximum number of steps running at the same time
+            on_step_complete (callable): Called as ``(name, result)`` in the
+                calling thread whenever a step finishes successfully, including
+                steps that finish after another step has failed
+        """
+        self.max_workers = max_workers
+        self.on_step_complete = on_step_complete
+        self.steps = {}
+        self.timings = {}
+
+    def add_step(self, name, func, depends_on=None):
+        """Register a step and return it."""
+        if name in self.steps:
+            raise ValueError(f"Duplicate pipeline step: {name}")
+        step = PipelineStep(name, func, depends_on)
+        self.steps[name] = step
+        return step
+
+    def _check_graph(self):
+        """Make sure every dependency exists and the graph has no cycles."""
+        for step in self.steps.values():
+            for dependency in step.depends_on:
+                if dependency not in self.steps:
+                    raise ValueError(f"Step '{step.name}' depends on unknown step '{dependency}'")
+
+        visiting, visited = set(), set()
+
+        def visit(name):
+            if name in visited:
+                return
+            if name in visiting:
+                raise ValueError(f"Pipeline has a dependency cycle at step '{name}'")
+            visiting.add(name)
+            for dependency in self.steps[name].depends_on:
+                visit(dependency)
+            visiting.discard(name)
+            visited.add(name)
+
+        for name in self.steps:
+            visit(name)
+
+    def _run_step(self, app, step, inputs):
+        """Run a step in a worker thread, inside the Flask app context if there is one."""
+        started = time.perf_counter()
+        if app is not None:
+            with app.app_context():
+                result = step.func(inputs)
+        else:
+            result = step.func(inputs)
+        return result, started, time.perf_counter()
+
+    def run(self):
+        """Run all steps and return a dict of results keyed by step name.
+
+        The first step to raise cancels every step that has not started yet;
+        the exception is re-raised once the running steps have finished.
+        """
+        self._check_graph()
+
+        # Steps run in worker threads, so hand them the current app explicitly
+        app = current_app._get_current_object() if has_app_context() else None
+
+        results = {}
+        pending = dict(self.steps)
+        running = {}
+        step_times = {}
+        error = None
+        run_started = time.perf_counter()
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            while pending or running:
+                # Submit every step whose dependencies are satisfied
+                if error is None:
+                    for name, step in list(pending.items()):
+                        if all(dependency in results for dependency in step.depends_on):
+                            inputs = {dependency: results[dependency] for dependency in step.depends_on}
+                            running[pool.submit(self._run_step, app, step, inputs)] = name
+                            del pending[name]
+                elif pending:
+                    # Don't start anything new once a step has failed
+                    pending.clear()
+
+                if not running:
+                    break
+
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name = running.pop(future)
+                    try:
+                        result, started, finished = future.result()
+                    except Exception as e:
+                        if error is None:
+                            error = e
+                        continue
+
+                    results[name] = result
+                    step_times[name] = (started - run_started, finished - run_started)
+                    if self.on_step_complete:
+                        self.on_step_complete(name, result)
+
+        self.timings = self._build_timings(step_times, time.perf_counter() - run_started)
+
+        if error is not None:
+            raise error
+
+        return results
+
+    async def _arun_step(self, app, step, inputs):
+        """Await a step as a task, inside its own Flask app context if there is one."""
+        started = time.perf_counter()
+        if app is not None:
+            with app.app_context():
+                result = await step.func(inputs)
+        else:
+            result = await step.func(inputs)
+        return result, started, time.perf_counter()
+
+    async def arun(self):
+        """Async variant of run: every step func returns an awaitable.
+
+        The steps run as tasks on the running loop, so any number of them
+        can wait on providers at once; max_workers does not apply. Blocking
+        work belongs in asyncio.to_thread. Failures are handled as in run(),
+        and cancelling arun() cancels the steps that are still running.
+        """
+        self._check_graph()
+
+        app = current_app._get_current_object() if has_app_context() else None
+
+        results = {}
+        pending = dict(self.steps)
+        running = {}
+        step_times = {}
+        error = None
+        run_started = time.perf_counter()
+
+        try:
+            while pending or running:
+                if error is None:
+                    for name, step in list(pending.items()):
+                        if all(dependency in results for dependency in step.depends_on):
+                            inputs = {dependency: results[dependency] for dependency in step.depends_on}
+                            running[asyncio.ensure_future(self._arun_step(app, step, inputs))] = name
+                            del pending[name]
+                elif pending:
+                    pending.clear()
+
+                if not running:
+                    break
+
+                done, _ = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    name = running.pop(task)
+                    try:
+                        result, started, finished = task.result()
+                    except Exception as e:
+                        if error is None:
+                            error = e
+                        continue
+
+                    results[name] = result
+                    step_times[name] = (started - run_started, finished - run_started)
+                    if self.on_step_complete:
+                        self.on_step_complete(name, result)
+        except asyncio.CancelledError:
+            for task in running:
+                task.cancel()
+            await asyncio.gather(*running, return_exceptions=True)
+            raise
+        finally:
+            self.timings = self._build_timings(step_times, time.perf_counter() - run_started)
+
+        if error is not None:
+            raise error
+
+        return results
+
+    def _build_timings(self, step_times, wall_time):
+        """Summarize step durations and compute the critical path."""
+        durations = {name: end - start for name, (start, end) in step_times.items()}
+
+        # Longest path through the graph, weighted by step duration
+        finish = {}
+        previous = {}
+        for name in self._topological_order():
+            if name not in durations:
+                continue
+            best_dependency = None
+            best_finish = 0.0
+            for dependency in self.steps[name].depends_on:
+                if finish.get(dependency, 0.0) > best_finish:
+                    best_dependency, best_finish = dependency, finish[dependency]
+            finish[name] = best_finish + durations[name]
+            previous[name] = best_dependency
+
+        critical_path = []
+        if finish:
+            name = max(finish, key=finish.get)
+            while name is not None:
+                critical_path.insert(0, name)
+                name = previous[name]
+
+        return {
+            "steps": {
+                name: {"start": round(start, 3), "end": round(end, 3), "duration": round(end - start, 3)}
+                for name, (start, end) in step_times.items()
+            },
+            "wall_time": round(wall_time, 3),
+            "serial_time": round(sum(durations.values()), 3),
+            "critical_path": critical_path,
+            "critical_path_time": round(max(finish.values()) if finish else 0.0, 3),
+        }
+
+    def _topological_order(self):
+        """Return step names ordered so that dependencies come first."""
+        order, seen = [], set()
+
+        def visit(name):
+            if name in seen:
+                return
+            seen.add(name)
+            for dependency in self.steps[name].depends_on:
+                visit(dependency)
+            order.append(name)
+
+        for name in self.steps:
+            visit(name)
+        return order
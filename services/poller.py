@@ -0,0 +1,274 @@
+import time
+import heapq
+import itertools
+import threading
+from concurrent.futures import Future
+from services.http_sessions import http_sessions
+from services.async_clients import provider_base_url
+
+# Check results returned by the provider checkers
+PENDING = "pending"
+COMPLETED = "completed"
+FAILED = "failed"
+
+
+class PollJob:
+    """An outstanding remote generation tracked by the poller."""
+
+    def __init__(self, provider, job_id, context, timeout, callback):
+        self.provider = provider
+        self.job_id = job_id
+        self.context = context or {}
+        self.callback = callback
+        self.future = Future()
+        self.created_at = time.time()
+        self.deadline = self.created_at + timeout
+        self.interval = None
+        self.checks = 0
+
+
+class GenerationPoller:
+    """Track many remote generations across providers from a single thread.
+
+    Instead of every waiting step sleeping and polling on its own, jobs are
+    registered here and checked in one loop. The first check of a job is
+    scheduled from the provider's observed completion time, later checks back
+    off exponentially, and providers that can report on several jobs in one
+    request are checked in batches. Completion resolves the job's Future and
+    fires its callback, waking whatever is waiting on it.
+    """
+
+    def __init__(self, min_interval=2.0, max_interval=30.0, backoff=1.5):
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.backoff = backoff
+        self.checkers = {}
+        self.batch_checkers = {}
+        self.cancellers = {}
+        self.expected_durations = {}
+        self._schedule = []
+        self._counter = itertools.count()
+        self._condition = threading.Condition()
+        self._thread = None
+
+    def register_provider(self, provider, check=None, check_many=None, expected_duration=None, cancel=None):
+        """Register how to check jobs of a provider.
+
+        Args:
+            provider (str): Provider name
+            check (callable): ``check(job) -> (state, value)`` for one job
+            check_many (callable): ``check_many(jobs) -> {job_id: (state, value)}``;
+                jobs missing from the result fall back to ``check``
+            expected_duration (float): Initial guess of a job's run time in seconds
+            cancel (callable): ``cancel(job)`` stops a job that timed out, so it
+                doesn't keep running (and billing) at the provider
+        """
+        self.checkers[provider] = check
+        if check_many:
+            self.batch_checkers[provider] = check_many
+        if cancel:
+            self.cancellers[provider] = cancel
+        if expected_duration:
+            self.expected_durations.setdefault(provider, expected_duration)
+
+    def submit(self, provider, job_id, context=None, timeout=600, callback=None):
+        """Start tracking a job and return a Future that resolves with its result.
+
+        Args:
+            provider (str): Registered provider name
+            job_id (str): The provider's ID of the generation
+            context (dict): Extra data for the checker, such as the API key and
+                the model (used to learn per-model completion times)
+            timeout (float): Seconds before the job is failed with TimeoutError
+            callback (callable): Called with the finished Future
+        """
+        if provider not in self.checkers:
+            raise ValueError(f"No poller checker registered for provider '{provider}'")
+
+        job = PollJob(provider, job_id, context, timeout, callback)
+        if callback:
+            job.future.add_done_callback(callback)
+
+        # The first check happens shortly before the job is expected to finish
+        expected = self.expected_durations.get(self._duration_key(job)) or \
+            self.expected_durations.get(provider, self.min_interval)
+        first_check = max(self.min_interval, expected * 0.8)
+
+        self._ensure_running()
+        with self._condition:
+            self._push(job, min(time.time() + first_check, job.deadline))
+            self._condition.notify()
+        return job.future
+
+    def wait(self, provider, job_id, context=None, timeout=600):
+        """Track a job and block until it completes; returns its result."""
+        return self.submit(provider, job_id, context, timeout).result()
+
+    def pending_count(self):
+        with self._condition:
+            return len(self._schedule)
+
+    def _push(self, job, when):
+        heapq.heappush(self._schedule, (when, next(self._counter), job))
+
+    def _ensure_running(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name="generation-poller", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self._schedule:
+                    self._condition.wait()
+                now = time.time()
+                when = self._schedule[0][0]
+                if when > now:
+                    self._condition.wait(timeout=when - now)
+                    continue
+
+                # Take every job that is due now
+                due = []
+                while self._schedule and self._schedule[0][0] <= now:
+                    due.append(heapq.heappop(self._schedule)[2])
+
+            by_provider = {}
+            for job in due:
+                by_provider.setdefault(job.provider, []).append(job)
+
+            for provider, jobs in by_provider.items():
+                self._check(provider, jobs)
+
+    def _check(self, provider, jobs):
+        """Check a group of due jobs of one provider and reschedule the unfinished ones."""
+        results = {}
+        batch_checker = self.batch_checkers.get(provider)
+        if batch_checker and len(jobs) > 1:
+            try:
+                results = batch_checker(jobs) or {}
+            except Exception as e:
+                print(f"Error in batched status check for {provider}: {str(e)}")
+
+        for job in jobs:
+            job.checks += 1
+            try:
+                state, value = results[job.job_id] if job.job_id in results else self.checkers[provider](job)
+            except Exception as e:
+                # Transient errors are retried on the normal schedule
+                print(f"Error checking {provider} job {job.job_id}: {str(e)}")
+                state, value = PENDING, None
+
+            if state == COMPLETED:
+                self._observe(self._duration_key(job), time.time() - job.created_at)
+                job.future.set_result(value)
+            elif state == FAILED:
+                job.future.set_exception(Exception(f"{provider} generation {job.job_id} failed: {value}"))
+            elif time.time() >= job.deadline:
+                self._cancel(job)
+                job.future.set_exception(TimeoutError(f"{provider} generation {job.job_id} timed out"))
+            else:
+                job.interval = min(self.max_interval, (job.interval or self.min_interval) * self.backoff)
+                with self._condition:
+                    self._push(job, min(time.time() + job.interval, job.deadline))
+
+    def _cancel(self, job):
+        """Cancel a job at its provider, if the provider can cancel jobs."""
+        cancel = self.cancellers.get(job.provider)
+        if not cancel:
+            return
+        try:
+            cancel(job)
+        except Exception as e:
+            print(f"Error cancelling {job.provider} job {job.job_id}: {str(e)}")
+
+    def _duration_key(self, job):
+        """Jobs of different models on one provider (Flux vs Kling) take very different times."""
+        model = job.context.get("model")
+        return f"{job.provider}:{model}" if model else job.provider
+
+    def _observe(self, key, duration):
+        """Keep a moving average of how long a provider's (or model's) jobs take."""
+        previous = self.expected_durations.get(key)
+        self.expected_durations[key] = duration if previous is None else 0.7 * previous + 0.3 * duration
+
+
+def sonauto_result(data):
+    """Translate a SonAuto generation (status response or webhook payload) into a check result."""
+    status = str(data.get("status", "")).lower()
+    if status in ("completed", "success"):
+        return COMPLETED, data.get("output_url") or (data.get("song_paths") or [None])[0]
+    if status in ("failed", "failure"):
+        return FAILED, data.get("error")
+    return PENDING, None
+
+
+def sonauto_status(generation_id, api_key):
+    """Fetch the state of a SonAuto generation; the value is the song URL once it is done."""
+    headers = {"Authorization": f"Bearer {api_key}"}
+    response = http_sessions.get("sonauto", f"{provider_base_url('sonauto')}/generations/{generation_id}", headers=headers, timeout=15)
+    response.raise_for_status()
+    return sonauto_result(response.json())
+
+
+def check_sonauto(job):
+    """Check a SonAuto generation; returns the song URL once it is done."""
+    return sonauto_status(job.job_id, job.context.get("api_key"))
+
+
+def replicate_result(prediction):
+    """Translate a Replicate prediction into a check result."""
+    status = prediction.get("status")
+    if status == "succeeded":
+        output = prediction.get("output")
+        return COMPLETED, output[0] if isinstance(output, list) else output
+    if status in ("failed", "canceled"):
+        return FAILED, prediction.get("error") or status
+    return PENDING, None
+
+
+def replicate_status(prediction_id, api_key):
+    """Fetch the state of a Replicate prediction; the value is its output URL once it succeeded."""
+    headers = {"Authorization": f"Bearer {api_key}"}
+    response = http_sessions.get("replicate", f"{provider_base_url('replicate')}/predictions/{prediction_id}", headers=headers, timeout=15)
+    response.raise_for_status()
+    return replicate_result(response.json())
+
+
+def check_replicate(job):
+    """Check a single Replicate prediction; returns its output URL once it succeeded."""
+    return replicate_status(job.job_id, job.context.get("api_key"))
+
+
+def cancel_replicate(job):
+    """Cancel a Replicate prediction."""
+    headers = {"Authorization": f"Bearer {job.context.get('api_key')}"}
+    response = http_sessions.post("replicate", f"{provider_base_url('replicate')}/predictions/{job.job_id}/cancel", headers=headers, timeout=15)
+    response.raise_for_status()
+
+
+def check_replicate_many(jobs):
+    """Check several Replicate predictions with one list request per API key.
+
+    The list endpoint returns the account's most recent predictions, which
+    covers all jobs that are still in flight in the common case.
+    """
+    results = {}
+    by_key = {}
+    for job in jobs:
+        by_key.setdefault(job.context.get("api_key"), []).append(job)
+
+    for api_key, key_jobs in by_key.items():
+        headers = {"Authorization": f"Bearer {api_key}"}
+        response = http_sessions.get("replicate", f"{provider_base_url('replicate')}/predictions", headers=headers, timeout=15)
+        response.raise_for_status()
+        wanted = {job.job_id for job in key_jobs}
+        for prediction in response.json().get("results", []):
+            if prediction.get("id") in wanted:
+                results[prediction["id"]] = replicate_result(prediction)
+    return results
+
+
+# Create a default poller instance with the known providers
+poller = GenerationPoller()
+poller.register_provider("sonauto", check=check_sonauto, expected_duration=60)
+poller.register_provider("replicate", check=check_replicate, check_many=check_replicate_many, expected_duration=30, cancel=cancel_replicate)
@@ -0,0 +1,299 @@
+"""Local stand-in for the OpenAI, Replicate, SonAuto and Pexels APIs.
+
+Run it and point the provider base URLs at it to exercise the pipeline
+offline:
+
+    python -m services.provider_stub --port 8055
+
+Remote generations complete after a configurable delay, and every output
+URL is served by the stub itself. Predictions created with a ``webhook``
+(Replicate) or ``webhook_url`` (SonAuto) get their completion callback
+POSTed to that URL, like the real providers do.
+"""
+import os
+import re
+import json
+import time
+import uuid
+import argparse
+import threading
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+STUB_IDEA = (
+    "Idea: A lighthouse keeper discovers the beam reveals a hidden city beneath the waves.\n"
+    "Prompt: Cinematic night seascape, lighthouse beam cutting through fog, glowing submerged city, 8k, detailed."
+)
+
+# Served for every generated file; large enough to pass the download size checks
+STUB_FILE_SIZE = 64 * 1024
+
+
+class ProviderStub:
+    """Threaded HTTP server that mimics the provider APIs used by the service."""
+
+    def __init__(self, host="127.0.0.1", port=0, delay=1.0):
+        """
+        Args:
+            host (str): Interface to bind
+            port (int): Port to bind, 0 picks a free one
+            delay (float): Seconds a remote generation takes to complete
+        """
+        self.delay = delay
+        # Kinds of job (model names, "sonauto") that fail instead of completing
+        self.failures = set()
+        self.jobs = {}
+        self.requests = []
+        self.webhooks = []
+        self.lock = threading.Lock()
+        self.server = ThreadingHTTPServer((host, port), self._handler_class())
+        self.server.daemon_threads = True
+        self.thread = None
+
+    @property
+    def base_url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def env(self):
+        """Environment variables that point the clients at this stub."""
+        return {
+            "OPENAI_BASE_URL": f"{self.base_url}/openai/v1",
+            "REPLICATE_API_BASE_URL": f"{self.base_url}/replicate/v1",
+            "SONAUTO_API_BASE_URL": f"{self.base_url}/sonauto/v1",
+            "PEXELS_API_BASE_URL": f"{self.base_url}/pexels",
+        }
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def create_job(self, kind, extension, payload, webhook=None, webhook_body=None):
+        """Register a remote generation that completes after the configured delay.
+
+        Args:
+            webhook (str): URL to POST the completed job to
+            webhook_body (callable): Builds the callback body from ``(stub, job)``
+        """
+        job_id = uuid.uuid4().hex
+        job = {
+            "id": job_id,
+            "kind": kind,
+            "payload": payload,
+            "ready_at": time.time() + self.delay,
+            "output": f"{self.base_url}/files/{job_id}{extension}",
+            "canceled": False,
+        }
+        with self.lock:
+            self.jobs[job_id] = job
+
+        if webhook:
+            timer = threading.Timer(self.delay, self.fire_webhook, args=(job, webhook, webhook_body))
+            timer.daemon = True
+            timer.start()
+        return job
+
+    def fire_webhook(self, job, url, webhook_body):
+        """POST the finished job to its callback URL."""
+        if job["canceled"]:
+            return
+        data = json.dumps(webhook_body(self, job)).encode("utf-8")
+        request = urllib.request.Request(url, data=data, headers={"Content-Type": "application/json"}, method="POST")
+        try:
+            with urllib.request.urlopen(request, timeout=10) as response:
+                status = response.status
+        except Exception as e:
+            status = getattr(e, "code", None) or str(e)
+        with self.lock:
+            self.webhooks.append((job["id"], url, status))
+
+    def job_status(self, job):
+        if job["canceled"]:
+            return "canceled"
+        if time.time() < job["ready_at"]:
+            return "processing"
+        return "failed" if job["kind"] in self.failures else "succeeded"
+
+    def _handler_class(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):
+                pass
+
+            def _body(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                raw = self.rfile.read(length) if length else b""
+                try:
+                    return json.loads(raw) if raw else {}
+                except ValueError:
+                    return {}
+
+            def _send(self, status, body, content_type="application/json"):
+                data = json.dumps(body).encode("utf-8") if content_type == "application/json" else body
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _route(self, method):
+                path = self.path.split("?", 1)[0]
+                body = self._body() if method == "POST" else {}
+                with stub.lock:
+                    stub.requests.append((method, path))
+
+                for pattern, route_method, handler in ROUTES:
+                    match = re.fullmatch(pattern, path)
+                    if match and route_method == method:
+                        return handler(self, stub, body, *match.groups())
+                self._send(404, {"error": f"No stub route for {method} {path}"})
+
+            def do_GET(self):
+                self._route("GET")
+
+            def do_POST(self):
+                self._route("POST")
+
+        return Handler
+
+
+def chat_completion(handler, stub, body):
+    handler._send(200, {"choices": [{"message": {"role": "assistant", "content": STUB_IDEA}}]})
+
+
+def speech(handler, stub, body):
+    handler._send(200, b"\x00" * STUB_FILE_SIZE, "audio/mpeg")
+
+
+def prediction_body(stub, job):
+    status = stub.job_status(job)
+    return {
+        "id": job["id"],
+        "model": job["kind"],
+        "version": "stub",
+        "status": status,
+        "output": job["output"] if status == "succeeded" else None,
+        "error": "Stub failure" if status == "failed" else None,
+    }
+
+
+def create_prediction(handler, stub, body, model):
+    extension = ".png" if "flux" in model else ".mp4"
+    job = stub.create_job(model, extension, body, body.get("webhook"), prediction_body)
+    # The replicate client requires a version on every prediction
+    handler._send(201, {"id": job["id"], "model": model, "version": "stub", "status": "starting", "output": None})
+
+
+def get_prediction(handler, stub, body, prediction_id):
+    job = stub.jobs.get(prediction_id)
+    if not job:
+        return handler._send(404, {"detail": "Not found"})
+    handler._send(200, prediction_body(stub, job))
+
+
+def cancel_prediction(handler, stub, body, prediction_id):
+    job = stub.jobs.get(prediction_id)
+    if not job:
+        return handler._send(404, {"detail": "Not found"})
+    job["canceled"] = True
+    handler._send(200, {"id": job["id"], "status": "canceled"})
+
+
+def generation_body(stub, job):
+    status = stub.job_status(job)
+    done = status == "succeeded"
+    return {
+        "id": job["id"],
+        "task_id": job["id"],
+        "status": "completed" if done else "failed" if status == "failed" else "processing",
+        "output_url": job["output"] if done else None,
+        "song_paths": [job["output"]] if done else [],
+    }
+
+
+def create_generation(handler, stub, body):
+    job = stub.create_job("sonauto", ".mp3", body, body.get("webhook_url"), generation_body)
+    handler._send(200, {"id": job["id"], "task_id": job["id"]})
+
+
+def get_generation(handler, stub, body, generation_id):
+    job = stub.jobs.get(generation_id)
+    if not job:
+        return handler._send(404, {"detail": "Not found"})
+    handler._send(200, generation_body(stub, job))
+
+
+def upload_file(handler, stub, body):
+    # The Replicate client uploads file inputs (the Kling start image) first
+    file_id = uuid.uuid4().hex
+    handler._send(201, {"id": file_id, "urls": {"get": f"{stub.base_url}/files/{file_id}"}})
+
+
+def search_videos(handler, stub, body):
+    videos = [
+        {
+            "id": index,
+            "duration": 10,
+            "image": f"{stub.base_url}/files/stock_{index}.jpg",
+            "video_files": [{
+                "quality": "hd",
+                "file_type": "video/mp4",
+                "width": 1280,
+                "height": 720,
+                "link": f"{stub.base_url}/files/stock_{index}.mp4",
+            }],
+        }
+        for index in range(3)
+    ]
+    handler._send(200, {"videos": videos})
+
+
+def serve_file(handler, stub, body, name):
+    content_types = {".png": "image/png", ".mp4": "video/mp4", ".mp3": "audio/mpeg", ".jpg": "image/jpeg"}
+    content_type = content_types.get(os.path.splitext(name)[1], "application/octet-stream")
+    handler._send(200, b"\x00" * STUB_FILE_SIZE, content_type)
+
+
+ROUTES = [
+    (r"/openai/v1/chat/completions", "POST", chat_completion),
+    (r"/openai/v1/audio/speech", "POST", speech),
+    (r"/replicate/v1/models/([^/]+/[^/]+)/predictions", "POST", create_prediction),
+    (r"/replicate/v1/predictions/([^/]+)", "GET", get_prediction),
+    (r"/replicate/v1/predictions/([^/]+)/cancel", "POST", cancel_prediction),
+    (r"/replicate/v1/files", "POST", upload_file),
+    (r"/sonauto/v1/generations", "POST", create_generation),
+    (r"/sonauto/v1/generations/([^/]+)", "GET", get_generation),
+    (r"/pexels/videos/search", "GET", search_videos),
+    (r"/files/([^/]+)", "GET", serve_file),
+]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the local provider stand-in server.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8055)
+    parser.add_argument("--delay", type=float, default=1.0, help="Seconds before a generation completes")
+    args = parser.parse_args()
+
+    stub = ProviderStub(args.host, args.port, args.delay)
+    for key, value in stub.env().items():
+        print(f"export {key}={value}")
+    print(f"Provider stub listening on {stub.base_url}")
+    try:
+        stub.server.serve_forever()
+    except KeyboardInterrupt:
+        stub.stop()
@@ -0,0 +1,369 @@
+import os
+import time
+import asyncio
+import uuid
+import hashlib
+import threading
+from contextlib import contextmanager, asynccontextmanager, nullcontext
+
+# Requests per second, burst size and concurrent calls per provider and API key.
+# Override with e.g. RATE_LIMIT_OPENAI="3,10,8"; a max_in_flight of 0 disables it.
+DEFAULT_LIMITS = {
+    "openai": (3.0, 10, 8),
+    "replicate": (5.0, 10, 10),
+    "sonauto": (1.0, 3, 4),
+    "pexels": (0.05, 20, 6),  # Pexels allows 200 requests per hour by default
+}
+
+# A lease whose holder died is dropped after this many seconds
+DEFAULT_LEASE_TTL = 600
+
+# How long to sleep before asking again while all in-flight slots are taken
+IN_FLIGHT_RETRY = 0.25
+
+
+def provider_limits(provider):
+    """Return (rate, burst, max_in_flight) for a provider, honouring RATE_LIMIT_<PROVIDER>."""
+    override = os.getenv(f"RATE_LIMIT_{provider.upper()}")
+    if override:
+        rate, burst, max_in_flight = [value.strip() for value in override.split(",")]
+        return float(rate), int(burst), int(max_in_flight)
+    return DEFAULT_LIMITS.get(provider, (10.0, 20, 0))
+
+
+class RateLimitExceeded(Exception):
+    """Raised when a slot is not available within the allowed wait."""
+
+    def __init__(self, provider, wait):
+        super().__init__(f"Rate limit for {provider} reached, retry in {wait:.1f}s")
+        self.provider = provider
+        self.wait = wait
+
+
+class InMemoryBackend:
+    """Token buckets and in-flight leases for a single process."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.buckets = {}
+        self.leases = {}
+        self.stats = {}
+
+    def try_acquire(self, key, rate, burst, max_in_flight, lease_id, lease_ttl, cost=1):
+        """Take cost tokens and an in-flight slot; returns (granted, seconds to wait)."""
+        with self.lock:
+            now = time.time()
+            leases = self.leases.setdefault(key, {})
+            for expired in [lease for lease, expires in leases.items() if expires <= now]:
+                del leases[expired]
+            if max_in_flight and len(leases) >= max_in_flight:
+                return False, IN_FLIGHT_RETRY
+
+            tokens, updated = self.buckets.get(key, (burst, now))
+            tokens = min(burst, tokens + (now - updated) * rate)
+            if tokens < cost:
+                self.buckets[key] = (tokens, now)
+                return False, (cost - tokens) / rate
+
+            self.buckets[key] = (tokens - cost, now)
+            if max_in_flight:
+                leases[lease_id] = now + lease_ttl
+            return True, 0.0
+
+    def release(self, key, lease_id):
+        with self.lock:
+            self.leases.get(key, {}).pop(lease_id, None)
+
+    def in_flight(self, key):
+        with self.lock:
+            now = time.time()
+            return sum(1 for expires in self.leases.get(key, {}).values() if expires > now)
+
+    def record(self, provider, field, amount=1):
+        with self.lock:
+            stats = self.stats.setdefault(provider, {})
+            stats[field] = stats.get(field, 0) + amount
+            if field == "wait_time":
+                stats["max_wait_time"] = max(stats.get("max_wait_time", 0), amount)
+
+    def get_stats(self):
+        with self.lock:
+            return {provider: dict(stats) for provider, stats in self.stats.items()}
+
+
+# Refill the bucket, drop expired leases, then take the tokens and a slot.
+# Redis' clock is used so all workers agree on the time.
+ACQUIRE_SCRIPT = """
+local time = redis.call('TIME')
+local now = tonumber(time[1]) + tonumber(time[2]) / 1000000
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local max_in_flight = tonumber(ARGV[3])
+local lease_ttl = tonumber(ARGV[5])
+local cost = tonumber(ARGV[7])
+
+redis.call('ZREMRANGEBYSCORE', KEYS[2], '-inf', now)
+if max_in_flight > 0 and redis.call('ZCARD', KEYS[2]) >= max_in_flight then
+    return {0, ARGV[6]}
+end
+
+local tokens = tonumber(redis.call('HGET', KEYS[1], 'tokens') or burst)
+local updated = tonumber(redis.call('HGET', KEYS[1], 'updated') or now)
+tokens = math.min(burst, tokens + (now - updated) * rate)
+if tokens < cost then
+    redis.call('HSET', KEYS[1], 'tokens', tokens, 'updated', now)
+    return {0, tostring((cost - tokens) / rate)}
+end
+
+redis.call('HSET', KEYS[1], 'tokens', tokens - cost, 'updated', now)
+redis.call('EXPIRE', KEYS[1], math.ceil(burst / rate) + 60)
+if max_in_flight > 0 then
+    redis.call('ZADD', KEYS[2], now + lease_ttl, ARGV[4])
+    redis.call('EXPIRE', KEYS[2], math.ceil(lease_ttl) + 60)
+end
+return {1, '0'}
+"""
+
+
+class RedisBackend:
+    """Token buckets and in-flight leases shared by every worker through Redis."""
+
+    def __init__(self, url, prefix="ratelimit"):
+        import redis
+
+        self.redis = redis.Redis.from_url(url)
+        self.prefix = prefix
+        self.acquire_script = self.redis.register_script(ACQUIRE_SCRIPT)
+
+    def try_acquire(self, key, rate, burst, max_in_flight, lease_id, lease_ttl, cost=1):
+        granted, wait = self.acquire_script(
+            keys=[f"{self.prefix}:{key}:bucket", f"{self.prefix}:{key}:inflight"],
+            args=[rate, burst, max_in_flight, lease_id, lease_ttl, IN_FLIGHT_RETRY, cost],
+        )
+        return bool(int(granted)), float(wait)
+
+    def release(self, key, lease_id):
+        self.redis.zrem(f"{self.prefix}:{key}:inflight", lease_id)
+
+    def in_flight(self, key):
+        return self.redis.zcount(f"{self.prefix}:{key}:inflight", time.time(), "+inf")
+
+    def record(self, provider, field, amount=1):
+        stats_key = f"{self.prefix}:stats:{provider}"
+        pipeline = self.redis.pipeline()
+        pipeline.hincrbyfloat(stats_key, field, amount)
+        if field == "wait_time":
+            # Not atomic, but a lost race only drops a near-identical maximum
+            current = self.redis.hget(stats_key, "max_wait_time")
+            if current is None or float(current) < amount:
+                pipeline.hset(stats_key, "max_wait_time", amount)
+        pipeline.execute()
+
+    def get_stats(self):
+        stats = {}
+        for stats_key in self.redis.scan_iter(f"{self.prefix}:stats:*"):
+            provider = stats_key.decode("utf-8").rsplit(":", 1)[-1]
+            stats[provider] = {
+                field.decode("utf-8"): float(value) for field, value in self.redis.hgetall(stats_key).items()
+            }
+        return stats
+
+
+class Lease:
+    """An acquired token and in-flight slot."""
+
+    def __init__(self, provider, key, lease_id):
+        self.provider = provider
+        self.key = key
+        self.id = lease_id
+
+
+class RateLimiter:
+    """Token-bucket plus max-in-flight limiter per provider and API key.
+
+    Every call to a provider first takes a token from the bucket of its
+    (provider, API key) pair, which caps the request rate while allowing
+    short bursts, and an in-flight slot, which caps concurrent calls. With
+    the Redis backend the limits hold across every worker and the web
+    process; the in-memory backend covers a single process and tests.
+
+    A task can ``reserve`` the in-flight slot up front without waiting (and
+    retry later if there is none); ``limit`` calls made by the service in
+    the same thread then only take their token from the bucket.
+    """
+
+    def __init__(self, backend=None):
+        self._backend = backend
+        self._backend_lock = threading.Lock()
+        self._local = threading.local()
+
+    @property
+    def backend(self):
+        """The configured backend, created on first use."""
+        if self._backend is None:
+            with self._backend_lock:
+                if self._backend is None:
+                    self._backend = self._create_backend()
+        return self._backend
+
+    def _create_backend(self):
+        """Use Redis when RATE_LIMIT_BACKEND=redis, otherwise limit per process."""
+        if os.getenv("RATE_LIMIT_BACKEND", "memory") == "redis":
+            url = os.getenv("RATE_LIMIT_REDIS_URL") or os.getenv("CELERY_BROKER_URL", "redis://localhost:6379/0")
+            try:
+                return RedisBackend(url)
+            except Exception as e:
+                print(f"Error connecting the rate limiter to Redis, limiting per process: {str(e)}")
+        return InMemoryBackend()
+
+    def bucket_key(self, provider, api_key=None):
+        """Limits apply per API key; the key itself is only stored hashed."""
+        key_hash = hashlib.sha256((api_key or "").encode("utf-8")).hexdigest()[:16]
+        return f"{provider}:{key_hash}"
+
+    def try_acquire(self, provider, api_key=None, lease_id=None, lease_ttl=DEFAULT_LEASE_TTL, cost=1, slot=True):
+        """Try once; returns (Lease, 0) or (None, seconds to wait before trying again).
+
+        cost is the number of tokens to take; slot=False skips the in-flight slot.
+        """
+        rate, burst, max_in_flight = provider_limits(provider)
+        key = self.bucket_key(provider, api_key)
+        lease_id = lease_id or uuid.uuid4().hex
+
+        try:
+            granted, wait = self.backend.try_acquire(
+                key, rate, burst, max_in_flight if slot else 0, lease_id, lease_ttl, cost
+            )
+        except Exception as e:
+            # Never stop generating because the limiter's store is unavailable
+            print(f"Error checking the {provider} rate limit: {str(e)}")
+            granted, wait = True, 0.0
+
+        if granted:
+            return Lease(provider, key, lease_id), 0.0
+        return None, wait
+
+    def acquire(self, provider, api_key=None, timeout=300, lease_ttl=DEFAULT_LEASE_TTL, cost=1, slot=True):
+        """Wait up to timeout seconds for a token and slot and return the Lease.
+
+        A timeout of 0 doesn't wait at all; RateLimitExceeded then carries
+        the suggested wait, e.g. for a Celery retry countdown.
+        """
+        started = time.perf_counter()
+        while True:
+            lease, wait = self.try_acquire(provider, api_key, lease_ttl=lease_ttl, cost=cost, slot=slot)
+            if lease:
+                self._record_acquired(provider, time.perf_counter() - started)
+                return lease
+
+            remaining = started + timeout - time.perf_counter()
+            if remaining <= 0:
+                self._record(provider, "rejected")
+                raise RateLimitExceeded(provider, wait)
+            time.sleep(min(wait, remaining))
+
+    async def aacquire(self, provider, api_key=None, timeout=300, lease_ttl=DEFAULT_LEASE_TTL):
+        """Async variant of acquire that sleeps without blocking the event loop."""
+        started = time.perf_counter()
+        while True:
+            lease, wait = self.try_acquire(provider, api_key, lease_ttl=lease_ttl)
+            if lease:
+                self._record_acquired(provider, time.perf_counter() - started)
+                return lease
+
+            remaining = started + timeout - time.perf_counter()
+            if remaining <= 0:
+                self._record(provider, "rejected")
+                raise RateLimitExceeded(provider, wait)
+            await asyncio.sleep(min(wait, remaining))
+
+    def release(self, lease):
+        """Give an in-flight slot back."""
+        try:
+            self.backend.release(lease.key, lease.id)
+        except Exception as e:
+            print(f"Error releasing the {lease.provider} rate limit slot: {str(e)}")
+
+    def _held(self):
+        """Bucket keys whose in-flight slot the current thread holds."""
+        held = getattr(self._local, "held", None)
+        if held is None:
+            held = self._local.held = set()
+        return held
+
+    @contextmanager
+    def limit(self, provider, api_key=None, timeout=300):
+        """Hold a token and an in-flight slot for the duration of one provider call."""
+        key = self.bucket_key(provider, api_key)
+        held = self._held()
+
+        if key in held:
+            # The slot is reserved already, the call only needs its token
+            yield self.acquire(provider, api_key, timeout=timeout, slot=False)
+            return
+
+        lease = self.acquire(provider, api_key, timeout=timeout)
+        with self._holding(key, lease):
+            yield lease
+
+    def reserve(self, provider, api_key=None, timeout=0, lease_ttl=DEFAULT_LEASE_TTL):
+        """Reserve an in-flight slot (no token) for the calls a task makes in one step.
+
+        The slot is taken right away and returned as a context manager that
+        holds it until the block exits. With the default timeout of 0 this
+        raises RateLimitExceeded immediately when every slot is taken, so the
+        task can retry later instead of occupying a worker while it waits.
+        """
+        key = self.bucket_key(provider, api_key)
+        if key in self._held():
+            return nullcontext()
+
+        lease = self.acquire(provider, api_key, timeout=timeout, lease_ttl=lease_ttl, cost=0)
+        return self._holding(key, lease)
+
+    @contextmanager
+    def _holding(self, key, lease):
+        held = self._held()
+        held.add(key)
+        try:
+            yield lease
+        finally:
+            held.discard(key)
+            self.release(lease)
+
+    @asynccontextmanager
+    async def alimit(self, provider, api_key=None, timeout=300):
+        """Async variant of limit; the slot is held until the block exits."""
+        lease = await self.aacquire(provider, api_key, timeout=timeout)
+        try:
+            yield lease
+        finally:
+            self.release(lease)
+
+    def in_flight(self, provider, api_key=None):
+        return self.backend.in_flight(self.bucket_key(provider, api_key))
+
+    def _record_acquired(self, provider, waited):
+        self._record(provider, "acquired")
+        if waited > 0.001:
+            self._record(provider, "waited")
+            self._record(provider, "wait_time", waited)
+
+    def _record(self, provider, field, amount=1):
+        try:
+            self.backend.record(provider, field, amount)
+        except Exception as e:
+            print(f"Error recording rate limiter metrics: {str(e)}")
+
+    def metrics(self):
+        """Per-provider counters: acquired, waited, rejected, wait_time (total) and max_wait_time."""
+        metrics = {}
+        for provider, stats in self.backend.get_stats().items():
+            acquired = stats.get("acquired", 0)
+            metrics[provider] = dict(stats)
+            metrics[provider]["avg_wait_time"] = round(stats.get("wait_time", 0) / acquired, 3) if acquired else 0.0
+        return metrics
+
+
+# Create a default rate limiter instance
+rate_limiter = RateLimiter()
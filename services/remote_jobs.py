@@ -0,0 +1,122 @@
+import os
+import hmac
+import time
+import base64
+import hashlib
+from datetime import datetime
+from flask import current_app
+from services.poller import replicate_result, sonauto_result, replicate_status, sonauto_status, COMPLETED, FAILED
+
+# Provider that generates each remote pipeline step
+REMOTE_STEP_PROVIDERS = {
+    "image": "replicate",
+    "video": "replicate",
+    "music": "sonauto",
+}
+
+# Translate a provider's webhook payload or status response into a check result
+PROVIDER_RESULTS = {
+    "replicate": replicate_result,
+    "sonauto": sonauto_result,
+}
+
+PROVIDER_STATUS = {
+    "replicate": replicate_status,
+    "sonauto": sonauto_status,
+}
+
+
+def webhook_base_url():
+    """Public base URL the providers can reach us on, e.g. https://videos.example.com."""
+    return os.getenv("WEBHOOK_BASE_URL", "").rstrip("/")
+
+
+def webhooks_enabled():
+    """Remote steps only complete through webhooks when a public base URL is configured."""
+    return bool(webhook_base_url())
+
+
+def webhook_token(job):
+    """Per-job token that proves a callback came from the URL we handed out."""
+    message = f"{job.provider}:{job.id}".encode("utf-8")
+    secret = current_app.config["SECRET_KEY"].encode("utf-8")
+    return hmac.new(secret, message, hashlib.sha256).hexdigest()
+
+
+def verify_webhook_token(job, token):
+    return hmac.compare_digest(webhook_token(job), token or "")
+
+
+def webhook_url(job):
+    """Callback URL for a remote job."""
+    return f"{webhook_base_url()}/webhooks/{job.provider}/{job.id}?token={webhook_token(job)}"
+
+
+def verify_replicate_signature(headers, body, tolerance=300):
+    """Check Replicate's webhook signature when REPLICATE_WEBHOOK_SECRET is set.
+
+    Replicate signs "<webhook-id>.<webhook-timestamp>.<body>" with HMAC-SHA256
+    using the base64 secret after its "whsec_" prefix; the webhook-signature
+    header holds one or more space separated "v1,<signature>" entries.
+    """
+    secret = os.getenv("REPLICATE_WEBHOOK_SECRET")
+    if not secret:
+        return True
+
+    webhook_id = headers.get("webhook-id")
+    timestamp = headers.get("webhook-timestamp")
+    signatures = headers.get("webhook-signature", "")
+    if not webhook_id or not timestamp or not timestamp.isdigit():
+        return False
+    if abs(time.time() - int(timestamp)) > tolerance:
+        return False
+
+    key = base64.b64decode(secret.split("_", 1)[1] if secret.startswith("whsec_") else secret)
+    signed_content = f"{webhook_id}.{timestamp}.".encode("utf-8") + body
+    expected = base64.b64encode(hmac.new(key, signed_content, hashlib.sha256).digest()).decode("ascii")
+    return any(hmac.compare_digest(expected, signature.split(",", 1)[-1]) for signature in signatures.split())
+
+
+def create_remote_job(project, step):
+    """Create a pending RemoteJob for a project step.
+
+    The job is committed before the provider is called, so its callback URL
+    can be built from the ID and a fast callback already finds the row.
+    """
+    from app import db, RemoteJob
+
+    job = RemoteJob(project_id=project.id, step=step, provider=REMOTE_STEP_PROVIDERS[step], status="pending")
+    db.session.add(job)
+    db.session.commit()
+    return job
+
+
+def record_submission(job, submission):
+    """Store the provider's job ID once the generation has been started; the caller commits."""
+    from app import db, RemoteJob
+
+    job.external_id = submission["id"]
+    job.model = submission.get("model")
+    job.cache_key = submission.get("cache_key")
+    # The callback may arrive at any time, even before this commit; only a
+    # job that is still pending becomes submitted, so its result is never overwritten
+    RemoteJob.query.filter_by(id=job.id, status="pending").update({"status": "submitted"}, synchronize_session=False)
+    db.session.expire(job, ["status"])
+
+
+def record_result(job, state, value):
+    """Store a completed or failed check result on the job; the caller commits."""
+    if state == COMPLETED:
+        job.status = "completed"
+        job.output_url = value
+    elif state == FAILED:
+        job.status = "failed"
+        job.error = str(value)
+    else:
+        return
+    job.completed_at = datetime.utcnow()
+
+
+def fetch_result(job, api_key):
+    """Ask the provider for the state of a job, e.g. when a callback carried no output URL."""
+    return PROVIDER_STATUS[job.provider](job.external_id, api_key)
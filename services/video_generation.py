@@ -1,16 +1,65 @@
 import os
 import time
+import asyncio
 import json
 import re
-import requests
+import math
+import uuid
 from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
 import replicate
 from openai import OpenAI
 import subprocess
-from flask import current_app
+from flask import has_app_context
 from storage import storage_manager
-from PIL import Image, ImageDraw, ImageFont
 from services.pexels_service import PexelsService
+from services.pipeline import PipelineExecutor
+from services.artifact_cache import artifact_cache, file_sha256
+from services.checkpoints import CheckpointStore, STEP_PATH_ATTRS
+from services.poller import poller
+from services.rate_limiter import rate_limiter
+from services.http_sessions import http_sessions
+from services.remote_jobs import REMOTE_STEP_PROVIDERS
+from services.idea_pool import idea_pool, prompt_version, IDEA_BATCH_SIZE
+from services.idea_history import idea_history
+from services.frames import last_frame
+from services.mezzanine import MEZZANINE_PROFILE, mezzanine_profile, normalize_clips, concat_copy, probe, matches_profile
+from services.encoding import profile_for_user, video_args, audio_args, duration_args, fit_filter, matches_size, oriented
+from services.chunked_encoding import encode_chunked, should_chunk
+from services.assets import asset_registry
+from services.demo_assets import demo_assets
+from services.loudness import MUSIC_TARGET, VOICE_TARGET, MIX_LIMIT, loudnorm_filter
+from services.packaging import HLS_PACKAGING, package_video
+from services.async_clients import AsyncOpenAIClient, AsyncReplicateClient, AsyncSonautoClient, download as async_download, provider_base_url
+
+FLUX_MODEL = "black-forest-labs/flux-pro"
+KLING_MODEL = "kwaivgi/kling-v1.6-standard"
+SONAUTO_MODEL = "sonauto/v1"
+
+# Ideas drawn before a repeat of a recent idea is accepted anyway
+IDEA_MAX_ATTEMPTS = 3
+
+# Where the output of each remote step is stored
+REMOTE_OUTPUT_FILES = {
+    "image": "static/image/flux_image_{}.png",
+    "video": "static/video/kling_video_{}.mp4",
+    "music": "static/music/sonauto_music_{}.mp3",
+}
+
+# Output file of every generation step, remote or not, formatted with a file stamp
+OUTPUT_FILES = dict(REMOTE_OUTPUT_FILES, voice="static/voice/openai_voice_{}.mp3")
+
+# Seconds of each stock clip used in a stock video
+STOCK_CLIP_SECONDS = float(os.getenv("STOCK_CLIP_SECONDS", 10))
+
+# Per-shot files of multi-shot videos, formatted with the run's file stamp and the shot number
+SHOT_OUTPUT_FILES = {
+    "image": "static/image/flux_image_{}_shot{}.png",
+    "video": "static/video/kling_video_{}_shot{}.mp4",
+    "frame": "static/image/last_frame_{}_shot{}.png",
+    "segment": "static/video/segment_{}_shot{}.mp4",
+    "joined": "static/video/joined_{}_shot{}.mp4",
+}
 
 class VideoGenerationService:
     """Service for handling video generation tasks."""
@@ -20,12 +69,21 @@ class VideoGenerationService:
         self.user = user
         self.project = project
 
+        # Step timings of the last generate_complete_video run
+        self.timings = {}
+
+        # Size, quality and length cap of the renders, from the user's subscription plan
+        self.encoding = profile_for_user(user)
+
         # Set up API clients based on user's API keys or default to environment variables
         self.setup_api_clients()
 
         # Initialize Pexels service
         self.pexels_service = PexelsService()
 
+        # Shared cache of previously generated artifacts
+        self.artifact_cache = artifact_cache
+
         # Ensure output directories exist
         Path("static/image").mkdir(exist_ok=True, parents=True)
         Path("static/video").mkdir(exist_ok=True, parents=True)
@@ -55,15 +113,75 @@ class VideoGenerationService:
         if not self.sonauto_api_key:
             print("No SonAuto API key found. Using demo mode.")
 
+    def has_openai_key(self):
+        """Whether a real OpenAI key is configured (otherwise steps run in demo mode)."""
+        return bool(self.openai_client.api_key) and self.openai_client.api_key not in ("your-openai-api-key", "dummy_key_for_demo_mode")
+
+    def has_replicate_key(self):
+        """Whether a real Replicate key is configured."""
+        replicate_api_key = os.environ.get("REPLICATE_API_TOKEN")
+        return bool(replicate_api_key) and replicate_api_key != "your-replicate-api-key"
+
+    def has_sonauto_key(self):
+        """Whether a real SonAuto key is configured."""
+        return bool(self.sonauto_api_key) and self.sonauto_api_key != "your-sonauto-api-key"
+
+    def file_stamp(self):
+        """Unique part of generated filenames; several runs may start in the same second."""
+        return f"{int(time.time())}_{uuid.uuid4().hex[:8]}"
+
     def read_file(self, file_path):
         """Read the content of a file."""
         with open(file_path, 'r') as file:
             return file.read()
 
+    def load_settings(self, file_path):
+        """Parse "key: value" lines from a settings file in prompts/."""
+        settings = {}
+        for line in self.read_file(file_path).strip().split('\n'):
+            if ':' in line:
+                key, value = line.split(':', 1)
+                settings[key.strip().strip('"')] = value.strip().rstrip(',').strip('"')
+        return settings
+
+    def cached_artifact(self, key, step, filename):
+        """Materialize a cached artifact at filename, returning its metadata or None."""
+        try:
+            return self.artifact_cache.get(key, step, filename)
+        except Exception as e:
+            print(f"Error reading artifact cache: {str(e)}")
+            return None
+
+    def output_filename(self, step):
+        """A new file for the output of a generation step."""
+        return OUTPUT_FILES[step].format(self.file_stamp())
+
+    def set_output(self, step, filename):
+        """Point the project at the output file of a step."""
+        if self.project:
+            setattr(self.project, STEP_PATH_ATTRS[step], filename.replace("static/", ""))
+
+    def cached_output(self, step, cache_key, filename):
+        """Serve a step from the artifact cache at filename; returns the cached metadata or None."""
+        cached = self.cached_artifact(cache_key, step, filename)
+        if cached:
+            self.set_output(step, filename)
+        return cached
+
+    def store_output(self, step, filename, cache_key, metadata=None):
+        """Cache a freshly generated output and point the project at it."""
+        self.artifact_cache.put(cache_key, step, filename, metadata)
+        self.set_output(step, filename)
+        print(f"{step.capitalize()} generated and saved to {filename}")
+        return filename
+
     def save_file(self, file_path, content, mode='wb'):
         """Save content to a file."""
-        # Extract directory and filename from file_path
+        # Extract directory and filename from file_path; the storage manager
+        # resolves directories relative to the static folder
         directory = os.path.dirname(file_path)
+        if directory.startswith("static/"):
+            directory = directory[len("static/"):]
         filename = os.path.basename(file_path)
 
         # Determine content type based on file extension
@@ -81,11 +199,17 @@ class VideoGenerationService:
         return storage_manager.save_file(content, directory, filename, content_type)
 
     def generate_idea(self):
-        """Generate a creative idea and prompt using OpenAI."""
+        """Generate a creative idea and prompt using OpenAI.
+
+        A ready idea is taken from the idea pool when there is one, so the
+        GPT-4o call is only on the critical path while the pool is empty.
+        Ideas too similar to a recent one are replaced before any image or
+        video is paid for.
+        """
         print("Generating idea using OpenAI...")
 
         # Check if we have an API key
-        if not self.openai_client.api_key or self.openai_client.api_key == "your-openai-api-key":
+        if not self.has_openai_key():
             print("No OpenAI API key found. Using demo mode with mock data.")
             # Use mock data for demo purposes
             idea = "A serene mountain landscape with flowing rivers and lush forests, changing through the seasons."
@@ -94,51 +218,152 @@ class VideoGenerationService:
             # Read idea generation prompt
             idea_prompt = self.read_file("prompts/idea_gen.txt")
 
-            # Call OpenAI API
-            response = self.openai_client.chat.completions.create(
-                model="gpt-4o",
-                messages=[{"role": "user", "content": idea_prompt}]
-            )
+            for attempt in range(1, IDEA_MAX_ATTEMPTS + 1):
+                pooled = self.claim_pooled_idea(idea_prompt)
+                if pooled:
+                    idea, prompt = pooled["idea"], pooled["prompt"]
+                else:
+                    # Call OpenAI API
+                    with self.provider_slot("openai"):
+                        response = self.openai_client.chat.completions.create(
+                            model="gpt-4o",
+                            messages=[{"role": "user", "content": idea_prompt}]
+                        )
+
+                    # Extract the response
+                    idea_text = response.choices[0].message.content.strip()
+                    idea, prompt = self.parse_idea_text(idea_text)
 
-            # Extract the response
-            idea_text = response.choices[0].message.content.strip()
+                if self.keep_idea(attempt, idea):
+                    break
 
-            # Parse the response to extract idea and prompt
-            lines = idea_text.split('\n')
-            idea = ""
-            prompt = ""
+            self.remember_idea(idea)
+
+        print(f"Idea generated: {idea[:50]}...")
+        return self.set_idea(idea, prompt)
 
-            for line in lines:
-                if line.startswith("Idea:"):
-                    idea = line[5:].strip()
-                elif line.startswith("Prompt:"):
-                    prompt = line[7:].strip()
+    def use_idea(self, idea, prompt=None):
+        """Take a given idea instead of generating one; the idea doubles as the prompt if there is none."""
+        return self.set_idea(idea, prompt or idea)
 
-        # Update project with the generated idea and prompt
+    def set_idea(self, idea, prompt):
+        """Update the project with an idea and its prompt."""
         if self.project:
             self.project.idea = idea
             self.project.prompt = prompt
-
-        print(f"Idea generated: {idea[:50]}...")
         return {"idea": idea, "prompt": prompt}
 
+    def keep_idea(self, attempt, idea):
+        """Whether to keep an idea candidate: it is not a repeat, or it was the last attempt."""
+        return attempt == IDEA_MAX_ATTEMPTS or not self.is_repeated_idea(idea)
+
+    def is_repeated_idea(self, idea):
+        """Whether an idea is a near-duplicate of a recently generated one."""
+        try:
+            matches = idea_history.similar(idea)
+        except Exception as e:
+            print(f"Error checking idea history: {str(e)}")
+            return False
+
+        if matches:
+            print(f"Idea is too similar ({matches[0][0]}) to a recent one: {matches[0][1][:50]}...")
+        return bool(matches)
+
+    def remember_idea(self, idea):
+        """Add an idea to the shared idea history."""
+        try:
+            idea_history.add(idea)
+        except Exception as e:
+            print(f"Error saving idea history: {str(e)}")
+
+    def claim_pooled_idea(self, idea_prompt):
+        """Take a pre-generated idea from the pool and queue a refill when it runs low."""
+        if not has_app_context():
+            return None
+
+        version = prompt_version(idea_prompt)
+        try:
+            pooled = idea_pool.claim(version, self.project)
+            idea_pool.request_refill(version)
+        except Exception as e:
+            print(f"Error reading idea pool: {str(e)}")
+            return None
+
+        if pooled:
+            print("Using idea from the idea pool")
+        return pooled
+
+    def generate_ideas_batch(self, count=IDEA_BATCH_SIZE):
+        """Generate count ideas in one structured GPT-4o call.
+
+        The idea_gen.txt examples are sent once for the whole batch. Returns a
+        list of {"idea", "prompt"} dicts; incomplete entries are dropped.
+        """
+        print(f"Generating a batch of {count} ideas using OpenAI...")
+
+        batch_prompt = self.read_file("prompts/idea_batch.txt").replace("{count}", str(count))
+        idea_prompt = self.read_file("prompts/idea_gen.txt")
+
+        with self.provider_slot("openai"):
+            response = self.openai_client.chat.completions.create(
+                model="gpt-4o",
+                messages=[{"role": "user", "content": f"{idea_prompt}\n\n{batch_prompt}"}],
+                response_format={"type": "json_object"}
+            )
+
+        ideas = self.parse_idea_batch(response.choices[0].message.content)
+        print(f"Generated {len(ideas)} ideas")
+        return ideas
+
+    def parse_idea_batch(self, batch_text):
+        """Parse the {"ideas": [{"idea", "prompt"}]} response of a batch idea call."""
+        try:
+            entries = json.loads(batch_text).get("ideas", [])
+        except (ValueError, AttributeError):
+            print("Could not parse the idea batch response")
+            return []
+
+        ideas = []
+        for entry in entries:
+            if not isinstance(entry, dict):
+                continue
+            idea = re.sub(r"^Idea:\s*", "", str(entry.get("idea", "")).strip())
+            prompt = re.sub(r"^Prompt:\s*", "", str(entry.get("prompt", "")).strip())
+            if idea and prompt:
+                ideas.append({"idea": idea, "prompt": prompt})
+        return ideas
+
+    def parse_idea_text(self, idea_text):
+        """Parse the "Idea:" and "Prompt:" lines of an idea generation response."""
+        idea = ""
+        prompt = ""
+
+        for line in idea_text.split('\n'):
+            if line.startswith("Idea:"):
+                idea = line[5:].strip()
+            elif line.startswith("Prompt:"):
+                prompt = line[7:].strip()
+
+        return idea, prompt
+
     def extract_keywords_from_text(self, text, num_keywords=3):
         """Extract keywords from text using OpenAI."""
         print(f"Extracting keywords from text...")
 
-        if not self.openai_client.api_key or self.openai_client.api_key == "your-openai-api-key":
+        if not self.has_openai_key():
             print("No OpenAI API key found. Using demo mode with predefined keywords.")
             # Use predefined keywords for demo purposes
             return ["nature", "landscape", "mountains"]
 
         try:
-            response = self.openai_client.chat.completions.create(
-                model="gpt-4o",
-                messages=[
-                    {"role": "system", "content": "You are a keyword extraction assistant."},
-                    {"role": "user", "content": f"Extract {num_keywords} main visual keywords from this text that would be good for finding stock videos. Return only the keywords separated by commas, no explanations: {text}"}
-                ]
-            )
+            with self.provider_slot("openai"):
+                response = self.openai_client.chat.completions.create(
+                    model="gpt-4o",
+                    messages=[
+                        {"role": "system", "content": "You are a keyword extraction assistant."},
+                        {"role": "user", "content": f"Extract {num_keywords} main visual keywords from this text that would be good for finding stock videos. Return only the keywords separated by commas, no explanations: {text}"}
+                    ]
+                )
 
             keywords_text = response.choices[0].message.content.strip()
             keywords = [k.strip() for k in keywords_text.split(',')]
@@ -149,7 +374,7 @@ class VideoGenerationService:
             print(f"Error extracting keywords: {str(e)}")
             return ["nature", "landscape", "mountains"]  # Fallback keywords
 
-    def generate_image(self, prompt):
+    def generate_image(self, prompt, filename=None):
         """Generate an image using Flux AI."""
         print(f"Generating image using Flux Image AI...")
 
@@ -158,27 +383,18 @@ class VideoGenerationService:
             raise ValueError("Empty prompt received. Cannot generate image.")
 
         # Generate a unique filename with png extension
-        timestamp = int(time.time())
-        image_filename = f"static/image/flux_image_{timestamp}.png"
+        image_filename = filename or self.output_filename("image")
 
         # Check if we have a Replicate API key
-        replicate_api_key = os.environ.get("REPLICATE_API_TOKEN")
-        if not replicate_api_key or replicate_api_key == "your-replicate-api-key":
+        if not self.has_replicate_key():
             print("No Replicate API key found. Using demo mode with placeholder image.")
             # Use a placeholder image for demo purposes
-            # Copy a placeholder image from static/img to the image_filename
             try:
-                # Create the directory if it doesn't exist
-                os.makedirs(os.path.dirname(image_filename), exist_ok=True)
-
-                # Use a placeholder image or create a simple colored image
-                from PIL import Image
-                img = Image.new('RGB', (768, 1344), color = (73, 109, 137))
-                img.save(image_filename)
+                # Link the pre-rendered placeholder image from the demo asset pack
+                demo_assets.link("image", image_filename)
 
                 # Update project with the image path
-                if self.project:
-                    self.project.image_path = image_filename.replace("static/", "")
+                self.set_output("image", image_filename)
 
                 print(f"Placeholder image saved to {image_filename}")
                 return image_filename
@@ -186,93 +402,82 @@ class VideoGenerationService:
                 print(f"Error creating placeholder image: {str(e)}")
                 raise
         else:
-            # Call Flux Image API with 9:16 aspect ratio dimensions
-            input_data = {
-                "width": 768,
-                "height": 1344,
-                "prompt": prompt,
-                "output_format": "png",
-                "aspect_ratio": "9:16",
-                "safety_tolerance": 6
-            }
+            input_data, cache_key = self.image_request(prompt)
+
+            # Reuse an identical earlier generation if we have one
+            if self.cached_output("image", cache_key, image_filename):
+                return image_filename
 
             try:
-                output = replicate.run(
-                    "black-forest-labs/flux-pro",
-                    input=input_data
-                )
+                job = self.submit_replicate("image", FLUX_MODEL, input_data, cache_key)
+                output = self.wait_remote(job)
 
                 # Download and save the image
-                response = requests.get(output)
-                self.save_file(image_filename, response.content)
-
-                # Update project with the image path
-                if self.project:
-                    self.project.image_path = image_filename.replace("static/", "")
-
-                print(f"Image generated and saved to {image_filename}")
-                return image_filename
+                return self.collect_remote_output("image", output, cache_key, image_filename)
             except Exception as e:
                 print(f"Error during image generation: {str(e)}")
                 raise
 
-    def generate_video(self, image_path, prompt):
+    def image_request(self, prompt):
+        """Build the Flux input and its artifact cache key."""
+        # Call Flux Image API with 9:16 aspect ratio dimensions
+        input_data = {
+            "width": 768,
+            "height": 1344,
+            "prompt": prompt,
+            "output_format": "png",
+            "aspect_ratio": "9:16",
+            "safety_tolerance": 6
+        }
+
+        settings = {k: v for k, v in input_data.items() if k != "prompt"}
+        cache_key = self.artifact_cache.make_key("image", FLUX_MODEL, {"prompt": prompt}, settings)
+        return input_data, cache_key
+
+    def video_request(self, image_path, prompt):
+        """Build the Kling input (without the start image) and its artifact cache key."""
+        settings = self.load_settings("prompts/video_gen.txt")
+
+        input_data = {
+            "prompt": prompt,
+            "negative_prompt": settings.get('negative_prompt', ''),
+            "aspect_ratio": settings.get('aspect_ratio', '9:16'),
+            "cfg_scale": float(settings.get('cfg_scale', 0.5)),
+            "duration": int(settings.get('duration', 10))
+        }
+
+        # The start image is keyed by content, not by its timestamped filename
+        cache_key = self.artifact_cache.make_key(
+            "video",
+            KLING_MODEL,
+            {"prompt": prompt, "image_sha256": file_sha256(image_path)},
+            settings
+        )
+        return input_data, cache_key
+
+    def generate_video(self, image_path, prompt, filename=None):
         """Generate a video using Kling AI."""
         print(f"Generating video using Kling AI...")
 
         # Read video generation settings
-        video_settings = self.read_file("prompts/video_gen.txt")
-
-        # Parse video settings
-        settings = {}
-        for line in video_settings.strip().split('\n'):
-            if ':' in line:
-                key, value = line.split(':', 1)
-                settings[key.strip()] = value.strip()
+        settings = self.load_settings("prompts/video_gen.txt")
 
-        # Prepare video generation payload
+        # The placeholder video uses the configured clip duration
         duration = int(settings.get('duration', 10))
-        aspect_ratio = settings.get('aspect_ratio', '9:16')
-        cfg_scale = float(settings.get('cfg_scale', 0.5))
-        negative_prompt = settings.get('negative_prompt', '')
 
         # Generate a unique filename
-        timestamp = int(time.time())
-        video_filename = f"static/video/kling_video_{timestamp}.mp4"
+        video_filename = filename or self.output_filename("video")
 
         # Check if we have a Replicate API key
-        replicate_api_key = os.environ.get("REPLICATE_API_TOKEN")
-        if not replicate_api_key or replicate_api_key == "your-replicate-api-key":
+        if not self.has_replicate_key():
             print("No Replicate API key found. Using demo mode with placeholder video.")
             # Use a placeholder video for demo purposes
             try:
-                # Create the directory if it doesn't exist
-                os.makedirs(os.path.dirname(video_filename), exist_ok=True)
-
-                # Create a simple video from the image using ffmpeg
-                # This creates a 10-second video that just shows the static image
-                command = [
-                    "ffmpeg",
-                    "-loop", "1",
-                    "-i", image_path,
-                    "-c:v", "libx264",
-                    "-t", str(duration),
-                    "-pix_fmt", "yuv420p",
-                    "-y",  # Overwrite output file if it exists
-                    video_filename
-                ]
-
-                try:
-                    # Try to run ffmpeg
-                    subprocess.run(command, check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-                except subprocess.CalledProcessError:
-                    # If ffmpeg fails, create an empty file as a placeholder
-                    with open(video_filename, "wb") as f:
-                        f.write(b"Placeholder video file")
+                # Link the pre-rendered clip of this length at the render's size
+                self.create_placeholder_video(video_filename, duration, portrait=True)
 
                 # Update project with the video path
-                if self.project:
-                    self.project.video_path = video_filename.replace("static/", "")
+                self.set_output("video", video_filename)
 
                 print(f"Placeholder video saved to {video_filename}")
                 return video_filename
@@ -280,59 +485,168 @@ class VideoGenerationService:
                 print(f"Error creating placeholder video: {str(e)}")
                 raise
         else:
+            input_data, cache_key = self.video_request(image_path, prompt)
+            if self.cached_output("video", cache_key, video_filename):
+                return video_filename
+
             # Open the image for upload
             with open(image_path, "rb") as image_file:
                 # Call Kling Video API
-                input_data = {
-                    "prompt": prompt,
-                    "negative_prompt": negative_prompt,
-                    "aspect_ratio": aspect_ratio,
-                    "cfg_scale": cfg_scale,
-                    "duration": duration,
-                    "start_image": image_file
-                }
-
-                output = replicate.run(
-                    "kwaivgi/kling-v1.6-standard",
-                    input=input_data
-                )
-
-                # Download and save the video
-                with open(video_filename, "wb") as file:
-                    file.write(output.read())
-
-            # Update project with the video path
-            if self.project:
-                self.project.video_path = video_filename.replace("static/", "")
+                job = self.submit_replicate("video", KLING_MODEL, dict(input_data, start_image=image_file), cache_key)
+
+            output = self.wait_remote(job)
+
+            # Download and save the video
+            return self.collect_remote_output("video", output, cache_key, video_filename)
+
+    def replicate_client(self):
+        """Replicate client for the configured token, honouring REPLICATE_API_BASE_URL."""
+        base_url = provider_base_url("replicate")
+        if base_url.endswith("/v1"):
+            base_url = base_url[:-len("/v1")]
+        return replicate.Client(api_token=os.environ.get("REPLICATE_API_TOKEN"), base_url=base_url)
+
+    def remote_api_key(self, provider):
+        """API key used for a provider's calls."""
+        if provider == "openai":
+            return self.openai_client.api_key
+        if provider == "sonauto":
+            return self.sonauto_api_key
+        if provider == "pexels":
+            return self.pexels_service.api_key
+        return os.environ.get("REPLICATE_API_TOKEN")
+
+    def provider_slot(self, provider):
+        """Rate limiter slot for one call to a provider with this service's API key."""
+        return rate_limiter.limit(provider, self.remote_api_key(provider))
+
+    def submit_replicate(self, step, model, input_data, cache_key, webhook=None):
+        """Start a Replicate prediction without waiting for it and describe the remote job."""
+        options = {}
+        if webhook:
+            options["webhook"] = webhook
+            options["webhook_events_filter"] = ["completed"]
+
+        with self.provider_slot("replicate"):
+            prediction = self.replicate_client().predictions.create(model=model, input=input_data, **options)
+        print(f"Replicate prediction {prediction.id} started for {model}")
+        return {"step": step, "provider": "replicate", "id": prediction.id, "model": model, "cache_key": cache_key}
+
+    def submit_sonauto(self, payload, cache_key, webhook=None):
+        """Start a SonAuto generation without waiting for it and describe the remote job."""
+        headers = {
+            "Authorization": f"Bearer {self.sonauto_api_key}",
+            "Content-Type": "application/json"
+        }
+        if webhook:
+            payload = dict(payload, webhook_url=webhook)
+
+        with self.provider_slot("sonauto"):
+            response = http_sessions.post("sonauto", f"{provider_base_url('sonauto')}/generations", headers=headers, json=payload, timeout=30)
+        if response.status_code != 200:
+            raise Exception(f"Error initiating music generation: {response.text}")
+
+        data = response.json()
+        generation_id = data.get("id") or data.get("task_id")
+        print(f"SonAuto generation {generation_id} started")
+        return {"step": "music", "provider": "sonauto", "id": generation_id, "model": SONAUTO_MODEL, "cache_key": cache_key}
+
+    def submit_remote_step(self, step, deps, webhook=None):
+        """Start the remote generation of the image, video or music step.
+
+        Steps that need no remote call (demo mode, or an identical artifact in
+        the cache) are finished right away. Returns either
+        ``{"status": "completed", "filename": ...}`` or
+        ``{"status": "submitted", ...}`` with the remote job description.
+        """
+        if step not in REMOTE_OUTPUT_FILES:
+            raise ValueError(f"Step '{step}' has no remote generation")
+
+        idea = deps["idea"]
+        filename = self.output_filename(step)
+
+        if step == "image":
+            if not idea.get("prompt") or idea["prompt"].strip() == "":
+                raise ValueError("Empty prompt received. Cannot generate image.")
+            if not self.has_replicate_key():
+                return {"status": "completed", "filename": self.generate_image(idea["prompt"])}
+            input_data, cache_key = self.image_request(idea["prompt"])
+        elif step == "video":
+            if not self.has_replicate_key():
+                return {"status": "completed", "filename": self.generate_video(deps["image"], idea["prompt"])}
+            input_data, cache_key = self.video_request(deps["image"], idea["prompt"])
+        else:
+            if not self.has_sonauto_key():
+                return {"status": "completed", "filename": self.generate_music(idea["idea"])}
+            input_data, cache_key = self.music_request(idea["idea"], self.load_settings("prompts/music_gen.txt"))
+
+        if self.cached_output(step, cache_key, filename):
+            return {"status": "completed", "filename": filename}
+
+        if step == "image":
+            job = self.submit_replicate(step, FLUX_MODEL, input_data, cache_key, webhook)
+        elif step == "video":
+            with open(deps["image"], "rb") as image_file:
+                job = self.submit_replicate(step, KLING_MODEL, dict(input_data, start_image=image_file), cache_key, webhook)
+        else:
+            job = self.submit_sonauto(input_data, cache_key, webhook)
+
+        job["status"] = "submitted"
+        return job
+
+    def wait_remote(self, job, timeout=900):
+        """Block until a submitted remote job finishes and return its output URL."""
+        return poller.wait(
+            job["provider"],
+            job["id"],
+            context={"api_key": self.remote_api_key(job["provider"]), "model": job["model"]},
+            timeout=timeout
+        )
+
+    def collect_remote_output(self, step, output_url, cache_key, filename=None):
+        """Download the output of a finished remote job and store it on the project."""
+        filename = filename or self.output_filename(step)
+        os.makedirs(os.path.dirname(filename), exist_ok=True)
+
+        # Outputs are served from the provider's file hosts, reuse its connections
+        provider = REMOTE_STEP_PROVIDERS[step]
+        if step == "video":
+            # Videos are large, stream them to disk instead of reading them into memory
+            with http_sessions.get(provider, output_url, stream=True, timeout=300) as response:
+                response.raise_for_status()
+                with open(filename, "wb") as file:
+                    for chunk in response.iter_content(chunk_size=1024 * 1024):
+                        file.write(chunk)
+        else:
+            response = http_sessions.get(provider, output_url, timeout=120)
+            response.raise_for_status()
+            self.save_file(filename, response.content)
 
-            print(f"Video generated and saved to {video_filename}")
-            return video_filename
+        return self.store_output(step, filename, cache_key)
 
     def generate_voice_dialog(self, idea):
         """Generate voice narration using OpenAI TTS."""
         print("Generating voice narration using OpenAI TTS...")
 
         # Check if we have an OpenAI API key
-        if not self.openai_client.api_key or self.openai_client.api_key == "your-openai-api-key":
+        if not self.has_openai_key():
             print("No OpenAI API key found. Using demo mode with placeholder voice narration.")
             # Use a placeholder script and voice file for demo purposes
             script = "In this breathtaking landscape, nature reveals its timeless beauty. Mountains rise majestically, rivers carve ancient paths, and forests breathe with life. A perfect harmony of elements, captured in a moment of serene wonder."
 
             # Generate a unique filename
-            timestamp = int(time.time())
+            timestamp = self.file_stamp()
             voice_filename = f"static/voice/openai_voice_{timestamp}.mp3"
 
             try:
                 # Create the directory if it doesn't exist
                 os.makedirs(os.path.dirname(voice_filename), exist_ok=True)
 
-                # Create an empty MP3 file as a placeholder
-                with open(voice_filename, "wb") as f:
-                    f.write(b"Placeholder voice file")
+                # Link the pre-rendered placeholder narration
+                self.link_demo_audio("voice", voice_filename)
 
                 # Update project with the voice path
-                if self.project:
-                    self.project.voice_path = voice_filename.replace("static/", "")
+                self.set_output("voice", voice_filename)
 
                 print(f"Placeholder voice file saved to {voice_filename}")
                 return {"filename": voice_filename, "script": script}
@@ -340,64 +654,89 @@ class VideoGenerationService:
                 print(f"Error creating placeholder voice file: {str(e)}")
                 raise
         else:
+            # Generate a unique filename
+            voice_filename = self.output_filename("voice")
+
+            script_messages, cache_key = self.voice_request(idea)
+            cached = self.cached_output("voice", cache_key, voice_filename)
+            if cached:
+                return {"filename": voice_filename, "script": cached.get("script", "")}
+
             # Generate script for narration
-            response = self.openai_client.chat.completions.create(
-                model="gpt-4o",
-                messages=[
-                    {"role": "system", "content": "You are a creative scriptwriter for short videos."},
-                    {"role": "user", "content": f"Write a short, engaging 30-second narration script for a video about this concept: {idea}. The narration should be dramatic, mysterious, and captivating. Keep it under 60 words."}
-                ]
-            )
+            with self.provider_slot("openai"):
+                response = self.openai_client.chat.completions.create(
+                    model="gpt-4o",
+                    messages=script_messages
+                )
 
             script = response.choices[0].message.content.strip()
 
-            # Generate a unique filename
-            timestamp = int(time.time())
-            voice_filename = f"static/voice/openai_voice_{timestamp}.mp3"
-
             # Generate voice using OpenAI TTS
-            response = self.openai_client.audio.speech.create(
-                model="gpt-4o-mini-tts",
-                voice="onyx",
-                input=script
-            )
-
-            # Save the audio file
-            response.stream_to_file(voice_filename)
+            with self.provider_slot("openai"):
+                response = self.openai_client.audio.speech.create(
+                    model="gpt-4o-mini-tts",
+                    voice="onyx",
+                    input=script
+                )
 
-            # Update project with the voice path
-            if self.project:
-                self.project.voice_path = voice_filename.replace("static/", "")
+                # Save the audio file
+                response.stream_to_file(voice_filename)
 
-            print(f"Voice narration generated and saved to {voice_filename}")
+            self.store_output("voice", voice_filename, cache_key, {"script": script})
             return {"filename": voice_filename, "script": script}
 
+    def voice_request(self, idea):
+        """Build the narration script messages and the voice artifact cache key."""
+        messages = [
+            {"role": "system", "content": "You are a creative scriptwriter for short videos."},
+            {"role": "user", "content": f"Write a short, engaging 30-second narration script for a video about this concept: {idea}. The narration should be dramatic, mysterious, and captivating. Keep it under 60 words."}
+        ]
+
+        # The script is generated from the idea, so the idea alone determines the narration
+        cache_key = self.artifact_cache.make_key("voice", "gpt-4o/gpt-4o-mini-tts/onyx", {"idea": idea})
+        return messages, cache_key
+
+    def music_request(self, idea, music_settings):
+        """Build the SonAuto payload and the music artifact cache key."""
+        # Create a prompt for the music based on the idea
+        payload = {
+            "prompt": f"Create atmospheric music for: {idea}",
+            "instrumental": True,
+            "prompt_strength": 2.3,
+            "output_format": "mp3"
+        }
+
+        cache_key = self.artifact_cache.make_key(
+            "music",
+            SONAUTO_MODEL,
+            {"prompt": payload["prompt"]},
+            {"payload": {k: v for k, v in payload.items() if k != "prompt"}, "settings": music_settings}
+        )
+        return payload, cache_key
+
     def generate_music(self, idea):
         """Generate music using SonAuto."""
         print("Generating music using SonAuto...")
 
         # Read music generation settings
-        music_settings = self.read_file("prompts/music_gen.txt")
+        music_settings = self.load_settings("prompts/music_gen.txt")
 
         # Generate a unique filename
-        timestamp = int(time.time())
-        music_filename = f"static/music/sonauto_music_{timestamp}.mp3"
+        music_filename = self.output_filename("music")
 
         # Check if we have a SonAuto API key
-        if not self.sonauto_api_key or self.sonauto_api_key == "your-sonauto-api-key":
+        if not self.has_sonauto_key():
             print("No SonAuto API key found. Using demo mode with placeholder music.")
             # Use a placeholder music file for demo purposes
             try:
                 # Create the directory if it doesn't exist
                 os.makedirs(os.path.dirname(music_filename), exist_ok=True)
 
-                # Create an empty MP3 file as a placeholder
-                with open(music_filename, "wb") as f:
-                    f.write(b"Placeholder music file")
+                # Link the pre-rendered placeholder music
+                self.link_demo_audio("music", music_filename)
 
                 # Update project with the music path
-                if self.project:
-                    self.project.music_path = music_filename.replace("static/", "")
+                self.set_output("music", music_filename)
 
                 print(f"Placeholder music file saved to {music_filename}")
                 return music_filename
@@ -405,118 +744,57 @@ class VideoGenerationService:
                 print(f"Error creating placeholder music file: {str(e)}")
                 raise
         else:
-            # Prepare the API request
-            url = "https://api.sonauto.ai/v1/generations"
-            headers = {
-                "Authorization": f"Bearer {self.sonauto_api_key}",
-                "Content-Type": "application/json"
-            }
-
-            # Create a prompt for the music based on the idea
-            payload = {
-                "prompt": f"Create atmospheric music for: {idea}",
-                "instrumental": True,
-                "prompt_strength": 2.3,
-                "output_format": "mp3"
-            }
-
-            # Make the API request
-            response = requests.post(url, headers=headers, json=payload)
-
-            if response.status_code == 200:
-                # Get the generation ID from the response
-                generation_id = response.json().get("id")
-
-                # Poll for the generation to complete
-                status_url = f"https://api.sonauto.ai/v1/generations/{generation_id}"
-
-                max_attempts = 60  # 5 minutes (5 seconds * 60)
-                attempts = 0
-
-                while attempts < max_attempts:
-                    status_response = requests.get(status_url, headers=headers)
-                    status_data = status_response.json()
-
-                    if status_data.get("status") == "completed":
-                        # Download the music file
-                        music_url = status_data.get("output_url")
-                        music_response = requests.get(music_url)
-
-                        # Save the music file
-                        self.save_file(music_filename, music_response.content)
-
-                        # Update project with the music path
-                        if self.project:
-                            self.project.music_path = music_filename.replace("static/", "")
-
-                        print(f"Music generated and saved to {music_filename}")
-                        return music_filename
+            payload, cache_key = self.music_request(idea, music_settings)
+            if self.cached_output("music", cache_key, music_filename):
+                return music_filename
 
-                    elif status_data.get("status") == "failed":
-                        raise Exception(f"Music generation failed: {status_data.get('error')}")
+            # Start the generation and wait for it; the shared poller checks
+            # all pending songs in one loop with adaptive intervals
+            job = self.submit_sonauto(payload, cache_key)
+            music_url = self.wait_remote(job, timeout=300)
 
-                    # Wait before checking again
-                    time.sleep(5)
-                    attempts += 1
+            # Download and save the music file
+            return self.collect_remote_output("music", music_url, cache_key, music_filename)
 
-                raise Exception("Music generation timed out")
-            else:
-                raise Exception(f"Error initiating music generation: {response.text}")
+    def create_placeholder_video(self, output_path, duration=10, portrait=False):
+        """Link the demo asset pack's placeholder clip of the given length at the render's size.
 
-    def create_placeholder_video(self, output_path, duration=10):
-        """Create a placeholder video with a colored background."""
+        Stand-ins for generated clips are portrait like the 9:16 clips they
+        replace, stand-ins for stock footage are landscape.
+        """
         try:
-            # Create a colored image
-            width, height = 1280, 720
-            img = Image.new('RGB', (width, height), color=(30, 64, 175))  # Dark blue color
-
-            # Add text
-            draw = ImageDraw.Draw(img)
-            try:
-                # Try to use a system font
-                font = ImageFont.truetype("Arial", 60)
-            except IOError:
-                # Fall back to default font
-                font = ImageFont.load_default()
-
-            text = "AI Video Generator"
-            text_width, text_height = draw.textbbox((0, 0), text, font=font)[2:4]
-            position = ((width - text_width) // 2, (height - text_height) // 2)
-            draw.text(position, text, fill=(255, 255, 255), font=font)
-
-            # Save the image
-            img_path = output_path.replace('.mp4', '.png')
-            img.save(img_path)
-
-            # Create a video from the image
-            command = [
-                "ffmpeg",
-                "-loop", "1",
-                "-i", img_path,
-                "-c:v", "libx264",
-                "-t", str(duration),
-                "-pix_fmt", "yuv420p",
-                "-y",
-                output_path
-            ]
-
-            subprocess.run(command, check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-
-            # Remove the temporary image
-            os.remove(img_path)
-
+            demo_assets.link("video", output_path, self.encoding["name"], duration, portrait=portrait)
             return True
         except Exception as e:
             print(f"Error creating placeholder video: {str(e)}")
 
             # Create an empty file as a last resort
+            os.makedirs(os.path.dirname(output_path), exist_ok=True)
             with open(output_path, "wb") as f:
                 f.write(b"Placeholder video file")
 
             return False
 
-    def generate_video_from_stock(self, idea, script=None):
-        """Generate a video using royalty-free stock footage."""
+    def link_demo_audio(self, kind, output_path):
+        """Link the demo asset pack's placeholder voice or music, or write a stub file without ffmpeg."""
+        try:
+            demo_assets.link(kind, output_path)
+        except Exception as e:
+            print(f"Error linking demo {kind}: {str(e)}")
+            os.makedirs(os.path.dirname(output_path), exist_ok=True)
+            with open(output_path, "wb") as f:
+                f.write(f"Placeholder {kind} file".encode())
+
+    def generate_video_from_stock(self, idea, script=None, compose=False):
+        """Generate a video using royalty-free stock footage.
+
+        Only the part of each clip that is used is fetched, streamed straight
+        into the mezzanine encode; clips that had to be downloaded whole are
+        normalized in parallel afterwards. The clips are joined without
+        another encode. If that fails, with compose the
+        downloaded clips are returned as they are, and create_final_video
+        scales, joins and encodes them together with the audio in one pass.
+        """
         print("Generating video using stock footage...")
 
         # Use script if provided, otherwise use idea
@@ -526,22 +804,35 @@ class VideoGenerationService:
         keywords = self.extract_keywords_from_text(text_for_keywords)
 
         # Generate a unique directory for this project
-        timestamp = int(time.time())
+        timestamp = self.file_stamp()
         project_dir = f"static/video/stock_{timestamp}"
         os.makedirs(project_dir, exist_ok=True)
 
-        # Search and download videos for each keyword
-        clip_paths = []
-        for i, keyword in enumerate(keywords):
+        # Search for a clip per keyword and stream only the seconds that are
+        # used straight into the mezzanine encode, all keywords at once
+        clip_seconds = self.stock_clip_seconds(len(keywords))
+        profile = mezzanine_profile(self.encoding)
+        threads = max(1, (os.cpu_count() or 1) // max(1, len(keywords)))
+
+        def fetch_clip(i, keyword):
             videos = self.pexels_service.search_stock_videos(keyword, per_page=3)
+            if not videos:
+                return None
+
+            video = videos[0]  # Use the first video
+            output_path = f"{project_dir}/video_{i}.mp4"
+            if self.pexels_service.ingest_stock_video(video["url"], output_path, clip_seconds, video.get("duration"), profile, threads):
+                return output_path
 
-            if videos and len(videos) > 0:
-                video = videos[0]  # Use the first video
-                output_path = f"{project_dir}/video_{i}.mp4"
+            # Fall back to downloading the whole file, it is normalized below
+            if self.pexels_service.download_stock_video(video["url"], output_path):
+                return output_path
+            return None
 
-                downloaded = self.pexels_service.download_stock_video(video["url"], output_path)
-                if downloaded:
-                    clip_paths.append(output_path)
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=max(1, len(keywords))) as pool:
+            clip_paths = [path for path in pool.map(fetch_clip, range(len(keywords)), keywords) if path]
+        print(f"Fetched {len(clip_paths)} stock clips of up to {clip_seconds:g}s in {time.perf_counter() - started:.1f}s")
 
         if not clip_paths:
             print("No stock videos found. Using placeholder video.")
@@ -550,9 +841,31 @@ class VideoGenerationService:
             self.create_placeholder_video(placeholder_path, 10)  # 10 seconds
             clip_paths = [placeholder_path]
 
-        # Combine videos using FFmpeg
+        # Output of the stage for this project
         output_video = f"static/video/stock_video_{timestamp}.mp4"
 
+        # Bring every clip to the mezzanine profile at the same time, after
+        # which they join by stream copy; clips that already match are kept
+        try:
+            started = time.perf_counter()
+            mezzanine_clips = normalize_clips(clip_paths, mezzanine_profile(self.encoding))
+            print(f"Normalized {len(clip_paths)} stock clips in {time.perf_counter() - started:.1f}s")
+
+            concat_copy(mezzanine_clips, output_video)
+
+            # Update project with the video path
+            if self.project:
+                self.project.video_path = output_video.replace("static/", "")
+
+            print(f"Stock video created and saved to {output_video}")
+            return output_video
+        except Exception as e:
+            print(f"Error normalizing stock clips: {str(e)}")
+
+        if compose:
+            print(f"Using {len(clip_paths)} stock clips as downloaded for the final composite")
+            return clip_paths
+
         # Create a file list for FFmpeg
         file_list_path = f"{project_dir}/filelist.txt"
         with open(file_list_path, 'w') as f:
@@ -565,8 +878,8 @@ class VideoGenerationService:
             "-f", "concat",
             "-safe", "0",
             "-i", file_list_path,
-            "-c:v", "libx264",
-            "-pix_fmt", "yuv420p",
+            "-vf", fit_filter(self.encoding),
+            *video_args(self.encoding),
             "-y",
             output_video
         ]
@@ -593,45 +906,235 @@ class VideoGenerationService:
             print(f"Placeholder video saved to {placeholder_path}")
             return placeholder_path
 
-    def create_final_video(self, video_path, music_path, idea, voice_data):
-        """Create the final video with music and voice narration."""
+    def stock_clip_seconds(self, count):
+        """Seconds used of each of count stock clips, within the plan's maximum duration."""
+        seconds = STOCK_CLIP_SECONDS
+        if self.encoding.get("max_duration") and count:
+            seconds = min(seconds, math.ceil(self.encoding["max_duration"] / count))
+        return seconds
+
+    def generate_shot_prompts(self, idea, prompt, count):
+        """Plan the prompts of a multi-shot storyboard in one structured GPT-4o call.
+
+        The first shot is the idea's own prompt; the call only writes the
+        prompts of the shots that follow it.
+        """
+        print(f"Planning {count} storyboard shots...")
+
+        if not self.has_openai_key():
+            print("No OpenAI API key found. Using demo mode with repeated shot prompts.")
+            return [prompt] + [f"{prompt} Shot {shot} of {count}, a later moment of the same scene." for shot in range(2, count + 1)]
+
+        storyboard_prompt = (self.read_file("prompts/storyboard_gen.txt")
+                             .replace("{count}", str(count))
+                             .replace("{idea}", idea)
+                             .replace("{prompt}", prompt))
+
+        with self.provider_slot("openai"):
+            response = self.openai_client.chat.completions.create(
+                model="gpt-4o",
+                messages=[{"role": "user", "content": storyboard_prompt}],
+                response_format={"type": "json_object"}
+            )
+
+        try:
+            shots = json.loads(response.choices[0].message.content).get("shots", [])
+        except (ValueError, AttributeError):
+            shots = []
+        shot_prompts = [prompt] + [str(shot).strip() for shot in shots if str(shot).strip()][:count - 1]
+
+        # Fill in any shots the model left out rather than failing the run
+        while len(shot_prompts) < count:
+            shot_prompts.append(f"{prompt} Shot {len(shot_prompts) + 1} of {count}, a later moment of the same scene.")
+        return shot_prompts
+
+    def shot_filename(self, step, shot, timestamp):
+        """Output file of one shot; shots render at the same time, so each gets its own name."""
+        return SHOT_OUTPUT_FILES[step].format(timestamp, shot)
+
+    def count_frames(self, video_path):
+        """Number of video frames in a clip, counted by ffprobe."""
+        result = subprocess.run(
+            [
+                "ffprobe", "-v", "error",
+                "-select_streams", "v:0",
+                "-count_packets",
+                "-show_entries", "stream=nb_read_packets",
+                "-of", "csv=p=0",
+                video_path
+            ],
+            check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True
+        )
+        return int(result.stdout.strip().split(",")[0])
+
+    def extract_last_frame(self, video_path, output_path):
+        """Save the last frame of a clip as an image, the start frame of the next chained clip."""
+        print(f"Extracting last frame of {video_path}...")
+
+        # Seeks from the end of the clip instead of decoding all of it
+        last_frame(video_path, output_path)
+
+        print(f"Last frame saved to {output_path}")
+        return output_path
+
+    def normalize_segment(self, video_path, output_path, drop_last_frame=False):
+        """Re-encode a chained clip into a segment that concatenates with the others without re-encoding.
+
+        The next clip starts on this clip's last frame, so every clip but the
+        last one drops it to avoid showing the frame twice.
+        """
+        os.makedirs(os.path.dirname(output_path), exist_ok=True)
+        encoding = self.source_encoding(video_path)
+
+        command = [
+            "ffmpeg",
+            "-i", video_path,
+            "-an",  # Audio is added by the final composite
+            "-vf", fit_filter(encoding),  # Already at the render size, the final pass copies it
+            *video_args(encoding),
+        ]
+        if drop_last_frame:
+            command += ["-frames:v", str(self.count_frames(video_path) - 1)]
+        command += ["-y", output_path]
+
+        subprocess.run(command, check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        return output_path
+
+    def concat_segments(self, segments, output_path):
+        """Join segments with identical encoding settings by copying their streams."""
+        os.makedirs(os.path.dirname(output_path), exist_ok=True)
+
+        # Paths in the list are resolved relative to the list, so make them absolute
+        segment_list = f"{output_path}.txt"
+        with open(segment_list, "w") as file:
+            for segment in segments:
+                file.write(f"file '{os.path.abspath(segment)}'\n")
+
+        try:
+            command = ["ffmpeg", "-f", "concat", "-safe", "0", "-i", segment_list, "-c", "copy", "-y", output_path]
+            subprocess.run(command, check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        finally:
+            os.remove(segment_list)
+        return output_path
+
+    def storyboard_clips(self, deps, count):
+        """Collect the shot clips in storyboard order.
+
+        Shots finish in any order, so the project is pointed back at the
+        first shot's image and clip once all of them are done.
+        """
+        clips = [deps[f"shot_{shot}_video"] for shot in range(1, count + 1)]
+        if self.project:
+            self.project.image_path = deps["image"].replace("static/", "", 1)
+            self.project.video_path = clips[0].replace("static/", "", 1)
+        return clips
+
+    def create_final_video(self, video_path, music_path, idea, voice_data, normalize=False):
+        """Create the final video with music and voice narration.
+
+        video_path may be a list of clips. Clips with the same encoding (the
+        shots of a storyboard) are concatenated and stream copied in the pass
+        that mixes the audio, unless they need scaling to the user's encoding
+        profile. With normalize the clips may differ (stock footage that
+        could not be normalized): unless they all match the mezzanine
+        profile, one filter graph scales and joins them, mixes the audio and
+        encodes the result once. The output is capped at the plan's maximum
+        duration.
+        """
         print("Creating final video with music and voice narration...")
 
         # Generate a unique filename for the final video
-        timestamp = int(time.time())
+        timestamp = self.file_stamp()
         final_video = f"static/final/final_video_{timestamp}.mp4"
 
         # Create the directory if it doesn't exist
         os.makedirs(os.path.dirname(final_video), exist_ok=True)
 
+        clip_list = None
+        composed = False
+        temp_files = []
+
         # Use FFmpeg to combine video, music, and voice
         try:
-            # Command to combine video with audio
-            command = [
-                "ffmpeg",
-                "-i", video_path,  # Input video
-                "-i", music_path,  # Input music
-                "-i", voice_data["filename"],  # Input voice
-                "-filter_complex",
-                "[1:a]volume=0.5[music];[2:a]volume=1.0[voice];[music][voice]amix=inputs=2:duration=longest[a]",
-                "-map", "0:v",  # Use video from first input
-                "-map", "[a]",  # Use mixed audio
-                "-c:v", "copy",  # Copy video codec
-                "-c:a", "aac",  # AAC audio codec
-                "-shortest",  # End when shortest input ends
-                "-y",  # Overwrite output file if it exists
-                final_video
-            ]
+            # Portrait clips are rendered at the profile's upright frame
+            encoding = self.source_encoding(video_path[0] if isinstance(video_path, (list, tuple)) else video_path)
+
+            if isinstance(video_path, (list, tuple)) and normalize:
+                # Clips already in the mezzanine profile are joined by stream copy
+                try:
+                    profile = mezzanine_profile(encoding)
+                    composed = not all(matches_profile(probe(clip), profile) for clip in video_path)
+                except Exception as e:
+                    print(f"Error probing clips, composing them instead: {str(e)}")
+                    composed = True
+
+            if composed:
+                command = self.composition_command(video_path, music_path, voice_data["filename"], final_video, encoding)
+                video_path = video_path[0]
+            else:
+                # Long renders that need encoding are encoded in parallel segments first
+                clips = list(video_path) if isinstance(video_path, (list, tuple)) else [video_path]
+                encoded = None if self.fits_encoding(clips[0], encoding) else self.encode_segments(clips, timestamp, temp_files, encoding)
+                if encoded:
+                    video_path = encoded
+
+                if isinstance(video_path, (list, tuple)):
+                    # The concat demuxer reads the clips one after another, no intermediate file;
+                    # paths in the list are resolved relative to the list, so make them absolute
+                    clip_list = f"static/final/final_video_{timestamp}_clips.txt"
+                    with open(clip_list, "w") as file:
+                        for clip in video_path:
+                            file.write(f"file '{os.path.abspath(clip)}'\n")
+                    video_input = ["-f", "concat", "-safe", "0", "-i", clip_list]
+                    video_path = video_path[0]
+                else:
+                    video_input = ["-i", video_path]
+
+                # Video already at the render size is copied, anything else is scaled and encoded once
+                if encoded or self.fits_encoding(video_path, encoding):
+                    video_codec = ["-c:v", "copy"]
+                else:
+                    video_codec = ["-vf", fit_filter(encoding), *video_args(encoding)]
+
+                # Command to combine video with audio
+                command = [
+                    "ffmpeg",
+                    *video_input,  # Input video
+                    "-i", music_path,  # Input music
+                    "-i", voice_data["filename"],  # Input voice
+                    "-filter_complex",
+                    self.audio_mix_graph(music_path, voice_data["filename"], 1, 2),
+                    "-map", "0:v",  # Use video from first input
+                    "-map", "[a]",  # Use mixed audio
+                    *video_codec,
+                    *audio_args(encoding),  # AAC audio at the profile's bitrate
+                    *duration_args(encoding),  # The plan's maximum duration
+                    "-shortest",  # End when shortest input ends
+                    "-y",  # Overwrite output file if it exists
+                    final_video
+                ]
 
             try:
                 # Execute the command
                 subprocess.run(command, check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+
+                if composed and self.project:
+                    # Re-running only the final step needs the video on its own
+                    video_track = f"static/video/stock_video_{timestamp}.mp4"
+                    self.extract_video_track(final_video, video_track)
+                    self.project.video_path = video_track.replace("static/", "")
             except subprocess.CalledProcessError:
                 # If ffmpeg fails, create a simple copy of the video file as a fallback
                 print("FFmpeg command failed, creating a simple copy of the video as fallback")
                 with open(video_path, "rb") as src_file:
                     with open(final_video, "wb") as dst_file:
                         dst_file.write(src_file.read())
+                if composed and self.project:
+                    self.project.video_path = video_path.replace("static/", "")
+            finally:
+                for temp_file in [clip_list, *temp_files]:
+                    if temp_file and os.path.exists(temp_file):
+                        os.remove(temp_file)
 
             # Update project with the final video path
             if self.project:
@@ -658,45 +1161,248 @@ class VideoGenerationService:
                 print(f"Error creating placeholder final video: {str(inner_e)}")
                 raise
 
-    def generate_complete_video(self, use_stock=True):
+    def composition_command(self, clips, music_path, voice_path, output_path, encoding=None):
+        """Build one ffmpeg command that scales and joins clips, mixes the audio and encodes once."""
+        encoding = encoding or self.encoding
+        inputs = []
+        for clip in clips:
+            inputs += ["-i", clip]
+        music_index = len(clips)
+        voice_index = len(clips) + 1
+
+        # Every clip is brought to the render size, aspect and frame rate before the concat
+        normalize = f"{fit_filter(encoding)},fps={MEZZANINE_PROFILE['fps']},format={MEZZANINE_PROFILE['pix_fmt']}"
+        graph = [f"[{index}:v]{normalize}[v{index}]" for index in range(len(clips))]
+        graph.append("".join(f"[v{index}]" for index in range(len(clips))) + f"concat=n={len(clips)}:v=1:a=0[v]")
+        graph.append(self.audio_mix_graph(music_path, voice_path, music_index, voice_index))
+
+        return [
+            "ffmpeg",
+            *inputs,  # Input clips
+            "-i", music_path,  # Input music
+            "-i", voice_path,  # Input voice
+            "-filter_complex", ";".join(graph),
+            "-map", "[v]",  # Use the joined video
+            "-map", "[a]",  # Use mixed audio
+            *video_args(encoding),  # The only video encode
+            *audio_args(encoding),  # AAC audio at the profile's bitrate
+            *duration_args(encoding),  # The plan's maximum duration
+            "-shortest",  # End when shortest input ends
+            "-y",  # Overwrite output file if it exists
+            output_path
+        ]
+
+    def audio_mix_graph(self, music_path, voice_path, music_index, voice_index):
+        """Filter graph that levels the music and voice inputs and mixes them into [a].
+
+        Each track is normalized in one linear loudnorm pass from its stored
+        loudness measurements; a track is only analyzed the first time its
+        content is seen. Tracks that can't be measured (e.g. demo stubs) are
+        mixed at fixed volumes instead.
+        """
+        try:
+            # Both tracks are analyzed at the same time when neither is known yet
+            with ThreadPoolExecutor(max_workers=2) as pool:
+                music = pool.submit(asset_registry.loudness, music_path, MUSIC_TARGET)
+                voice = pool.submit(asset_registry.loudness, voice_path, VOICE_TARGET)
+                music_filter = loudnorm_filter(music.result(), MUSIC_TARGET)
+                voice_filter = loudnorm_filter(voice.result(), VOICE_TARGET)
+            # The levels are set per track, so amix must not scale them down again
+            mix = f"amix=inputs=2:duration=longest:normalize=0,alimiter=limit={MIX_LIMIT}"
+        except Exception as e:
+            print(f"Error measuring loudness, mixing at fixed volumes: {str(e)}")
+            music_filter, voice_filter = "volume=0.5", "volume=1.0"
+            mix = "amix=inputs=2:duration=longest"
+
+        return f"[{music_index}:a]{music_filter}[music];[{voice_index}:a]{voice_filter}[voice];[music][voice]{mix}[a]"
+
+    def encode_segments(self, clips, timestamp, temp_files, encoding=None):
+        """Encode a long render's video in parallel segments; returns the encoded file or None.
+
+        Short renders return None and are encoded in the final pass as usual.
+        Intermediate files are added to temp_files for the caller to remove.
+        """
+        encoding = encoding or self.encoding
+        try:
+            duration = sum(asset_registry.metadata(clip)["duration"] or 0 for clip in clips)
+            if encoding.get("max_duration"):
+                duration = min(duration, encoding["max_duration"])
+            if not should_chunk(duration):
+                return None
+
+            source = clips[0]
+            if len(clips) > 1:
+                # Clips of one render share their encoding, join them without re-encoding first
+                source = concat_copy(clips, f"static/final/final_video_{timestamp}_joined.mp4")
+                temp_files.append(source)
+
+            encoded = f"static/final/final_video_{timestamp}_video.mp4"
+            temp_files.append(encoded)
+            result = encode_chunked(source, encoded, encoding, fit_filter(encoding),
+                                    max_duration=encoding.get("max_duration"))
+            print(f"Encoded {duration:.1f}s of video in {len(result['segments'])} parallel segments in {result['seconds']}s")
+            return encoded
+        except Exception as e:
+            print(f"Error encoding segments in parallel, encoding in one pass: {str(e)}")
+            return None
+
+    def fits_encoding(self, video_path, encoding=None):
+        """Whether a clip can go into the final video without being re-encoded for the user's profile."""
+        try:
+            return matches_size(probe(video_path), encoding or self.encoding)
+        except Exception as e:
+            print(f"Error probing {video_path}: {str(e)}")
+            return False
+
+    def source_encoding(self, video_path):
+        """The user's profile turned to a clip's orientation, so portrait clips are not cropped to landscape."""
+        try:
+            info = probe(video_path)
+            return oriented(self.encoding, info.get("width"), info.get("height"))
+        except Exception as e:
+            print(f"Error probing {video_path}: {str(e)}")
+            return self.encoding
+
+    def extract_video_track(self, video_path, output_path):
+        """Copy the video track of a file into its own file without re-encoding it."""
+        os.makedirs(os.path.dirname(output_path), exist_ok=True)
+        command = ["ffmpeg", "-i", video_path, "-map", "0:v", "-c", "copy", "-y", output_path]
+        subprocess.run(command, check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        return output_path
+
+    def package_final_video(self, final_video):
+        """Package the final video as HLS renditions for streaming; returns the master playlist or None.
+
+        The project keeps its MP4 either way, so a failed packaging only
+        means the pages play the MP4 instead of the playlist.
+        """
+        # A package of an earlier final video must not be played for this one
+        if self.project:
+            self.project.hls_path = None
+
+        if not HLS_PACKAGING or not final_video:
+            return None
+
+        print("Packaging final video for streaming...")
+        try:
+            name, _ = os.path.splitext(os.path.basename(final_video))
+            package = package_video(final_video, self.encoding, name)
+        except Exception as e:
+            print(f"Error packaging final video, serving the MP4 only: {str(e)}")
+            return None
+
+        if self.project:
+            self.project.hls_path = package["master"]
+
+        print(f"Packaged {', '.join(package['renditions'])} renditions to {package['master']}")
+        return package["master"]
+
+    def generate_complete_video(self, use_stock=True, resume=True, shots=1, chained=False, idea=None, music_prompt=None):
         """Run the complete video generation pipeline.
 
+        After the idea is generated, the image, voice, video and music steps run
+        concurrently; only the final composite waits for all of them.
+
         Args:
             use_stock (bool): Whether to use stock videos from Pexels (True) or AI-generated videos (False)
+            resume (bool): Skip steps whose checkpoints from an earlier failed run are still valid
+            shots (int): Number of AI-generated shots; with more than one the video is a storyboard
+                whose shots are planned in one call and rendered at the same time
+            chained (bool): Start every shot from the last frame of the shot before it instead
+            idea (dict): Use this {"idea", "prompt"} instead of generating an idea
+            music_prompt (str): Describe the music with this instead of the idea
         """
+        storyboard = not use_stock and shots > 1 and not chained
+        continuation = not use_stock and shots > 1 and chained
+        checkpoints = CheckpointStore(self.project)
+
         try:
             # Update project status
             if self.project:
                 self.project.status = "processing"
 
+            if resume:
+                checkpoints.load()
+            else:
+                checkpoints.clear()
+
+            # Every shot's image and video can be waiting on the provider at once
+            executor = PipelineExecutor(
+                max_workers=4 + 2 * (shots - 1) if storyboard or continuation else 4,
+                on_step_complete=lambda name, result: checkpoints.record(name, result)
+            )
+
+            def add_step(name, func, depends_on=None):
+                executor.add_step(
+                    name,
+                    lambda deps: self.run_checkpointed(checkpoints, name, deps, func),
+                    depends_on=depends_on
+                )
+
             # Step 1: Generate idea
-            result = self.generate_idea()
-            idea, prompt = result["idea"], result["prompt"]
+            if idea:
+                add_step("idea", lambda deps: self.use_idea(idea["idea"], idea.get("prompt")))
+            else:
+                add_step("idea", lambda deps: self.generate_idea())
 
             # Step 2: Generate image (still needed for thumbnail)
-            image_path = self.generate_image(prompt)
+            add_step("image", lambda deps: self.generate_image(deps["idea"]["prompt"]), depends_on=["idea"])
 
             # Step 3: Generate voice dialog
-            voice_data = self.generate_voice_dialog(idea)
+            add_step("voice", lambda deps: self.generate_voice_dialog(deps["idea"]["idea"]), depends_on=["idea"])
 
             # Step 4: Generate video (either from stock or AI)
             if use_stock:
-                video_path = self.generate_video_from_stock(idea)
+                # The clips are only encoded once, by the final composite
+                add_step("video", lambda deps: self.generate_video_from_stock(deps["idea"]["idea"], compose=True), depends_on=["idea"])
+            elif storyboard:
+                self.add_storyboard_steps(add_step, shots)
+            elif continuation:
+                self.add_continuation_steps(add_step, shots)
             else:
-                video_path = self.generate_video(image_path, prompt)
+                add_step(
+                    "video",
+                    lambda deps: self.generate_video(deps["image"], deps["idea"]["prompt"]),
+                    depends_on=["idea", "image"]
+                )
 
             # Step 5: Generate music
-            music_path = self.generate_music(idea)
+            add_step("music", lambda deps: self.generate_music(music_prompt or deps["idea"]["idea"]), depends_on=["idea"])
 
             # Step 6: Create final video with music and voice
-            final_video = self.create_final_video(video_path, music_path, idea, voice_data)
+            add_step(
+                "final",
+                lambda deps: self.create_final_video(deps["video"], deps["music"], deps["idea"]["idea"], deps["voice"], normalize=use_stock),
+                depends_on=["idea", "video", "music", "voice"]
+            )
+
+            # Step 7: Package the final video for streaming; not checkpointed, it runs last
+            executor.add_step("package", lambda deps: self.package_final_video(deps["final"]), depends_on=["final"])
+
+            try:
+                results = executor.run()
+            finally:
+                self.timings = executor.timings
+                self.record_metrics(executor.timings)
+
+            final_video = results["final"]
+
+            # A finished project starts from scratch the next time it is generated
+            checkpoints.clear()
 
             print("\nVideo generation process complete!")
             print(f"Final Output: {final_video}")
+            print(
+                f"Wall time: {executor.timings['wall_time']}s "
+                f"(critical path {' -> '.join(executor.timings['critical_path'])}: "
+                f"{executor.timings['critical_path_time']}s, serial: {executor.timings['serial_time']}s)"
+            )
 
             return {
                 "status": "completed",
-                "final_video": final_video
+                "final_video": final_video,
+                "hls_playlist": results.get("package"),
+                "timings": executor.timings
             }
         except Exception as e:
             print(f"Error during video generation: {str(e)}")
@@ -707,5 +1413,359 @@ class VideoGenerationService:
 
             return {
                 "status": "error",
-                "message": str(e)
+                "message": str(e),
+                "timings": self.timings
+            }
+
+    def add_storyboard_steps(self, add_step, count):
+        """Add the steps of a storyboard video to a pipeline.
+
+        Shot 1 is the regular image step and the idea's prompt, so it starts
+        while the prompts of the other shots are still being planned. Each
+        other shot's image and clip only wait for the plan, and the provider
+        limiter decides how many of them run at once. The video step returns
+        the clips in order for create_final_video to concatenate.
+        """
+        timestamp = self.file_stamp()
+
+        add_step(
+            "shots",
+            lambda deps: self.generate_shot_prompts(deps["idea"]["idea"], deps["idea"]["prompt"], count),
+            depends_on=["idea"]
+        )
+
+        add_step(
+            "shot_1_video",
+            lambda deps: self.generate_video(deps["image"], deps["idea"]["prompt"], self.shot_filename("video", 1, timestamp)),
+            depends_on=["idea", "image"]
+        )
+
+        for shot in range(2, count + 1):
+            add_step(
+                f"shot_{shot}_image",
+                lambda deps, shot=shot: self.generate_image(deps["shots"][shot - 1], self.shot_filename("image", shot, timestamp)),
+                depends_on=["shots"]
+            )
+            add_step(
+                f"shot_{shot}_video",
+                lambda deps, shot=shot: self.generate_video(
+                    deps[f"shot_{shot}_image"], deps["shots"][shot - 1], self.shot_filename("video", shot, timestamp)
+                ),
+                depends_on=["shots", f"shot_{shot}_image"]
+            )
+
+        add_step(
+            "video",
+            lambda deps: self.storyboard_clips(deps, count),
+            depends_on=["image"] + [f"shot_{shot}_video" for shot in range(1, count + 1)]
+        )
+
+    def add_continuation_steps(self, add_step, count):
+        """Add the steps of a chained video, each shot continuing from the last frame of the one before.
+
+        Only the chain of clips is serial. Each finished clip is normalized
+        and appended to the video so far while the next clip renders, and
+        the music and voice steps run alongside the whole chain, so the
+        final composite only waits for the last clip's segment.
+        """
+        timestamp = self.file_stamp()
+
+        for shot in range(1, count + 1):
+            start_frame = "image" if shot == 1 else f"shot_{shot}_frame"
+            add_step(
+                f"shot_{shot}_video",
+                lambda deps, shot=shot, start_frame=start_frame: self.generate_video(
+                    deps[start_frame], deps["idea"]["prompt"], self.shot_filename("video", shot, timestamp)
+                ),
+                depends_on=["idea", start_frame]
+            )
+
+            if shot < count:
+                add_step(
+                    f"shot_{shot + 1}_frame",
+                    lambda deps, shot=shot: self.extract_last_frame(
+                        deps[f"shot_{shot}_video"], self.shot_filename("frame", shot + 1, timestamp)
+                    ),
+                    depends_on=[f"shot_{shot}_video"]
+                )
+
+            add_step(
+                f"shot_{shot}_segment",
+                lambda deps, shot=shot: self.normalize_segment(
+                    deps[f"shot_{shot}_video"], self.shot_filename("segment", shot, timestamp), drop_last_frame=shot < count
+                ),
+                depends_on=[f"shot_{shot}_video"]
+            )
+
+            if shot > 1:
+                previous = "shot_1_segment" if shot == 2 else f"shot_{shot - 1}_joined"
+                add_step(
+                    f"shot_{shot}_joined",
+                    lambda deps, shot=shot, previous=previous: self.concat_segments(
+                        [deps[previous], deps[f"shot_{shot}_segment"]], self.shot_filename("joined", shot, timestamp)
+                    ),
+                    depends_on=[previous, f"shot_{shot}_segment"]
+                )
+
+        add_step(
+            "video",
+            lambda deps: self.continuation_video(deps, count),
+            depends_on=["image", f"shot_{count}_joined"]
+        )
+
+    def continuation_video(self, deps, count):
+        """Point the project at the joined chain and its first frame."""
+        video = deps[f"shot_{count}_joined"]
+        if self.project:
+            self.project.image_path = deps["image"].replace("static/", "", 1)
+            self.project.video_path = video.replace("static/", "", 1)
+        return video
+
+    def run_checkpointed(self, checkpoints, step, deps, func):
+        """Run func(deps) for a pipeline step unless a valid checkpoint already covers it."""
+        result = checkpoints.lookup(step, deps)
+        if result is not None:
+            print(f"Resuming from checkpoint: skipping {step} step")
+            checkpoints.restore(step, result)
+            return result
+        return func(deps)
+
+    def record_metrics(self, timings):
+        """Store per-step generation times for the project in ProjectMetrics."""
+        if not self.project or not self.project.id or not timings.get("steps"):
+            return
+
+        try:
+            from app import db
+            from analytics.models import ProjectMetrics
+
+            steps = timings["steps"]
+            metrics = ProjectMetrics(
+                project_id=self.project.id,
+                generation_time=timings.get("wall_time"),
+                image_generation_time=steps.get("image", {}).get("duration"),
+                video_generation_time=steps.get("video", {}).get("duration"),
+                music_generation_time=steps.get("music", {}).get("duration"),
+                voice_generation_time=steps.get("voice", {}).get("duration"),
+                final_video_time=steps.get("final", {}).get("duration")
+            )
+            db.session.add(metrics)
+        except Exception as e:
+            print(f"Error recording project metrics: {str(e)}")
+
+    # Async variants of the step methods. They share the request builders and
+    # the artifact cache with the blocking methods above, but talk to the
+    # providers through pooled async clients, so one event loop can drive many
+    # generations at once. Demo mode and ffmpeg work run in a thread.
+
+    async def agenerate_idea(self):
+        """Async variant of generate_idea."""
+        if not self.has_openai_key():
+            return await asyncio.to_thread(self.generate_idea)
+
+        print("Generating idea using OpenAI...")
+        idea_prompt = self.read_file("prompts/idea_gen.txt")
+
+        # The pool and the idea history are databases, their calls must not block the loop
+        for attempt in range(1, IDEA_MAX_ATTEMPTS + 1):
+            pooled = await asyncio.to_thread(self.claim_pooled_idea, idea_prompt)
+            if pooled:
+                idea, prompt = pooled["idea"], pooled["prompt"]
+            else:
+                client = AsyncOpenAIClient(self.openai_client.api_key)
+                async with rate_limiter.alimit("openai", client.api_key):
+                    idea_text = await client.chat("gpt-4o", [{"role": "user", "content": idea_prompt}])
+                idea, prompt = self.parse_idea_text(idea_text)
+
+            if await asyncio.to_thread(self.keep_idea, attempt, idea):
+                break
+
+        await asyncio.to_thread(self.remember_idea, idea)
+
+        print(f"Idea generated: {idea[:50]}...")
+        return self.set_idea(idea, prompt)
+
+    async def agenerate_image(self, prompt):
+        """Async variant of generate_image."""
+        if not prompt or prompt.strip() == "":
+            raise ValueError("Empty prompt received. Cannot generate image.")
+        if not self.has_replicate_key():
+            return await asyncio.to_thread(self.generate_image, prompt)
+
+        print("Generating image using Flux Image AI...")
+        image_filename = self.output_filename("image")
+        input_data, cache_key = self.image_request(prompt)
+        if self.cached_output("image", cache_key, image_filename):
+            return image_filename
+
+        client = AsyncReplicateClient(os.environ.get("REPLICATE_API_TOKEN"))
+        async with rate_limiter.alimit("replicate", client.api_key):
+            output_url = await client.run(FLUX_MODEL, input_data)
+        await async_download(output_url, image_filename)
+        return self.store_output("image", image_filename, cache_key)
+
+    async def agenerate_video(self, image_path, prompt):
+        """Async variant of generate_video."""
+        if not self.has_replicate_key():
+            return await asyncio.to_thread(self.generate_video, image_path, prompt)
+
+        print("Generating video using Kling AI...")
+        video_filename = self.output_filename("video")
+        input_data, cache_key = self.video_request(image_path, prompt)
+        if self.cached_output("video", cache_key, video_filename):
+            return video_filename
+
+        client = AsyncReplicateClient(os.environ.get("REPLICATE_API_TOKEN"))
+        input_data["start_image"] = client.file_input(image_path)
+        async with rate_limiter.alimit("replicate", client.api_key):
+            output_url = await client.run(KLING_MODEL, input_data)
+        await async_download(output_url, video_filename)
+        return self.store_output("video", video_filename, cache_key)
+
+    async def agenerate_voice_dialog(self, idea):
+        """Async variant of generate_voice_dialog."""
+        if not self.has_openai_key():
+            return await asyncio.to_thread(self.generate_voice_dialog, idea)
+
+        print("Generating voice narration using OpenAI TTS...")
+        voice_filename = self.output_filename("voice")
+        script_messages, cache_key = self.voice_request(idea)
+        cached = self.cached_output("voice", cache_key, voice_filename)
+        if cached:
+            return {"filename": voice_filename, "script": cached.get("script", "")}
+
+        client = AsyncOpenAIClient(self.openai_client.api_key)
+        async with rate_limiter.alimit("openai", client.api_key):
+            script = await client.chat("gpt-4o", script_messages)
+        async with rate_limiter.alimit("openai", client.api_key):
+            await client.speech(voice_filename, "gpt-4o-mini-tts", "onyx", script)
+
+        self.store_output("voice", voice_filename, cache_key, {"script": script})
+        return {"filename": voice_filename, "script": script}
+
+    async def agenerate_music(self, idea):
+        """Async variant of generate_music."""
+        if not self.has_sonauto_key():
+            return await asyncio.to_thread(self.generate_music, idea)
+
+        print("Generating music using SonAuto...")
+        music_filename = self.output_filename("music")
+        payload, cache_key = self.music_request(idea, self.load_settings("prompts/music_gen.txt"))
+        if self.cached_output("music", cache_key, music_filename):
+            return music_filename
+
+        client = AsyncSonautoClient(self.sonauto_api_key)
+        async with rate_limiter.alimit("sonauto", client.api_key):
+            music_url = await client.generate(payload)
+        await async_download(music_url, music_filename)
+        return self.store_output("music", music_filename, cache_key)
+
+    async def agenerate_video_from_stock(self, idea, script=None, compose=False):
+        """Async variant of generate_video_from_stock; the clip assembly runs in a thread."""
+        return await asyncio.to_thread(self.generate_video_from_stock, idea, script, compose)
+
+    async def acreate_final_video(self, video_path, music_path, idea, voice_data, normalize=False):
+        """Async variant of create_final_video; ffmpeg runs in a thread."""
+        return await asyncio.to_thread(self.create_final_video, video_path, music_path, idea, voice_data, normalize)
+
+    async def apackage_final_video(self, final_video):
+        """Async variant of package_final_video; ffmpeg runs in a thread."""
+        return await asyncio.to_thread(self.package_final_video, final_video)
+
+    async def arun_checkpointed(self, checkpoints, step, deps, func):
+        """Async variant of run_checkpointed; the checkpoint's file hash is checked in a thread."""
+        result = await asyncio.to_thread(checkpoints.lookup, step, deps)
+        if result is not None:
+            print(f"Resuming from checkpoint: skipping {step} step")
+            checkpoints.restore(step, result)
+            return result
+        return await func(deps)
+
+    async def agenerate_complete_video(self, use_stock=True, resume=True, shots=1, chained=False, idea=None, music_prompt=None):
+        """Async variant of generate_complete_video.
+
+        The steps run as tasks on the running loop and call the providers
+        through the async clients, so one loop can drive many generations
+        at once. The shot steps of storyboards and chained videos use the
+        blocking methods in threads.
+        """
+        storyboard = not use_stock and shots > 1 and not chained
+        continuation = not use_stock and shots > 1 and chained
+        checkpoints = CheckpointStore(self.project)
+
+        try:
+            if self.project:
+                self.project.status = "processing"
+
+            if resume:
+                checkpoints.load()
+            else:
+                checkpoints.clear()
+
+            executor = PipelineExecutor(on_step_complete=lambda name, result: checkpoints.record(name, result))
+
+            def add_step(name, func, depends_on=None):
+                executor.add_step(
+                    name,
+                    lambda deps: self.arun_checkpointed(checkpoints, name, deps, func),
+                    depends_on=depends_on
+                )
+
+            def add_blocking_step(name, func, depends_on=None):
+                add_step(name, lambda deps: asyncio.to_thread(func, deps), depends_on)
+
+            if idea:
+                add_blocking_step("idea", lambda deps: self.use_idea(idea["idea"], idea.get("prompt")))
+            else:
+                add_step("idea", lambda deps: self.agenerate_idea())
+
+            add_step("image", lambda deps: self.agenerate_image(deps["idea"]["prompt"]), depends_on=["idea"])
+            add_step("voice", lambda deps: self.agenerate_voice_dialog(deps["idea"]["idea"]), depends_on=["idea"])
+
+            if use_stock:
+                add_step("video", lambda deps: self.agenerate_video_from_stock(deps["idea"]["idea"], compose=True), depends_on=["idea"])
+            elif storyboard:
+                self.add_storyboard_steps(add_blocking_step, shots)
+            elif continuation:
+                self.add_continuation_steps(add_blocking_step, shots)
+            else:
+                add_step("video", lambda deps: self.agenerate_video(deps["image"], deps["idea"]["prompt"]), depends_on=["idea", "image"])
+
+            add_step("music", lambda deps: self.agenerate_music(music_prompt or deps["idea"]["idea"]), depends_on=["idea"])
+
+            add_step(
+                "final",
+                lambda deps: self.acreate_final_video(deps["video"], deps["music"], deps["idea"]["idea"], deps["voice"], normalize=use_stock),
+                depends_on=["idea", "video", "music", "voice"]
+            )
+
+            # Not checkpointed, it runs last
+            executor.add_step("package", lambda deps: self.apackage_final_video(deps["final"]), depends_on=["final"])
+
+            try:
+                results = await executor.arun()
+            finally:
+                self.timings = executor.timings
+                self.record_metrics(executor.timings)
+
+            final_video = results["final"]
+            checkpoints.clear()
+
+            print(f"\nVideo generation process complete!\nFinal Output: {final_video}")
+            return {
+                "status": "completed",
+                "final_video": final_video,
+                "hls_playlist": results.get("package"),
+                "timings": executor.timings
+            }
+        except Exception as e:
+            print(f"Error during video generation: {str(e)}")
+
+            if self.project:
+                self.project.status = "error"
+
+            return {
+                "status": "error",
+                "message": str(e),
+                "timings": self.timings
             }
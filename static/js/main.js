@@ -21,6 +21,9 @@ document.addEventListener('DOMContentLoaded', function() {
     
     // Form validation
     setupFormValidation();
+    
+    // Adaptive streaming of packaged final videos
+    setupStreamingPlayers();
 });
 
 // Setup handlers for project generation buttons
@@ -277,3 +280,27 @@ function setupFormValidation() {
         });
     }
 }
+
+// Play videos with an HLS package from their master playlist
+function setupStreamingPlayers() {
+    document.querySelectorAll('video[data-hls]').forEach(video => {
+        const playlist = video.dataset.hls;
+        
+        if (video.canPlayType('application/vnd.apple.mpegurl')) {
+            // Safari and iOS play HLS natively
+            video.src = playlist;
+        } else if (window.Hls && Hls.isSupported()) {
+            const hls = new Hls();
+            hls.on(Hls.Events.ERROR, function(event, data) {
+                if (data.fatal) {
+                    // Fall back to the MP4 source
+                    hls.destroy();
+                    video.load();
+                }
+            });
+            hls.loadSource(playlist);
+            hls.attachMedia(video);
+        }
+        // Otherwise the MP4 source plays as before
+    });
+}
@@ -1,7 +1,20 @@
 from celery import Celery
+from celery.exceptions import Ignore, Retry
+from celery.signals import worker_ready
 from flask import current_app
+from datetime import datetime
 from services.video_generation import VideoGenerationService
+from services.checkpoints import CheckpointStore
+from services.remote_jobs import REMOTE_STEP_PROVIDERS, webhooks_enabled, webhook_url, create_remote_job, record_submission, record_result, fetch_result
+from services.async_clients import PROVIDER_DEADLINES
+from services.poller import FAILED
+from services.rate_limiter import rate_limiter, RateLimitExceeded
+from services.idea_pool import idea_pool, prompt_version
+from services.idea_history import idea_history
+from services.assets import asset_registry
 import os
+import math
+import threading
 
 # Initialize Celery
 celery = Celery('ai_video_generator')
@@ -17,10 +30,61 @@ celery.conf.update(
     enable_utc=True,
 )
 
+# Progress reported to the parent task as each parallel step finishes
+PIPELINE_STEPS = ['image', 'voice', 'video', 'music']
+
+# Typical run time of each remote step in seconds; the first check of a
+# submitted job is scheduled shortly before it is expected to be done
+REMOTE_STEP_DURATIONS = {'image': 10, 'video': 240, 'music': 60}
+
+# Seconds between later checks; without webhooks they back off up to the maximum
+REMOTE_CHECK_INTERVAL = int(os.getenv('REMOTE_CHECK_INTERVAL', 5))
+REMOTE_MAX_CHECK_INTERVAL = int(os.getenv('REMOTE_MAX_CHECK_INTERVAL', 60))
+
+@worker_ready.connect
+def prebuild_demo_assets(**kwargs):
+    """Render the demo asset pack in the background when a worker starts, if it is missing."""
+    if os.getenv('DEMO_ASSETS_PREBUILD', 'true').lower() not in ('1', 'true', 'yes'):
+        return
+
+    from services.demo_assets import demo_assets
+
+    def build():
+        try:
+            manifest = demo_assets.build()
+            print(f"Demo asset pack v{manifest['version']} ready: {len(manifest['assets'])} assets")
+        except Exception as e:
+            print(f"Error building demo asset pack: {str(e)}")
+
+    threading.Thread(target=build, daemon=True).start()
+
+def report_progress(parent_task_id, step, progress, status='processing'):
+    """Update the state of the parent pipeline task from one of its step tasks."""
+    if parent_task_id:
+        generate_video_task.update_state(
+            task_id=parent_task_id,
+            state='PROGRESS',
+            meta={'status': status, 'step': step, 'progress': progress}
+        )
+
+def step_progress(project):
+    """Estimate pipeline progress from the artifacts already stored on the project."""
+    completed = sum(1 for path in (project.image_path, project.voice_path, project.video_path, project.music_path) if path)
+    return 20 + completed * 70 // len(PIPELINE_STEPS)
+
 @celery.task(bind=True)
-def generate_video_task(self, user_id, project_id):
-    """Background task to generate a complete video."""
+def generate_video_task(self, user_id, project_id, use_stock=False):
+    """Background task to generate a complete video.
+
+    The pipeline runs as a Celery canvas: the idea step first, then image,
+    voice, video and music as parallel tasks, and finally a chord callback
+    that creates the final video. Every step reports its progress on this
+    task's ID, which the status endpoints keep polling. A failing step
+    raises, which stops the canvas before any later step reaches a
+    provider, and pipeline_failed_task stores the error under this task's ID.
+    """
     from app import app, db, User, Project
+    from celery import chain, chord, group
     
     with app.app_context():
         # Get user and project from database
@@ -33,52 +97,381 @@ def generate_video_task(self, user_id, project_id):
                 'message': 'User or project not found'
             }
         
+        project.status = 'processing'
+        db.session.commit()
+    
+    parent_task_id = self.request.id
+    
+    # Update task state to indicate progress
+    self.update_state(state='PROGRESS', meta={'status': 'processing', 'step': 'idea'})
+    
+    # The AI video needs the image as its start frame, stock footage only needs the idea
+    if use_stock:
+        video_step = pipeline_step_task.si(user_id, project_id, 'video', parent_task_id, use_stock)
+        image_step = pipeline_step_task.si(user_id, project_id, 'image', parent_task_id, use_stock)
+    else:
+        video_step = None
+        image_step = chain(
+            pipeline_step_task.si(user_id, project_id, 'image', parent_task_id, use_stock),
+            pipeline_step_task.si(user_id, project_id, 'video', parent_task_id, use_stock)
+        )
+    
+    parallel_steps = [
+        image_step,
+        pipeline_step_task.si(user_id, project_id, 'voice', parent_task_id, use_stock),
+        pipeline_step_task.si(user_id, project_id, 'music', parent_task_id, use_stock)
+    ]
+    if video_step is not None:
+        parallel_steps.append(video_step)
+    
+    workflow = chain(
+        pipeline_step_task.si(user_id, project_id, 'idea', parent_task_id, use_stock),
+        chord(group(parallel_steps), finalize_video_task.s(user_id, project_id, parent_task_id))
+    )
+    workflow.on_error(pipeline_failed_task.s(project_id, parent_task_id))
+    workflow.apply_async()
+    
+    # The chord callback stores the final result under this task's ID
+    raise Ignore()
+
+@celery.task(bind=True, max_retries=None)
+def pipeline_step_task(self, user_id, project_id, step, parent_task_id=None, use_stock=False):
+    """Run a single step of the video pipeline and store its artifact on the project.
+
+    Remote steps (Flux image, Kling video, SonAuto music) are only submitted
+    here; the task then replaces itself with collect_remote_step_task, which
+    finishes the step once the result is ready, so no worker waits on the
+    remote model.
+    """
+    from app import app, db, User, Project
+    
+    with app.app_context():
+        # Get user and project from database
+        user = User.query.get(user_id)
+        project = Project.query.get(project_id)
+        
+        if not user or not project:
+            raise LookupError('User or project not found')
+        
         # Initialize video generation service
         service = VideoGenerationService(user=user, project=project)
         
-        # Update task state to indicate progress
-        self.update_state(state='PROGRESS', meta={'status': 'processing', 'step': 'idea'})
-        
         try:
-            # Step 1: Generate idea
-            result = service.generate_idea()
-            idea, prompt = result["idea"], result["prompt"]
+            # Skip the step if a checkpoint from an earlier failed run is still valid
+            checkpoints = CheckpointStore(project).load()
+            inputs = pipeline_step_inputs(project, step, use_stock)
+            
+            if step == 'idea':
+                run = lambda deps: service.generate_idea()
+            elif step == 'image':
+                run = lambda deps: service.generate_image(deps['idea']['prompt'])
+            elif step == 'voice':
+                run = lambda deps: service.generate_voice_dialog(deps['idea']['idea'])
+            elif step == 'video':
+                if use_stock:
+                    run = lambda deps: service.generate_video_from_stock(deps['idea']['idea'])
+                else:
+                    run = lambda deps: service.generate_video(deps['image'], deps['idea']['prompt'])
+            elif step == 'music':
+                run = lambda deps: service.generate_music(deps['idea']['idea'])
+            else:
+                raise ValueError(f"Invalid step: {step}")
+            
+            if is_remote_step(step, use_stock):
+                # Hand the step to the provider; the collect task finishes it
+                step_result = submit_remote_step(
+                    self, service, project, step, inputs, checkpoints,
+                    parent_task_id=parent_task_id, use_stock=use_stock
+                )
+            else:
+                provider = step_provider(step, use_stock)
+                with reserve_provider(self, provider, service.remote_api_key(provider)):
+                    step_result = service.run_checkpointed(checkpoints, step, inputs, run)
+            
+            checkpoints.record(step, step_result)
+            
+            result = {'status': 'completed', 'step': step}
+            if step == 'idea':
+                result.update(step_result)
+            elif step == 'voice':
+                result['path'] = step_result['filename']
+                result['script'] = step_result['script']
+            else:
+                result['path'] = step_result
+            
             db.session.commit()
             
-            self.update_state(state='PROGRESS', meta={'status': 'processing', 'step': 'image', 'progress': 20})
+            progress = 20 if step == 'idea' else step_progress(project)
+            report_progress(parent_task_id, step, progress)
             
-            # Step 2: Generate image
-            image_path = service.generate_image(prompt)
-            db.session.commit()
+            return result
+        except (Ignore, Retry):
+            raise
+        except Exception:
+            db.session.rollback()
             
-            self.update_state(state='PROGRESS', meta={'status': 'processing', 'step': 'voice', 'progress': 40})
+            # Update project status
+            project.status = 'error'
+            db.session.commit()
             
-            # Step 3: Generate voice dialog
-            voice_data = service.generate_voice_dialog(idea)
+            # Stops the canvas; the steps after this one never start
+            raise
+
+def step_provider(step, use_stock=False):
+    """Provider whose rate limits govern a pipeline step."""
+    if step == 'video' and use_stock:
+        return 'pexels'
+    return REMOTE_STEP_PROVIDERS.get(step, 'openai')
+
+def reserve_provider(task, provider, api_key):
+    """Reserve a rate limiter slot for the provider calls of a task.
+
+    When every slot is taken the task is retried once one should be free,
+    instead of holding the worker while it waits.
+    """
+    try:
+        return rate_limiter.reserve(provider, api_key)
+    except RateLimitExceeded as e:
+        raise task.retry(countdown=max(1, math.ceil(e.wait)))
+
+def is_remote_step(step, use_stock=False):
+    """Whether a pipeline step is generated by a remote provider."""
+    return step in REMOTE_STEP_PROVIDERS and not (step == 'video' and use_stock)
+
+def submit_remote_step(task, service, project, step, deps, checkpoints=None, **collect_options):
+    """Start a remote step and hand the rest of task over to collect_remote_step_task.
+
+    The RemoteJob stores the provider's prediction ID, and the collect task is
+    scheduled for when the result should be ready. Returns the output
+    filename only when the step needed no remote call (valid checkpoint,
+    artifact cache hit or demo mode); otherwise the task is replaced.
+    """
+    from app import db
+    
+    provider = REMOTE_STEP_PROVIDERS[step]
+    with reserve_provider(task, provider, service.remote_api_key(provider)):
+        remote_job = create_remote_job(project, step)
+        webhook = webhook_url(remote_job) if webhooks_enabled() else None
+        run = lambda deps: service.submit_remote_step(step, deps, webhook=webhook)
+        
+        try:
+            if checkpoints is not None:
+                submission = service.run_checkpointed(checkpoints, step, deps, run)
+            else:
+                submission = run(deps)
+        except Exception as e:
+            db.session.rollback()
+            record_result(remote_job, FAILED, str(e))
             db.session.commit()
+            raise
+    
+    if isinstance(submission, dict) and submission.get('status') == 'submitted':
+        record_submission(remote_job, submission)
+        db.session.commit()
+        report_progress(collect_options.get('parent_task_id'), step, step_progress(project), status='waiting')
+        raise task.replace(
+            collect_remote_step_task.si(remote_job.id, project.user_id, project.id, **collect_options)
+            .set(countdown=remote_check_countdown(step, 0))
+        )
+    
+    # Finished without a remote call
+    db.session.delete(remote_job)
+    if isinstance(submission, dict):
+        return submission['filename']
+    return submission
+
+def remote_check_countdown(step, checks):
+    """Seconds until the next check of a remote job that has been checked `checks` times."""
+    if checks == 0:
+        return int(REMOTE_STEP_DURATIONS.get(step, REMOTE_CHECK_INTERVAL) * 0.8)
+    if webhooks_enabled():
+        # Checks only read the database, the webhook brings the result
+        return REMOTE_CHECK_INTERVAL
+    return int(min(REMOTE_MAX_CHECK_INTERVAL, REMOTE_CHECK_INTERVAL * 1.5 ** (checks - 1)))
+
+@celery.task(bind=True, max_retries=None)
+def collect_remote_step_task(self, remote_job_id, user_id, project_id, parent_task_id=None, use_stock=False, standalone=False):
+    """Finish a remote step once its result is ready.
+
+    With webhooks the task only reads the RemoteJob row until the callback
+    has marked it done; without them (or when a callback is overdue) it asks
+    the provider for the status with backing-off intervals. Either way it
+    reschedules itself between checks instead of blocking a worker, so
+    worker concurrency only bounds the downloads and ffmpeg work.
+    
+    standalone marks jobs started by the single-step tasks, which report
+    their result in their own format instead of as pipeline progress.
+    """
+    from app import app, db, User, Project, RemoteJob
+    
+    with app.app_context():
+        job = RemoteJob.query.get(remote_job_id)
+        user = User.query.get(user_id)
+        project = Project.query.get(project_id)
+        
+        if not job or not user or not project:
+            if standalone:
+                return {
+                    'status': 'error',
+                    'message': 'Remote job, user or project not found'
+                }
+            raise LookupError('Remote job, user or project not found')
+        
+        step = job.step
+        service = VideoGenerationService(user=user, project=project)
+        
+        if job.status in ('pending', 'submitted'):
+            elapsed = (datetime.utcnow() - job.created_at).total_seconds()
+            webhook_overdue = elapsed > 2 * REMOTE_STEP_DURATIONS.get(step, 60)
+            
+            if not webhooks_enabled() or webhook_overdue:
+                try:
+                    record_result(job, *fetch_result(job, service.remote_api_key(job.provider)))
+                    db.session.commit()
+                except Exception as e:
+                    # Transient errors are retried on the next check
+                    db.session.rollback()
+                    print(f"Error checking {job.provider} job {job.external_id}: {str(e)}")
+            
+            if job.status in ('pending', 'submitted'):
+                deadline = PROVIDER_DEADLINES.get(job.provider, 900)
+                if elapsed < deadline:
+                    raise self.retry(countdown=remote_check_countdown(step, self.request.retries + 1))
+                record_result(job, FAILED, f"No result after {deadline:.0f} seconds")
+                db.session.commit()
+        
+        try:
+            if job.status == 'completed' and not job.output_url:
+                # Some callbacks only report the status, ask the provider for the output
+                record_result(job, *fetch_result(job, service.remote_api_key(job.provider)))
+            
+            if job.status != 'completed':
+                raise Exception(f"{job.provider} generation {job.external_id} failed: {job.error}")
             
-            self.update_state(state='PROGRESS', meta={'status': 'processing', 'step': 'video', 'progress': 60})
+            filename = service.collect_remote_output(step, job.output_url, job.cache_key)
             
-            # Step 4: Generate video
-            video_path = service.generate_video(image_path, prompt)
+            if standalone:
+                project.status = 'draft'
+                db.session.commit()
+                return {
+                    'status': 'completed',
+                    'message': f'{step.capitalize()} generation completed successfully',
+                    f'{step}_path': filename
+                }
+            
+            CheckpointStore(project).record(step, filename, pipeline_step_inputs(project, step, use_stock))
             db.session.commit()
             
-            self.update_state(state='PROGRESS', meta={'status': 'processing', 'step': 'music', 'progress': 80})
+            report_progress(parent_task_id, step, step_progress(project))
+            
+            return {'status': 'completed', 'step': step, 'path': filename}
+        except Exception as e:
+            db.session.rollback()
             
-            # Step 5: Generate music
-            music_path = service.generate_music(idea)
+            # Update project status
+            project.status = 'error'
             db.session.commit()
             
-            self.update_state(state='PROGRESS', meta={'status': 'processing', 'step': 'final', 'progress': 90})
+            if not standalone:
+                # Stops the canvas like a failing pipeline_step_task
+                raise
+            
+            return {
+                'status': 'error',
+                'step': step,
+                'message': str(e)
+            }
+
+def pipeline_step_inputs(project, step, use_stock=False):
+    """Build a step's inputs from the project, in the same shape generate_complete_video uses.
+
+    Raises ValueError when an upstream artifact is missing, so a step never
+    sends a prompt of None or a start frame of "static/None" to a provider.
+    """
+    if step == 'idea':
+        return {}
+    if not project.idea or not project.prompt:
+        raise ValueError(f"The {step} step needs the project's idea, generate it first")
+    inputs = {'idea': {'idea': project.idea, 'prompt': project.prompt}}
+    if step == 'video' and not use_stock:
+        if not project.image_path:
+            raise ValueError("The video step needs the project's image, generate it first")
+        inputs['image'] = f"static/{project.image_path}"
+    return inputs
+
+def fail_parent_task(parent_task_id, message):
+    """Store an error result under the parent pipeline task's ID."""
+    if parent_task_id:
+        generate_video_task.backend.store_result(
+            parent_task_id,
+            {'status': 'error', 'message': message},
+            'SUCCESS'
+        )
+
+@celery.task
+def pipeline_failed_task(request, exc, traceback, project_id, parent_task_id=None):
+    """Error callback of the pipeline canvas: marks the project failed and reports the error on the parent task."""
+    from app import app, db, Project
+    
+    with app.app_context():
+        project = Project.query.get(project_id)
+        if project and project.status != 'error':
+            project.status = 'error'
+            db.session.commit()
+    
+    fail_parent_task(parent_task_id, str(exc))
+
+@celery.task
+def finalize_video_task(step_results, user_id, project_id, parent_task_id=None):
+    """Chord callback that composes the final video once all parallel steps are done."""
+    from app import app, db, User, Project
+    
+    with app.app_context():
+        # Get user and project from database
+        user = User.query.get(user_id)
+        project = Project.query.get(project_id)
+        
+        if not user or not project:
+            result = {
+                'status': 'error',
+                'message': 'User or project not found'
+            }
+            fail_parent_task(parent_task_id, result['message'])
+            return result
+        
+        report_progress(parent_task_id, 'final', 90)
+        
+        # Initialize video generation service
+        service = VideoGenerationService(user=user, project=project)
+        
+        try:
+            script = next((r.get('script', '') for r in step_results if r.get('step') == 'voice'), '')
+            voice_data = {
+                'filename': f"static/{project.voice_path}",
+                'script': script
+            }
             
             # Step 6: Create final video with music and voice
-            final_video = service.create_final_video(video_path, music_path, idea, voice_data)
+            final_video = service.create_final_video(
+                f"static/{project.video_path}",
+                f"static/{project.music_path}",
+                project.idea,
+                voice_data
+            )
             
-            # Update project status
+            # Keep the final video's metadata and the loudness measured for the mix
+            asset_registry.register(project, 'final', final_video)
+            
+            # Stream the final video from HLS renditions; the MP4 stays as the download
+            report_progress(parent_task_id, 'package', 95)
+            service.package_final_video(final_video)
+            
+            # Update project status; the next generation starts from scratch
             project.status = 'completed'
+            CheckpointStore(project).clear()
             db.session.commit()
             
-            return {
+            result = {
                 'status': 'completed',
                 'message': 'Video generation completed successfully',
                 'final_video': final_video
@@ -88,10 +481,15 @@ def generate_video_task(self, user_id, project_id):
             project.status = 'error'
             db.session.commit()
             
-            return {
+            result = {
                 'status': 'error',
                 'message': str(e)
             }
+        
+        if parent_task_id:
+            generate_video_task.backend.store_result(parent_task_id, result, 'SUCCESS')
+        
+        return result
 
 @celery.task
 def generate_idea_task(user_id, project_id):
@@ -137,7 +535,48 @@ def generate_idea_task(user_id, project_id):
             }
 
 @celery.task
-def generate_image_task(user_id, project_id):
+def refill_idea_pool_task():
+    """Background task to top the idea pool back up with one batched idea call."""
+    from app import app, db
+    
+    with app.app_context():
+        # Pooled ideas are generated with the platform's own API key
+        service = VideoGenerationService()
+        if not service.has_openai_key():
+            return {
+                'status': 'skipped',
+                'message': 'No OpenAI API key configured'
+            }
+        
+        version = prompt_version(service.read_file('prompts/idea_gen.txt'))
+        count = idea_pool.refill_size(version)
+        if not count:
+            return {
+                'status': 'skipped',
+                'message': 'Idea pool is full'
+            }
+        
+        try:
+            # Don't pool ideas that repeat one we already made
+            ideas = [entry for entry in service.generate_ideas_batch(count) if not idea_history.is_duplicate(entry['idea'])]
+            added = idea_pool.add(ideas, version)
+            db.session.commit()
+            
+            return {
+                'status': 'completed',
+                'message': f'Added {added} ideas to the idea pool',
+                'available': idea_pool.available(version)
+            }
+        except Exception as e:
+            db.session.rollback()
+            
+            return {
+                'status': 'error',
+                'message': str(e)
+            }
+
+@celery.task(bind=True, max_retries=None)
+def generate_image_task(self, user_id, project_id):
     """Background task to generate an image."""
     from app import app, db, User, Project
     
@@ -156,8 +595,8 @@ def generate_image_task(user_id, project_id):
         service = VideoGenerationService(user=user, project=project)
         
         try:
-            # Generate image
-            image_path = service.generate_image(project.prompt)
+            # Generate image; the task is handed to collect_remote_step_task while the provider works
+            image_path = submit_remote_step(self, service, project, 'image', pipeline_step_inputs(project, 'image'), standalone=True)
             
             # Update project status
             project.status = 'draft'
@@ -168,6 +607,8 @@ def generate_image_task(user_id, project_id):
                 'message': 'Image generation completed successfully',
                 'image_path': image_path
             }
+        except (Ignore, Retry):
+            raise
         except Exception as e:
             # Update project status
             project.status = 'error'
@@ -178,8 +619,8 @@ def generate_image_task(user_id, project_id):
                 'message': str(e)
             }
 
-@celery.task
-def generate_video_from_image_task(user_id, project_id):
+@celery.task(bind=True, max_retries=None)
+def generate_video_from_image_task(self, user_id, project_id):
     """Background task to generate a video from an image."""
     from app import app, db, User, Project
     
@@ -198,8 +639,8 @@ def generate_video_from_image_task(user_id, project_id):
         service = VideoGenerationService(user=user, project=project)
         
         try:
-            # Generate video
-            video_path = service.generate_video(f"static/{project.image_path}", project.prompt)
+            # Generate video; the task is handed to collect_remote_step_task while the provider works
+            video_path = submit_remote_step(self, service, project, 'video', pipeline_step_inputs(project, 'video'), standalone=True)
             
             # Update project status
             project.status = 'draft'
@@ -210,6 +651,8 @@ def generate_video_from_image_task(user_id, project_id):
                 'message': 'Video generation completed successfully',
                 'video_path': video_path
             }
+        except (Ignore, Retry):
+            raise
         except Exception as e:
             # Update project status
             project.status = 'error'
@@ -220,8 +663,8 @@ def generate_video_from_image_task(user_id, project_id):
                 'message': str(e)
             }
 
-@celery.task
-def generate_music_task(user_id, project_id):
+@celery.task(bind=True, max_retries=None)
+def generate_music_task(self, user_id, project_id):
     """Background task to generate music."""
     from app import app, db, User, Project
     
@@ -240,8 +683,8 @@ def generate_music_task(user_id, project_id):
         service = VideoGenerationService(user=user, project=project)
         
         try:
-            # Generate music
-            music_path = service.generate_music(project.idea)
+            # Generate music; the task is handed to collect_remote_step_task while the provider works
+            music_path = submit_remote_step(self, service, project, 'music', pipeline_step_inputs(project, 'music'), standalone=True)
             
             # Update project status
             project.status = 'draft'
@@ -252,6 +695,8 @@ def generate_music_task(user_id, project_id):
                 'message': 'Music generation completed successfully',
                 'music_path': music_path
             }
+        except (Ignore, Retry):
+            raise
         except Exception as e:
             # Update project status
             project.status = 'error'
@@ -337,6 +782,7 @@ def create_final_video_task(user_id, project_id):
                 project.idea,
                 voice_data
             )
+            service.package_final_video(final_video)
             
             # Update project status
             project.status = 'completed'
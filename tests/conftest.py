@@ -0,0 +1,65 @@
+import os
+import tempfile
+import pytest
+from services.provider_stub import ProviderStub
+
+# The app creates its tables when it is imported; tests get a database and caches of their own
+TEST_ROOT = tempfile.mkdtemp(prefix="aivideo-tests-")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(TEST_ROOT, 'test.db')}"
+os.environ["ARTIFACT_CACHE_DIR"] = os.path.join(TEST_ROOT, "artifacts")
+os.environ["IDEA_HISTORY_DB"] = os.path.join(TEST_ROOT, "idea_history.db")
+os.environ["DEMO_ASSETS_DIR"] = os.path.join(TEST_ROOT, "demo_assets")
+
+
+@pytest.fixture
+def stub(monkeypatch):
+    """The local provider stand-in, with every provider base URL pointed at it.
+
+    Generations complete on their first status check; raise stub.delay
+    for ones that should still be running.
+    """
+    with ProviderStub(delay=0) as stub:
+        for key, value in stub.env().items():
+            monkeypatch.setenv(key, value)
+        yield stub
+
+
+@pytest.fixture
+def app():
+    """The Flask app on empty tables, inside an app context."""
+    from app import app, db
+
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        yield app
+        db.session.remove()
+
+
+@pytest.fixture
+def project(app, monkeypatch):
+    """A user with keys for every provider and an empty project of theirs."""
+    from app import db, User, Project
+
+    # The service exports the Replicate key to the environment
+    monkeypatch.setenv("REPLICATE_API_TOKEN", "")
+    user = User(email="maker@example.com", password_hash="-", openai_api_key="sk-test",
+                replicate_api_key="r8-test", sonauto_api_key="sa-test")
+    db.session.add(user)
+    db.session.commit()
+    project = Project(title="Lighthouse", user_id=user.id)
+    db.session.add(project)
+    db.session.commit()
+    return project
+
+
+@pytest.fixture
+def eager_celery():
+    """Run Celery tasks and canvases in the calling process, results in memory."""
+    from tasks import celery
+
+    options = {"task_always_eager": True, "result_backend": "cache+memory://"}
+    previous = {key: celery.conf[key] for key in options}
+    celery.conf.update(options)
+    yield celery
+    celery.conf.update(previous)
@@ -0,0 +1,65 @@
+import os
+from services import video_generation
+from services.artifact_cache import ArtifactCache
+from services.video_generation import VideoGenerationService
+
+IDEA = {"idea": "A lighthouse keeper finds a city under the waves", "prompt": "Drowned city lit by a lighthouse, seen from above"}
+
+
+def write(path, size):
+    path.write_bytes(b"\0" * size)
+    return str(path)
+
+
+def test_equivalent_inputs_share_a_key(tmp_path):
+    cache = ArtifactCache(cache_dir=str(tmp_path))
+    key = cache.make_key("image", "flux", {"prompt": "A  castle\n at dusk", "seed": 1}, {"steps": 30, "cfg": 3})
+
+    assert cache.make_key("image", "flux", {"seed": 1, "prompt": " A castle at dusk "}, {"cfg": 3, "steps": 30}) == key
+    assert cache.make_key("image", "flux", {"prompt": "A castle at dawn", "seed": 1}, {"steps": 30, "cfg": 3}) != key
+    assert cache.make_key("image", "flux-dev", {"prompt": "A castle at dusk", "seed": 1}, {"steps": 30, "cfg": 3}) != key
+
+
+def test_hit_makes_no_provider_call(stub, project, tmp_path, monkeypatch):
+    monkeypatch.setitem(video_generation.OUTPUT_FILES, "image", str(tmp_path / "flux_{}.png"))
+    service = VideoGenerationService(user=project.user, project=project)
+
+    submission = service.submit_remote_step("image", {"idea": IDEA})
+    service.collect_remote_output("image", stub.jobs[submission["id"]]["output"], submission["cache_key"])
+    requests = list(stub.requests)
+
+    again = service.submit_remote_step("image", {"idea": IDEA})
+
+    assert again["status"] == "completed" and os.path.exists(again["filename"])
+    assert stub.requests == requests
+    assert service.artifact_cache.stats()["steps"]["image"] == {"hits": 1, "misses": 1}
+
+
+def test_least_recently_used_entries_are_evicted_first(tmp_path):
+    cache = ArtifactCache(cache_dir=str(tmp_path / "cache"), max_bytes=150)
+    for name in ("a", "b"):
+        source = write(tmp_path / f"{name}.mp4", 100)
+        cache.put(name, "video", source)
+        # The project output is gone, the cache alone holds the file
+        os.remove(source)
+    assert cache.get("a", "video", str(tmp_path / "a_again.mp4"))
+    os.remove(tmp_path / "a_again.mp4")
+
+    source = write(tmp_path / "c.mp4", 100)
+    cache.put("c", "video", source)
+    os.remove(source)
+
+    assert cache.get("b", "video", str(tmp_path / "b_again.mp4")) is None
+    assert cache.get("a", "video", str(tmp_path / "a_again.mp4"))
+    # a is linked from a_again.mp4 again, only c is held by the cache alone
+    assert cache.stats()["held_bytes"] == 100
+
+
+def test_files_still_linked_from_projects_are_not_counted(tmp_path):
+    cache = ArtifactCache(cache_dir=str(tmp_path / "cache"), max_bytes=150)
+    outputs = [write(tmp_path / f"{name}.mp4", 100) for name in ("a", "b", "c")]
+    for name, output in zip("abc", outputs):
+        cache.put(name, "video", output)
+
+    stats = cache.stats()
+    assert (stats["entries"], stats["bytes"], stats["held_bytes"]) == (3, 300, 0)
@@ -0,0 +1,141 @@
+import asyncio
+import pytest
+from services import async_clients
+from services.async_clients import (
+    AsyncClientPool, AsyncOpenAIClient, AsyncReplicateClient, AsyncSonautoClient, AsyncPexelsClient,
+    ProviderError, download,
+)
+from services.pexels_service import PexelsService
+from services.provider_stub import STUB_IDEA, STUB_FILE_SIZE
+
+FLUX = "black-forest-labs/flux-pro"
+KLING = "kwaivgi/kling-v1.6-standard"
+
+
+def test_openai_chat_and_speech(stub, tmp_path):
+    pool = AsyncClientPool()
+    client = AsyncOpenAIClient("sk-test", pool)
+    output = tmp_path / "voice.mp3"
+
+    async def main():
+        reply = await client.chat("gpt-4o", [{"role": "user", "content": "an idea"}])
+        await client.speech(str(output), "gpt-4o-mini-tts", "onyx", "Hello there")
+        return reply
+
+    assert async_clients.run(main(), pool) == STUB_IDEA.strip()
+    assert output.stat().st_size == STUB_FILE_SIZE
+
+
+def test_replicate_run_returns_the_output(stub):
+    pool = AsyncClientPool()
+
+    output = async_clients.run(AsyncReplicateClient("r8-test", pool).run(FLUX, {"prompt": "a castle"}), pool)
+
+    assert output.startswith(f"{stub.base_url}/files/") and output.endswith(".png")
+
+
+def test_replicate_failed_prediction_raises(stub):
+    stub.failures.add(KLING)
+    pool = AsyncClientPool()
+
+    with pytest.raises(ProviderError, match="Stub failure"):
+        async_clients.run(AsyncReplicateClient("r8-test", pool).run(KLING, {}), pool)
+
+
+def test_replicate_prediction_is_cancelled_at_the_deadline(stub):
+    stub.delay = 60
+    pool = AsyncClientPool()
+
+    with pytest.raises(asyncio.TimeoutError):
+        async_clients.run(AsyncReplicateClient("r8-test", pool).run(KLING, {}, deadline=0.3), pool)
+
+    (job,) = stub.jobs.values()
+    assert job["canceled"]
+    assert stub.requests[-1] == ("POST", f"/replicate/v1/predictions/{job['id']}/cancel")
+
+
+def test_replicate_prediction_is_cancelled_with_its_task(stub):
+    stub.delay = 60
+    pool = AsyncClientPool()
+
+    async def main():
+        task = asyncio.ensure_future(AsyncReplicateClient("r8-test", pool).run(KLING, {}))
+        while not stub.jobs:
+            await asyncio.sleep(0.01)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        # The cancel request is shielded and finishes after the task
+        (job,) = stub.jobs.values()
+        while not job["canceled"]:
+            await asyncio.sleep(0.01)
+
+    async_clients.run(main(), pool)
+
+
+def test_sonauto_generate_returns_the_song(stub):
+    pool = AsyncClientPool()
+
+    song = async_clients.run(AsyncSonautoClient("sa-test", pool).generate({"prompt": "dark folk"}), pool)
+
+    assert song.endswith(".mp3")
+    assert [method for method, path in stub.requests] == ["POST", "GET"]
+
+
+def test_sonauto_failed_generation_raises(stub):
+    stub.failures.add("sonauto")
+    pool = AsyncClientPool()
+
+    with pytest.raises(ProviderError):
+        async_clients.run(AsyncSonautoClient("sa-test", pool).generate({"prompt": "dark folk"}), pool)
+
+
+def test_pexels_search(stub):
+    pool = AsyncClientPool()
+
+    videos = async_clients.run(AsyncPexelsClient("px-test", pool).search_videos({"query": "forest"}), pool)
+
+    assert videos[0]["video_files"][0]["link"] == f"{stub.base_url}/files/stock_0.mp4"
+
+
+def test_blocking_pexels_search_uses_the_base_url_override(stub):
+    videos = PexelsService().search_stock_videos("forest", per_page=1)
+
+    assert videos[0]["url"] == f"{stub.base_url}/files/stock_0.mp4"
+    assert stub.requests == [("GET", "/pexels/videos/search")]
+
+
+def test_download_streams_into_the_file(stub, tmp_path):
+    pool = AsyncClientPool()
+    output = tmp_path / "clips" / "clip.mp4"
+
+    async_clients.run(download(f"{stub.base_url}/files/clip.mp4", str(output), pool), pool)
+
+    assert output.stat().st_size == STUB_FILE_SIZE
+
+
+def test_run_closes_the_clients_of_its_loop(stub):
+    pool = AsyncClientPool()
+
+    async def main():
+        clients = [pool.get("openai"), pool.get("pexels"), pool.get("openai")]
+        assert pool.open_clients() == 2
+        return clients
+
+    clients = async_clients.run(main(), pool)
+
+    assert clients[0] is clients[2]
+    assert all(client.is_closed for client in clients)
+
+
+def test_clients_are_not_shared_between_loops(stub):
+    pool = AsyncClientPool()
+
+    async def client():
+        return pool.get("openai")
+
+    first = async_clients.run(client(), pool)
+    second = async_clients.run(client(), pool)
+
+    assert first is not second
+    assert first.is_closed and second.is_closed
@@ -0,0 +1,71 @@
+import pytest
+from services import checkpoints
+from services.checkpoints import CheckpointStore
+
+INPUTS = {"prompt": "A lighthouse at dusk"}
+
+
+@pytest.fixture
+def image(project, monkeypatch, tmp_path):
+    """A checkpointed image step of the project, reloaded from the database."""
+    from app import db
+
+    # The outputs are not media files, there is nothing for the asset registry to probe
+    monkeypatch.setattr(checkpoints.asset_registry, "register", lambda *args: None)
+    monkeypatch.chdir(tmp_path)
+    path = tmp_path / "static" / "image" / "flux_image_1.png"
+    path.parent.mkdir(parents=True)
+    path.write_bytes(b"image")
+
+    store = CheckpointStore(project)
+    assert store.lookup("image", INPUTS) is None
+    store.record("image", "static/image/flux_image_1.png")
+    db.session.commit()
+    return path
+
+
+def test_unchanged_step_is_restored(project, image):
+    store = CheckpointStore(project).load()
+
+    result = store.lookup("image", INPUTS)
+    assert result == "static/image/flux_image_1.png"
+
+    project.image_path = None
+    store.restore("image", result)
+    assert project.image_path == "image/flux_image_1.png"
+
+
+def test_changed_inputs_rerun_the_step(project, image):
+    store = CheckpointStore(project).load()
+
+    assert store.lookup("image", {"prompt": "A lighthouse at dawn"}) is None
+
+
+def test_changed_output_file_reruns_the_step(project, image):
+    image.write_bytes(b"edited image")
+    store = CheckpointStore(project).load()
+
+    assert store.lookup("image", INPUTS) is None
+
+
+def test_missing_output_file_reruns_the_step(project, image):
+    image.unlink()
+    store = CheckpointStore(project).load()
+
+    assert store.lookup("image", INPUTS) is None
+
+
+def test_edited_idea_wins_over_its_checkpoint(project):
+    from app import db
+
+    idea = {"idea": "A lighthouse", "prompt": "A lighthouse at dusk"}
+    store = CheckpointStore(project)
+    store.lookup("idea", {})
+    store.record("idea", idea)
+    store.restore("idea", idea)
+    db.session.commit()
+
+    assert CheckpointStore(project).load().lookup("idea", {}) == idea
+
+    project.prompt = "A lighthouse in a storm"
+    assert CheckpointStore(project).load().lookup("idea", {}) is None
@@ -0,0 +1,18 @@
+from services.encoding import encoding_profile, oriented, fit_filter
+
+
+def test_portrait_sources_get_the_upright_frame():
+    profile = encoding_profile("1080p")
+
+    portrait = oriented(profile, 768, 1344)
+
+    assert (portrait["width"], portrait["height"]) == (1080, 1920)
+    assert fit_filter(portrait).startswith("scale=1080:1920:")
+    assert profile["width"] == 1920
+
+
+def test_landscape_and_unknown_sources_keep_the_profile():
+    profile = encoding_profile("720p")
+
+    assert oriented(profile, 1920, 1080) is profile
+    assert oriented(profile, None, None) is profile
@@ -0,0 +1,91 @@
+import asyncio
+import threading
+from services import idea_pool as idea_pool_module
+from services.idea_pool import idea_pool, prompt_version
+from services.provider_stub import STUB_IDEA
+from services.video_generation import VideoGenerationService
+
+VERSION = "test-version"
+
+
+def fill(count):
+    from app import db
+
+    idea_pool.add([{"idea": f"Idea {number}", "prompt": f"Prompt {number}"} for number in range(count)], VERSION)
+    db.session.commit()
+
+
+def test_concurrent_claimers_never_share_an_idea(app):
+    fill(5)
+    claims, lock = [], threading.Lock()
+
+    def claim():
+        with app.app_context():
+            idea = idea_pool.claim(VERSION)
+        with lock:
+            claims.append(idea)
+
+    threads = [threading.Thread(target=claim) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    claimed = [idea["idea"] for idea in claims if idea]
+    assert sorted(claimed) == [f"Idea {number}" for number in range(5)]
+    assert claims.count(None) == 3
+    assert idea_pool.available(VERSION) == 0
+
+
+def test_claim_does_not_commit_the_callers_changes(project):
+    from app import db, Project, PooledIdea
+
+    fill(1)
+    project.title = "Unsaved title"
+
+    assert idea_pool.claim(VERSION, project) == {"idea": "Idea 0", "prompt": "Prompt 0"}
+
+    db.session.rollback()
+    assert Project.query.get(project.id).title == "Lighthouse"
+    assert PooledIdea.query.one().project_id == project.id
+
+
+def test_empty_pool_falls_back_to_the_chat_call(stub, project, monkeypatch):
+    refills = []
+    monkeypatch.setattr(idea_pool_module.idea_pool, "request_refill", refills.append)
+    service = VideoGenerationService(user=project.user, project=project)
+
+    result = service.generate_idea()
+
+    assert result["idea"] in STUB_IDEA
+    assert ("POST", "/openai/v1/chat/completions") in stub.requests
+    # The pool of the current prompt was asked for a refill
+    assert len(refills) == 1
+
+
+def test_async_idea_keeps_its_database_calls_off_the_event_loop(stub, project, monkeypatch):
+    from app import db
+
+    monkeypatch.setattr(idea_pool_module.idea_pool, "request_refill", lambda version: None)
+    service = VideoGenerationService(user=project.user, project=project)
+    version = prompt_version(service.read_file("prompts/idea_gen.txt"))
+    idea_pool.add([{"idea": "Pooled idea", "prompt": "Pooled prompt"}], version)
+    db.session.commit()
+
+    threads = {}
+    for name in ("claim_pooled_idea", "is_repeated_idea", "remember_idea"):
+        def record(*args, _name=name, _call=getattr(service, name)):
+            threads[_name] = threading.get_ident()
+            return _call(*args)
+        monkeypatch.setattr(service, name, record)
+
+    async def generate():
+        return threading.get_ident(), await service.agenerate_idea()
+
+    loop_thread, result = asyncio.run(generate())
+
+    assert result == {"idea": "Pooled idea", "prompt": "Pooled prompt"}
+    assert project.idea == "Pooled idea"
+    assert ("POST", "/openai/v1/chat/completions") not in stub.requests
+    assert set(threads) == {"claim_pooled_idea", "is_repeated_idea", "remember_idea"}
+    assert loop_thread not in threads.values()
@@ -0,0 +1,15 @@
+from services.encoding import encoding_profile
+from services.packaging import ladder, package_command
+
+
+def test_portrait_video_gets_the_full_ladder():
+    assert ladder(encoding_profile("1080p"), {"width": 1080, "height": 1920}) == ["720p", "1080p"]
+    assert ladder(encoding_profile("4K"), {"width": 720, "height": 1280}) == ["720p"]
+
+
+def test_renditions_keep_the_aspect_ratio():
+    landscape = " ".join(package_command("final.mp4", "out", ["720p", "1080p"]))
+    portrait = " ".join(package_command("final.mp4", "out", ["720p", "1080p"], portrait=True))
+
+    assert "[v0]scale=-2:720,setsar=1" in landscape and "[v1]scale=-2:1080,setsar=1" in landscape
+    assert "[v0]scale=720:-2,setsar=1" in portrait and "[v1]scale=1080:-2,setsar=1" in portrait
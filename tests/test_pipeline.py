@@ -0,0 +1,70 @@
+import asyncio
+import pytest
+from services.pipeline import PipelineExecutor
+
+
+def sleep_step(seconds, result):
+    async def step(deps):
+        await asyncio.sleep(seconds)
+        return result(deps) if callable(result) else result
+    return step
+
+
+def test_arun_starts_steps_once_their_dependencies_finish():
+    completed = []
+    executor = PipelineExecutor(on_step_complete=lambda name, result: completed.append(name))
+    executor.add_step("idea", sleep_step(0.01, "idea"))
+    executor.add_step("image", sleep_step(0.05, lambda deps: f"image of {deps['idea']}"), depends_on=["idea"])
+    executor.add_step("music", sleep_step(0.1, "music"), depends_on=["idea"])
+    executor.add_step("final", sleep_step(0.01, lambda deps: sorted(deps)), depends_on=["image", "music"])
+
+    results = asyncio.run(executor.arun())
+
+    assert results["image"] == "image of idea"
+    assert results["final"] == ["image", "music"]
+    assert completed == ["idea", "image", "music", "final"]
+    assert executor.timings["critical_path"] == ["idea", "music", "final"]
+    # image and music overlap
+    assert executor.timings["wall_time"] < executor.timings["serial_time"]
+
+
+def test_arun_stops_at_the_first_failure():
+    async def fail(deps):
+        raise ValueError("provider down")
+
+    executor = PipelineExecutor()
+    executor.add_step("idea", sleep_step(0, "idea"))
+    executor.add_step("image", fail, depends_on=["idea"])
+    executor.add_step("music", sleep_step(0.05, "music"), depends_on=["idea"])
+    executor.add_step("final", sleep_step(0, "final"), depends_on=["image", "music"])
+
+    with pytest.raises(ValueError, match="provider down"):
+        asyncio.run(executor.arun())
+
+    # The running step finishes, the step waiting on the failed one never starts
+    assert set(executor.timings["steps"]) == {"idea", "music"}
+
+
+def test_cancelling_arun_cancels_the_running_steps():
+    cancelled = []
+
+    async def slow(deps):
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.append("video")
+            raise
+
+    executor = PipelineExecutor()
+    executor.add_step("video", slow)
+
+    async def main():
+        task = asyncio.ensure_future(executor.arun())
+        await asyncio.sleep(0.05)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(main())
+
+    assert cancelled == ["video"]
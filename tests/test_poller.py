@@ -0,0 +1,45 @@
+import pytest
+import requests
+from services.poller import GenerationPoller, check_replicate, cancel_replicate, check_sonauto
+
+KLING = "kwaivgi/kling-v1.6-standard"
+
+
+def create_prediction(stub):
+    response = requests.post(f"{stub.base_url}/replicate/v1/models/{KLING}/predictions", json={"input": {}}, timeout=5)
+    return response.json()["id"]
+
+
+def test_completed_prediction_resolves_with_its_output(stub):
+    poller = GenerationPoller(min_interval=0.05)
+    poller.register_provider("replicate", check=check_replicate, cancel=cancel_replicate)
+    prediction_id = create_prediction(stub)
+
+    output = poller.wait("replicate", prediction_id, {"api_key": "r8-test"}, timeout=5)
+
+    assert output == stub.jobs[prediction_id]["output"]
+
+
+def test_prediction_is_cancelled_when_it_times_out(stub):
+    stub.delay = 60
+    poller = GenerationPoller(min_interval=0.05)
+    poller.register_provider("replicate", check=check_replicate, cancel=cancel_replicate)
+    prediction_id = create_prediction(stub)
+
+    with pytest.raises(TimeoutError):
+        poller.wait("replicate", prediction_id, {"api_key": "r8-test"}, timeout=0.2)
+
+    assert stub.jobs[prediction_id]["canceled"]
+    assert ("POST", f"/replicate/v1/predictions/{prediction_id}/cancel") in stub.requests
+
+
+def test_providers_without_cancel_just_time_out(stub):
+    stub.delay = 60
+    poller = GenerationPoller(min_interval=0.05)
+    poller.register_provider("sonauto", check=check_sonauto)
+    generation_id = requests.post(f"{stub.base_url}/sonauto/v1/generations", json={}, timeout=5).json()["id"]
+
+    with pytest.raises(TimeoutError):
+        poller.wait("sonauto", generation_id, {"api_key": "sa-test"}, timeout=0.2)
+
+    assert not stub.jobs[generation_id]["canceled"]
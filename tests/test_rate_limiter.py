@@ -0,0 +1,162 @@
+import time
+import asyncio
+import threading
+import pytest
+from services import rate_limiter as rate_limiter_module
+from services.rate_limiter import RateLimiter, InMemoryBackend, RateLimitExceeded
+
+
+class Clock:
+    """Stands in for time.time so refills can be checked without sleeping."""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def limiter(monkeypatch):
+    """A limiter on the in-memory backend; RATE_LIMIT_TESTAPI sets its limits per test."""
+    def limits(value):
+        monkeypatch.setenv("RATE_LIMIT_TESTAPI", value)
+
+    limiter = RateLimiter(InMemoryBackend())
+    limiter.set_limits = limits
+    return limiter
+
+
+def test_bucket_allows_a_burst_then_refills_at_the_rate(limiter, monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(time, "time", clock)
+    limiter.set_limits("2,3,0")
+
+    assert all(limiter.try_acquire("testapi")[0] for _ in range(3))
+    lease, wait = limiter.try_acquire("testapi")
+    assert lease is None and wait == pytest.approx(0.5)
+
+    clock.now += 0.5
+    assert limiter.try_acquire("testapi")[0]
+    assert limiter.try_acquire("testapi")[0] is None
+
+    # A long pause refills the bucket up to the burst, never beyond
+    clock.now += 60
+    assert sum(1 for _ in range(5) if limiter.try_acquire("testapi")[0]) == 3
+
+
+def test_limits_are_kept_per_api_key(limiter):
+    limiter.set_limits("1,1,0")
+
+    assert limiter.try_acquire("testapi", "key-a")[0]
+    assert limiter.try_acquire("testapi", "key-b")[0]
+    assert limiter.try_acquire("testapi", "key-a")[0] is None
+
+
+def test_in_flight_calls_never_exceed_the_cap(limiter):
+    limiter.set_limits("1000,1000,2")
+    running, peak, lock = [0], [0], threading.Lock()
+
+    def call():
+        with limiter.limit("testapi", timeout=10):
+            with lock:
+                running[0] += 1
+                peak[0] = max(peak[0], running[0])
+            time.sleep(0.05)
+            with lock:
+                running[0] -= 1
+
+    threads = [threading.Thread(target=call) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert peak[0] == 2
+    assert limiter.in_flight("testapi") == 0
+    assert limiter.metrics()["testapi"]["acquired"] == 8
+
+
+def test_reserved_slot_is_released_when_the_step_raises(limiter):
+    limiter.set_limits("1000,1000,1")
+
+    with pytest.raises(ValueError):
+        with limiter.reserve("testapi"):
+            # Calls inside the reservation take a token but no second slot
+            with limiter.limit("testapi", timeout=0):
+                assert limiter.in_flight("testapi") == 1
+            raise ValueError("provider error")
+
+    assert limiter.in_flight("testapi") == 0
+
+
+def test_reserve_does_not_wait_for_a_slot(limiter):
+    limiter.set_limits("1000,1000,1")
+
+    errors = []
+
+    def reserve_in_another_task():
+        try:
+            limiter.reserve("testapi")
+        except RateLimitExceeded as e:
+            errors.append(e)
+
+    with limiter.reserve("testapi"):
+        other = threading.Thread(target=reserve_in_another_task)
+        other.start()
+        other.join()
+
+    assert errors and errors[0].wait > 0
+    assert limiter.metrics()["testapi"]["rejected"] == 1
+
+
+def test_alimit_waits_for_a_slot_without_blocking_the_loop(limiter):
+    limiter.set_limits("1000,1000,1")
+    order = []
+
+    async def call(name, fail=False):
+        async with limiter.alimit("testapi", timeout=5):
+            order.append(f"{name} start")
+            await asyncio.sleep(0.05)
+            order.append(f"{name} end")
+            if fail:
+                raise ValueError("provider error")
+
+    async def ticker():
+        for _ in range(3):
+            order.append("tick")
+            await asyncio.sleep(0.01)
+
+    async def main():
+        return await asyncio.gather(call("a", fail=True), call("b"), ticker(), return_exceptions=True)
+
+    results = asyncio.run(main())
+
+    assert isinstance(results[0], ValueError)
+    assert order.index("a end") < order.index("b start")
+    # The loop kept running while b waited
+    assert order.index("tick", 1) < order.index("b start")
+    assert limiter.in_flight("testapi") == 0
+
+
+def test_admin_reports_wait_times(limiter, app, monkeypatch):
+    from app import db, User
+
+    limiter.set_limits("20,1,0")
+    limiter.acquire("testapi")
+    limiter.acquire("testapi")  # Waits about 50ms for its token
+    monkeypatch.setattr(rate_limiter_module, "rate_limiter", limiter)
+
+    admin = User(email="admin@example.com", password_hash="-", subscription_tier="admin")
+    db.session.add(admin)
+    db.session.commit()
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session["_user_id"] = str(admin.id)
+
+    stats = client.get("/admin/rate-limits").get_json()["testapi"]
+
+    assert (stats["acquired"], stats["waited"]) == (2, 1)
+    assert 0.02 < stats["max_wait_time"] < 1
+    assert stats["avg_wait_time"] == pytest.approx(stats["wait_time"] / 2, abs=0.001)
+    assert stats["limits"] == {"rate": 20.0, "burst": 1, "max_in_flight": 0}
@@ -0,0 +1,33 @@
+import pytest
+from services.video_generation import VideoGenerationService
+from tasks import generate_video_task, pipeline_step_task
+
+
+def test_failing_idea_step_stops_the_pipeline(stub, project, eager_celery, monkeypatch):
+    from app import db
+
+    def fail(self, *args, **kwargs):
+        raise RuntimeError("OpenAI is down")
+
+    monkeypatch.setattr(VideoGenerationService, "generate_idea", fail)
+
+    generate_video_task.apply(args=(project.user_id, project.id), task_id="parent-1")
+
+    assert generate_video_task.AsyncResult("parent-1").result == {"status": "error", "message": "OpenAI is down"}
+    # Image, voice, video and music were never submitted
+    assert stub.requests == []
+    db.session.refresh(project)
+    assert project.status == "error"
+
+
+def test_step_without_its_upstream_artifact_is_not_submitted(stub, project, eager_celery):
+    from app import db
+
+    project.idea, project.prompt = "A lighthouse", "Lighthouse at night"
+    db.session.commit()
+
+    result = pipeline_step_task.apply(args=(project.user_id, project.id, "video"))
+
+    with pytest.raises(ValueError, match="needs the project's image"):
+        result.get()
+    assert stub.requests == []
@@ -0,0 +1,106 @@
+import json
+import time
+import threading
+import pytest
+from werkzeug.serving import make_server
+from services.provider_stub import STUB_FILE_SIZE
+from services.remote_jobs import create_remote_job, record_submission, webhook_url
+from services.video_generation import VideoGenerationService
+
+IDEA = "A lighthouse keeper finds a city under the waves"
+
+
+@pytest.fixture
+def live_app(app, monkeypatch):
+    """Serve the app on a local port, the callback target of the provider stub."""
+    server = make_server("127.0.0.1", 0, app, threaded=True)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    monkeypatch.setenv("WEBHOOK_BASE_URL", f"http://127.0.0.1:{server.server_port}")
+    yield app
+    server.shutdown()
+
+
+def wait_for_webhook(stub, timeout=5):
+    deadline = time.time() + timeout
+    while not stub.webhooks and time.time() < deadline:
+        time.sleep(0.02)
+    assert stub.webhooks, "The stub never delivered its callback"
+    return stub.webhooks[0]
+
+
+def submit_image(project, prompt):
+    """Submit an image generation with a callback; a prompt of its own keeps the artifact cache out of the way."""
+    job = create_remote_job(project, "image")
+    service = VideoGenerationService(user=project.user, project=project)
+    submission = service.submit_remote_step("image", {"idea": {"idea": IDEA, "prompt": prompt}}, webhook=webhook_url(job))
+    record_submission(job, submission)
+    return service, job
+
+
+def test_callback_completes_the_job_and_the_output_is_collected(stub, project, live_app, tmp_path):
+    from app import db
+
+    service, job = submit_image(project, "Lighthouse beam over a drowned city")
+    db.session.commit()
+
+    _, url, status = wait_for_webhook(stub)
+    assert url == webhook_url(job) and status == 200
+
+    db.session.refresh(job)
+    assert job.status == "completed"
+    assert job.output_url.startswith(f"{stub.base_url}/files/")
+
+    output = service.collect_remote_output("image", job.output_url, job.cache_key, str(tmp_path / "image.png"))
+    assert (tmp_path / "image.png").stat().st_size == STUB_FILE_SIZE
+    assert project.image_path == output
+    # Submitted, then downloaded; no status polling was needed
+    assert [method for method, path in stub.requests] == ["POST", "GET"]
+
+
+def test_duplicate_delivery_is_ignored(stub, project, live_app):
+    from app import db
+
+    _, job = submit_image(project, "Fog rolling over a drowned city")
+    db.session.commit()
+    wait_for_webhook(stub)
+    db.session.refresh(job)
+    completed_at, output_url = job.completed_at, job.output_url
+
+    response = live_app.test_client().post(
+        f"/webhooks/replicate/{job.id}?token={webhook_url(job).split('token=')[1]}",
+        json={"id": job.external_id, "status": "failed", "error": "late duplicate"},
+    )
+
+    assert response.get_json() == {"status": "ignored"}
+    db.session.refresh(job)
+    assert (job.status, job.completed_at, job.output_url) == ("completed", completed_at, output_url)
+
+
+def test_callback_with_a_bad_token_is_rejected(project, app):
+    from app import db
+
+    job = create_remote_job(project, "image")
+    response = app.test_client().post(f"/webhooks/replicate/{job.id}?token=forged", json={"status": "succeeded"})
+
+    assert response.status_code == 403
+    db.session.refresh(job)
+    assert job.status == "pending"
+
+
+def test_callback_with_a_bad_signature_is_rejected(project, app, monkeypatch):
+    from app import db
+
+    monkeypatch.setenv("REPLICATE_WEBHOOK_SECRET", "whsec_c2VjcmV0")
+    job = create_remote_job(project, "image")
+    token = webhook_url(job).split("token=")[1]
+    body = json.dumps({"status": "succeeded", "output": "https://example.com/forged.png"})
+
+    response = app.test_client().post(
+        f"/webhooks/replicate/{job.id}?token={token}", data=body, content_type="application/json",
+        headers={"webhook-id": "msg_1", "webhook-timestamp": str(int(time.time())), "webhook-signature": "v1,Zm9yZ2Vk"},
+    )
+
+    assert response.status_code == 400
+    db.session.refresh(job)
+    assert job.status == "pending"
@@ -0,0 +1,47 @@
+from flask import Blueprint, request, jsonify
+from app import db, RemoteJob
+from services.poller import PENDING
+from services.remote_jobs import PROVIDER_RESULTS, verify_webhook_token, verify_replicate_signature, record_result
+
+# Create a Blueprint for provider callbacks
+webhooks_bp = Blueprint('webhooks', __name__, url_prefix='/webhooks')
+
+@webhooks_bp.route('/<provider>/<int:job_id>', methods=['POST'])
+def remote_job_webhook(provider, job_id):
+    """Record the result of a remote generation reported by the provider.
+
+    The pipeline step waiting on the job picks the result up from the
+    RemoteJob row and downloads the output.
+    """
+    job = RemoteJob.query.get(job_id)
+    if not job or job.provider != provider or provider not in PROVIDER_RESULTS:
+        return jsonify({'error': 'Unknown job'}), 404
+
+    if not verify_webhook_token(job, request.args.get('token')):
+        return jsonify({'error': 'Invalid token'}), 403
+
+    body = request.get_data()
+    if provider == 'replicate' and not verify_replicate_signature(request.headers, body):
+        return jsonify({'error': 'Invalid signature'}), 400
+
+    payload = request.get_json(silent=True)
+    if not isinstance(payload, dict):
+        return jsonify({'error': 'Invalid payload'}), 400
+
+    # Make sure the callback is about the generation we started
+    external_id = payload.get('id') or payload.get('task_id')
+    if job.external_id and external_id and str(external_id) != job.external_id:
+        return jsonify({'error': 'Job ID mismatch'}), 400
+
+    # Providers may deliver a callback more than once
+    if job.status in ('completed', 'failed'):
+        return jsonify({'status': 'ignored'})
+
+    state, value = PROVIDER_RESULTS[provider](payload)
+    if state == PENDING:
+        return jsonify({'status': 'pending'})
+
+    record_result(job, state, value)
+    db.session.commit()
+
+    return jsonify({'status': 'success'})